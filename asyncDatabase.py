@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from queryStats import QueryStats, TracingCursor
+
+
+class AsyncDatabase:
+    """Asynchronous wrapper around a SQLite connection.
+    Every query runs on a dedicated worker thread, so the Discord event loop is never blocked by the database.
+    Each call gets its own cursor, which is closed as soon as the call finishes.
+
+    Writes (calls with commit=True) go through a single writer queue. The writer collects the writes that arrive
+    within flushIntervalSeconds, up to maxBatchSize of them, and commits them together in one transaction.
+    Every write runs inside its own savepoint, so a failing write is rolled back without affecting the rest of the batch.
+    Awaiting a write returns only after its batch is committed.
+    Once close() has started, every call raises sqlite3.ProgrammingError instead of being queued.
+
+    If queryStats is set, every statement is recorded in it together with the function that awaited the database.
+    """
+
+    def __init__(
+        self,
+        databaseName: str,
+        flushIntervalSeconds: float = 0.005,
+        maxBatchSize: int = 100,
+    ) -> None:
+        self.databaseName = databaseName
+        self.connection: Optional[sqlite3.Connection] = None
+
+        self.flushIntervalSeconds = flushIntervalSeconds
+        self.maxBatchSize = maxBatchSize
+        self.writeQueue: Optional[asyncio.Queue] = None
+        self.writerTask: Optional[asyncio.Task] = None
+        self.queryStats: Optional[QueryStats] = None
+        self.closed = False
+
+        # A single worker thread owns the connection. SQLite connections cannot be shared between threads safely,
+        # and queuing the calls on one thread keeps them in the order they were awaited.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+
+    async def connect(self) -> None:
+        """Opens the connection on the worker thread and starts the writer."""
+        await self._submit(self._connect)
+        self.closed = False
+
+        self.writeQueue = asyncio.Queue()
+        self.writerTask = asyncio.create_task(self._writeLoop())
+
+    async def close(self) -> None:
+        """Commits the queued writes, stops the writer and closes the connection on the worker thread."""
+        self.closed = True
+        if self.writerTask is not None:
+            await self.writeQueue.put(None)
+            await self.writerTask
+            self.writerTask = None
+
+        await self._submit(self._close)
+
+    async def run(
+        self, function: Callable[..., Any], *args: Any, commit: bool = False
+    ) -> Any:
+        """Runs function(cursor, *args) on the worker thread and returns its result.
+        Used for functions that need several statements in a row without yielding to other tasks.
+        If commit is True, the function is queued as a write and the result is returned once it is committed.
+        If the function raises, its changes are rolled back and the exception is raised here.
+        """
+        if self.closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+        callSite = self._findCallSite() if self.queryStats is not None else None
+        if commit:
+            return await self._write(function, args, callSite)
+        return await self._submit(self._runWithCursor, function, args, callSite)
+
+    async def execute(
+        self, sql: str, parameters: tuple = (), commit: bool = False
+    ) -> None:
+        """Executes a single statement."""
+        await self.run(_execute, sql, parameters, commit=commit)
+
+    async def fetchone(self, sql: str, parameters: tuple = ()) -> Optional[tuple]:
+        """Executes a single statement and returns the first row."""
+        return await self.run(_fetchone, sql, parameters)
+
+    async def fetchall(self, sql: str, parameters: tuple = ()) -> list:
+        """Executes a single statement and returns all rows."""
+        return await self.run(_fetchall, sql, parameters)
+
+    async def _submit(self, function: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(function, *args)
+        )
+
+    async def _write(
+        self, function: Callable[..., Any], args: tuple, callSite: Optional[str]
+    ) -> Any:
+        if self.closed or self.writerTask is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+        future = asyncio.get_running_loop().create_future()
+        await self.writeQueue.put((function, args, future, callSite))
+        return await future
+
+    def _findCallSite(self) -> str:
+        """Returns module.function of the closest caller outside of this module."""
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_globals.get("__name__") == __name__:
+            frame = frame.f_back
+        if frame is None:
+            return "unknown"
+        return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+    async def _writeLoop(self) -> None:
+        stopping = False
+        while not stopping:
+            write = await self.writeQueue.get()
+            if write is None:
+                break
+
+            # Give concurrent interactions a moment to queue their writes, so that they share one commit.
+            if self.flushIntervalSeconds > 0:
+                await asyncio.sleep(self.flushIntervalSeconds)
+
+            batch = [write]
+            while len(batch) < self.maxBatchSize and not self.writeQueue.empty():
+                write = self.writeQueue.get_nowait()
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+
+            results = await self._submit(self._commitBatch, batch)
+
+            for (function, args, future, callSite), (succeeded, value) in zip(
+                batch, results
+            ):
+                if future.done():
+                    continue
+                if succeeded:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _connect(self) -> None:
+        self.connection = sqlite3.connect(self.databaseName)
+        # A new database is created with incremental vacuum, so the attempt maintenance can return free pages without a full VACUUM.
+        # This has to come before journal_mode, which writes the database header, and does nothing for an existing database.
+        self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # With write-ahead logging readers do not block the writer and a commit only appends to the log.
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+    def _close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _cursor(self, callSite: Optional[str]) -> sqlite3.Cursor:
+        if self.queryStats is None:
+            return self.connection.cursor()
+
+        cursor = self.connection.cursor(TracingCursor)
+        cursor.queryStats = self.queryStats
+        cursor.callSite = callSite or "unknown"
+        return cursor
+
+    def _runWithCursor(
+        self,
+        function: Callable[..., Any],
+        args: tuple,
+        callSite: Optional[str] = None,
+    ) -> Any:
+        cursor = self._cursor(callSite)
+        try:
+            return function(cursor, *args)
+        finally:
+            cursor.close()
+
+    def _commitBatch(self, batch: list) -> list:
+        """Runs a batch of writes in one transaction. Returns a (succeeded, result or exception) pair for every write."""
+        batchCallSite = f"{__name__}.commitBatch"
+        cursor = self._cursor(batchCallSite)
+        results = []
+        try:
+            cursor.execute("BEGIN")
+            for function, args, future, callSite in batch:
+                cursor.execute("SAVEPOINT write")
+                if self.queryStats is not None:
+                    cursor.callSite = callSite
+                try:
+                    results.append((True, function(cursor, *args)))
+                    if self.queryStats is not None:
+                        cursor.callSite = batchCallSite
+                    cursor.execute("RELEASE write")
+                except Exception as exception:
+                    if self.queryStats is not None:
+                        cursor.callSite = batchCallSite
+                    cursor.execute("ROLLBACK TO write")
+                    cursor.execute("RELEASE write")
+                    results.append((False, exception))
+
+            start = time.perf_counter()
+            self.connection.commit()
+            if self.queryStats is not None:
+                self.queryStats.record(
+                    batchCallSite, "COMMIT", 0, time.perf_counter() - start
+                )
+        except Exception as exception:
+            self.connection.rollback()
+            results = [(False, exception)] * len(batch)
+        finally:
+            cursor.close()
+        return results
+
+
+def _execute(cursor: sqlite3.Cursor, sql: str, parameters: tuple) -> None:
+    cursor.execute(sql, parameters)
+
+
+def _fetchone(cursor: sqlite3.Cursor, sql: str, parameters: tuple) -> Optional[tuple]:
+    cursor.execute(sql, parameters)
+    return cursor.fetchone()
+
+
+def _fetchall(cursor: sqlite3.Cursor, sql: str, parameters: tuple) -> list:
+    cursor.execute(sql, parameters)
+    return cursor.fetchall()
@@ -0,0 +1,219 @@
+"""Times every public function of databaseFunctions and the roster build against a synthetic database and prints the results as JSON.
+Usage: python -m benchmarks.runBenchmarks [--repeat 20] [--output results.json] [any option of benchmarks.syntheticData].
+The database is generated into a temporary directory and deleted afterwards. Compare runs with the same options only.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import databaseFunctions
+from asyncDatabase import AsyncDatabase
+from benchmarks.syntheticData import (
+    SyntheticDataConfig,
+    SyntheticDataSample,
+    generateSyntheticDatabase,
+)
+from checkQueryPlans import findPublicFunctions
+from rateLimiter import SlidingWindowRateLimiter
+from referenceData import loadReferenceData
+from rosterFunctions import buildRosterParts, fetchRoster
+
+
+def sampleCalls(sample: SyntheticDataSample) -> dict:
+    """Arguments every public function of databaseFunctions is called with, after the database argument."""
+    since = datetime.datetime.now() - datetime.timedelta(minutes=5)
+    return {
+        "insertNewSignUpAttempt": (sample.playerID,),
+        "insertNewUnsignAttempt": (sample.playerID,),
+        "insertPlayerIfNotExists": (sample.playerID, "player#0000"),
+        "claimGameSlot": (
+            sample.gameID,
+            sample.playerID,
+            sample.majorCountryID,
+            2,
+            1,
+        ),
+        "setPlayerSignUpAttemptsInactive": (sample.playerID,),
+        "setPlayerUnsignAttemptsInactive": (sample.playerID,),
+        "deactivateAllAttempts": (),
+        "fetchRecentSignUpAttempts": (since,),
+        "fetchRecentUnsignAttempts": (since,),
+        "fetchUserSignupState": (sample.gameID, sample.playerID),
+        "checkIfCountryHasController": (sample.gameID, sample.countryID, 1),
+        "fetchAvailableCountries": (sample.gameID, sample.playerID),
+        "fetchAvailableCountriesForUser": (sample.gameID, sample.playerID),
+        "getPrimaryControllerID": (sample.gameID, sample.countryID),
+        "getGameDate": (sample.gameID,),
+        "insertSecondaryControllerRequest": (
+            sample.gameID,
+            sample.playerID,
+            sample.majorCountryID,
+            1,
+            sample.playerID,
+            datetime.datetime.now(),
+        ),
+        "expireGameSecondaryControllerRequests": (sample.gameID,),
+        "fetchPendingSecondaryControllerRequests": (),
+        "resolveSecondaryControllerRequest": (1, "expired"),
+        "saveSignupMessages": (sample.gameID, [(1, 1, "hash")]),
+        "deleteSignupMessages": (sample.gameID,),
+        "fetchSignupMessages": (),
+        "fetchGamePlayers": (sample.gameID, 0, 100),
+        "setPlayersDMsClosed": ([sample.playerID], None),
+        "insertGame": (1, "2030-01-01 12:00:00"),
+        "fetchGames": (),
+        "fetchOpenGames": (),
+        "closeGameSignups": (sample.gameID,),
+        "checkIfGameExists": (sample.gameID,),
+        "updateGameStartingTime": (sample.gameID, "2030-01-01 12:00:00"),
+        "updateGameType": (sample.gameID, 1),
+        "updateCountryTag": (sample.countryID, "TAG"),
+        "clearAvailableCountriesCache": (),
+        # Unsigns the sample record, so it runs after everything that reads it.
+        "setGameRecordInactive": (sample.recordID,),
+        "resetSignupTables": (),
+        "deleteGameByID": (sample.gameID,),
+    }
+
+
+# Functions that destroy the generated data are timed last, once.
+CALLED_LAST = ["resetSignupTables", "deleteGameByID"]
+
+
+def summarize(durations: list) -> dict:
+    """Returns the statistics of a list of durations in seconds, in milliseconds."""
+    durations = sorted(duration * 1000 for duration in durations)
+    return {
+        "runs": len(durations),
+        "minMs": round(durations[0], 4),
+        "medianMs": round(statistics.median(durations), 4),
+        "p95Ms": round(durations[int(0.95 * (len(durations) - 1))], 4),
+        "maxMs": round(durations[-1], 4),
+    }
+
+
+async def timeCall(function, *args, repeat: int, before=None) -> dict:
+    """Awaits function(*args) repeat times and returns the statistics of the durations. before() is awaited untimed before every call."""
+    durations = []
+    for _ in range(repeat):
+        if before is not None:
+            await before()
+        start = time.perf_counter()
+        await function(*args)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+async def runBenchmarks(
+    databaseName: str, sample: SyntheticDataSample, repeat: int
+) -> dict:
+    """Runs all benchmarks against a generated database and returns the results by name."""
+
+    # Writes are committed as soon as they are queued, so the group commit interval does not add to their timings.
+    database = AsyncDatabase(databaseName, flushIntervalSeconds=0)
+    await database.connect()
+    await loadReferenceData(database)
+
+    results = {}
+    calls = sampleCalls(sample)
+
+    missingFunctions = sorted(set(findPublicFunctions(databaseFunctions)) - set(calls))
+    if missingFunctions:
+        results["missing"] = missingFunctions
+
+    for name in calls:
+        if name == "fetchAvailableCountries":
+            # The availability list is cached per game, so the first call after a sign up is timed on its own.
+            results[f"{name} (cold cache)"] = await timeCall(
+                databaseFunctions.fetchAvailableCountries,
+                database,
+                *calls[name],
+                repeat=repeat,
+                before=lambda: databaseFunctions.clearAvailableCountriesCache(database),
+            )
+
+        if name in CALLED_LAST:
+            continue
+
+        results[name] = await timeCall(
+            getattr(databaseFunctions, name), database, *calls[name], repeat=repeat
+        )
+
+    # The roster build of createSingUpMessage and of every roster refresh.
+    async def buildRoster(gameID):
+        buildRosterParts(await fetchRoster(database, gameID))
+
+    results["rosterBuild"] = await timeCall(buildRoster, sample.gameID, repeat=repeat)
+
+    # checkIfSignUpTimeout and checkIfUnsignTimeout read the in-memory rate limiter, seeded like at startup.
+    rateLimiter = SlidingWindowRateLimiter()
+    rateLimiter.seed(
+        await databaseFunctions.fetchRecentSignUpAttempts(
+            database, datetime.datetime.now() - datetime.timedelta(days=1)
+        )
+    )
+
+    async def getRemainingTime(playerID):
+        rateLimiter.getRemainingTime(playerID)
+
+    results["checkIfSignUpTimeout"] = await timeCall(
+        getRemainingTime, sample.playerID, repeat=repeat
+    )
+
+    for name in CALLED_LAST:
+        results[name] = await timeCall(
+            getattr(databaseFunctions, name), database, *calls[name], repeat=1
+        )
+
+    await database.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--output", help="File to write the JSON to, stdout if omitted."
+    )
+    for field, default in SyntheticDataConfig._field_defaults.items():
+        parser.add_argument(f"--{field}", type=type(default), default=default)
+    arguments = vars(parser.parse_args())
+
+    repeat = arguments.pop("repeat")
+    output = arguments.pop("output")
+    config = SyntheticDataConfig(**arguments)
+
+    with tempfile.TemporaryDirectory() as directory:
+        databaseName = os.path.join(directory, "benchmark.sqlite")
+
+        start = time.perf_counter()
+        sample = generateSyntheticDatabase(databaseName, config)
+        generationSeconds = time.perf_counter() - start
+
+        results = asyncio.run(runBenchmarks(databaseName, sample, repeat))
+
+    report = json.dumps(
+        {
+            "config": config._asdict(),
+            "sqliteVersion": sqlite3.sqlite_version,
+            "generationSeconds": round(generationSeconds, 2),
+            "results": results,
+        },
+        indent=4,
+    )
+    if output:
+        with open(output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Simulates many users signing up and unsigning for one game at the same time, without connecting to Discord.
+The real SignupHandler, SignupDirectMessage and UnsignView callbacks are driven through stand-in interactions, users and messages.
+Reports the latency of every callback, the time spent in the database, and the invariants of the game records that were violated.
+Usage: python -m benchmarks.signupStorm [--users 1000] [--unsignShare 0.3] [--discordLatencyMs 0] [--output results.json].
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+import discord
+
+from asyncDatabase import AsyncDatabase
+from benchmarks.syntheticData import SyntheticDataConfig, generateSyntheticDatabase
+from discordFunctions import DiscordIdentityCache
+from rateLimiter import SlidingWindowRateLimiter
+from referenceData import loadReferenceData
+from rosterRefresher import RosterRefresher
+from scheduler import Scheduler
+from secondaryControllerRequests import (
+    CUSTOM_ID_PREFIX,
+    SecondaryControllerRequests,
+    SecondaryControllerRequestView,
+)
+from sessionRegistry import SessionRegistry
+from signUpViews import SignupDirectMessage, SignupHandler, UnsignView
+
+
+class TimedDatabase(AsyncDatabase):
+    """AsyncDatabase that adds up how long callers wait for it and how long the worker thread is busy."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.waitSeconds = 0.0
+        self.workerSeconds = 0.0
+        self.calls = 0
+
+    async def run(self, function, *args, commit: bool = False):
+        start = time.perf_counter()
+        try:
+            return await super().run(function, *args, commit=commit)
+        finally:
+            self.waitSeconds += time.perf_counter() - start
+            self.calls += 1
+
+    def _runWithCursor(self, function, args: tuple, callSite=None):
+        start = time.perf_counter()
+        try:
+            return super()._runWithCursor(function, args, callSite)
+        finally:
+            self.workerSeconds += time.perf_counter() - start
+
+    def _commitBatch(self, batch: list) -> list:
+        start = time.perf_counter()
+        try:
+            return super()._commitBatch(batch)
+        finally:
+            self.workerSeconds += time.perf_counter() - start
+
+
+class FakeMessage:
+    def __init__(self, channel, content: str, view) -> None:
+        self.channel = channel
+        self.content = content
+        self.view = view
+        self.id = id(self)
+
+    async def edit(self, content: str = None, view=None) -> "FakeMessage":
+        await self.channel.latency()
+        if content is not None:
+            self.content = content
+        if view is not None:
+            self.view = view
+        return self
+
+
+class FakeDMChannel:
+    def __init__(self, user: "FakeUser") -> None:
+        self.user = user
+        self.id = user.id
+
+    async def latency(self) -> None:
+        if self.user.latencySeconds:
+            await asyncio.sleep(self.user.latencySeconds)
+
+    async def send(self, content: str = None, view=None) -> FakeMessage:
+        await self.latency()
+        message = FakeMessage(self, content, view)
+        self.user.messages.append(message)
+        return message
+
+
+class FakeUser:
+    def __init__(self, userID: int, latencySeconds: float) -> None:
+        self.id = userID
+        self.name = f"player{userID}"
+        self.discriminator = "0001"
+        self.latencySeconds = latencySeconds
+        self.messages = []
+        self.dm_channel = FakeDMChannel(self)
+
+    async def create_dm(self) -> FakeDMChannel:
+        return self.dm_channel
+
+    async def send(self, content: str = None, view=None) -> FakeMessage:
+        return await self.dm_channel.send(content, view=view)
+
+    def lastView(self, viewType: type):
+        """Returns the view of the latest message of the given view type sent to the user."""
+        for message in reversed(self.messages):
+            if isinstance(message.view, viewType):
+                return message.view
+        return None
+
+
+class FakeResponse:
+    def __init__(self, user: FakeUser) -> None:
+        self.user = user
+        self.done = False
+
+    async def send_message(self, content: str = None, ephemeral: bool = False) -> None:
+        await self.user.dm_channel.latency()
+        self.done = True
+
+    async def defer(self) -> None:
+        await self.user.dm_channel.latency()
+        self.done = True
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, data: dict = None, message=None) -> None:
+        self.user = user
+        self.data = data or {}
+        self.message = message or FakeMessage(user.dm_channel, None, None)
+        self.response = FakeResponse(user)
+        self.type = discord.InteractionType.component
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.users = {}
+
+    def get_user(self, userID: int):
+        return self.users.get(userID)
+
+    async def fetch_user(self, userID: int):
+        return self.users[userID]
+
+
+class SignupStorm:
+    """Runs the simulation and collects the latency of every callback by name."""
+
+    def __init__(
+        self,
+        database: TimedDatabase,
+        gameID: int,
+        users: int,
+        unsignShare: float,
+        latencySeconds: float,
+        seed: int,
+    ) -> None:
+        self.database = database
+        self.gameID = gameID
+        self.randomGenerator = random.Random(seed)
+        self.unsignShare = unsignShare
+
+        self.bot = FakeBot()
+        for userID in range(1, users + 1):
+            self.bot.users[userID] = FakeUser(userID, latencySeconds)
+
+        self.scheduler = Scheduler()
+        self.sessionRegistry = SessionRegistry()
+        self.rosterRefresher = RosterRefresher(database)
+        self.identityCache = DiscordIdentityCache(self.bot)
+        self.secondaryControllerRequests = SecondaryControllerRequests(
+            database, self.identityCache, self.rosterRefresher, self.scheduler
+        )
+        # Every user signs up at most twice and unsigns at most once, so the limits never apply.
+        window = datetime.timedelta(minutes=5)
+        self.handler = SignupHandler(
+            str(gameID),
+            database,
+            self.bot,
+            self.rosterRefresher,
+            SlidingWindowRateLimiter(10, window),
+            SlidingWindowRateLimiter(10, window),
+            self.sessionRegistry,
+            self.secondaryControllerRequests,
+            self.identityCache,
+            self.scheduler,
+        )
+
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    async def timed(self, name: str, callback, *args) -> None:
+        start = time.perf_counter()
+        try:
+            await callback(*args)
+        except Exception:
+            self.failures[name] += 1
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    async def select(self, name: str, select, value: str, user: FakeUser) -> None:
+        interaction = FakeInteraction(user, {"values": [value]})
+        # Like discord.py does before it calls the callback.
+        select._refresh_state(interaction, interaction.data)
+        await self.timed(name, select.callback, interaction)
+
+    async def signUp(self, user: FakeUser) -> None:
+        await self.timed(
+            "signupCallback", self.handler.signupCallback, FakeInteraction(user)
+        )
+        view = user.lastView(SignupDirectMessage)
+        if view is None or view.is_finished() or not view.countrySelect.options:
+            return
+
+        country = self.randomGenerator.choice(view.countrySelect.options)
+        await self.select(
+            "countrySelectCallback", view.countrySelect, country.value, user
+        )
+
+        if view.controllerSelect in view.children and not view.is_finished():
+            controller = self.randomGenerator.choice(["1", "2"])
+            await self.select(
+                "controllerSelectCallback",
+                view.controllerSelect,
+                controller,
+                user,
+            )
+
+        if view.optionSelect in view.children and not view.is_finished():
+            option = self.randomGenerator.choice(["1", "2"])
+            await self.select("optionSelectCallback", view.optionSelect, option, user)
+
+    async def unsign(self, user: FakeUser) -> None:
+        await self.timed(
+            "unsignCallback", self.handler.unsignCallback, FakeInteraction(user)
+        )
+        view = user.lastView(UnsignView)
+        if view is None or view.is_finished():
+            return
+
+        record = self.randomGenerator.choice(view.select.options)
+        await self.select("unsignSelectCallback", view.select, record.value, user)
+
+    async def answerSecondaryControllerRequests(self) -> None:
+        """Every primary controller that received a request confirms it."""
+        answers = []
+        for user in self.bot.users.values():
+            for message in user.messages:
+                if isinstance(message.view, SecondaryControllerRequestView):
+                    customID = message.view.children[0].custom_id
+                    assert customID.startswith(CUSTOM_ID_PREFIX)
+                    interaction = FakeInteraction(
+                        user, {"custom_id": customID}, message
+                    )
+                    answers.append(
+                        self.timed(
+                            "secondaryControllerConfirm",
+                            self.secondaryControllerRequests.handleInteraction,
+                            interaction,
+                        )
+                    )
+        await asyncio.gather(*answers)
+
+    async def userJourney(self, user: FakeUser) -> None:
+        await self.signUp(user)
+        # Wait until the deactivation of the finished flow is written, like a user reading the confirmation would.
+        view = user.lastView(SignupDirectMessage)
+        if view is not None and view.deactivationTask is not None:
+            await view.deactivationTask
+
+        if self.randomGenerator.random() < self.unsignShare:
+            await self.unsign(user)
+        else:
+            await self.signUp(user)
+
+    async def run(self) -> dict:
+        self.scheduler.start()
+        start = time.perf_counter()
+        # The CPU time of this thread is the time the event loop was busy, which is what limits how many users one bot can serve.
+        cpuStart = time.thread_time()
+        await asyncio.gather(
+            *(self.userJourney(user) for user in self.bot.users.values())
+        )
+        await self.answerSecondaryControllerRequests()
+        wallSeconds = time.perf_counter() - start
+        eventLoopSeconds = time.thread_time() - cpuStart
+        self.scheduler.stop()
+
+        return {
+            "wallSeconds": round(wallSeconds, 3),
+            "callbacks": {
+                name: summarize(durations) for name, durations in self.latencies.items()
+            },
+            "failedCallbacks": dict(self.failures),
+            "eventLoopBusySeconds": round(eventLoopSeconds, 3),
+            "database": {
+                "calls": self.database.calls,
+                "workerBusySeconds": round(self.database.workerSeconds, 3),
+                # Includes the time spent queued behind other calls and waiting for the group commit.
+                "meanWaitMs": round(
+                    self.database.waitSeconds * 1000 / max(self.database.calls, 1), 3
+                ),
+            },
+            "leakedSessions": len(self.sessionRegistry.sessions),
+            "violations": await findViolations(self.database, self.gameID),
+        }
+
+
+def summarize(durations: list) -> dict:
+    """Returns the percentiles of a list of durations in seconds, in milliseconds."""
+    durations = sorted(duration * 1000 for duration in durations)
+
+    def percentile(share: float) -> float:
+        return round(durations[int(share * (len(durations) - 1))], 3)
+
+    return {
+        "count": len(durations),
+        "p50Ms": percentile(0.5),
+        "p95Ms": percentile(0.95),
+        "p99Ms": percentile(0.99),
+        "meanMs": round(statistics.fmean(durations), 3),
+    }
+
+
+async def findViolations(database: AsyncDatabase, gameID: int) -> dict:
+    """Counts the slots claimed more than once, the options held more than once and the minors with a secondary controller."""
+    doubleClaimedSlots = await database.fetchone(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM game_records WHERE game_id = ? AND is_active = 1 GROUP BY country_id, controller HAVING COUNT(*) > 1)",
+        (gameID,),
+    )
+    duplicateOptions = await database.fetchone(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM game_records WHERE game_id = ? AND is_active = 1 GROUP BY player_id, option HAVING COUNT(*) > 1)",
+        (gameID,),
+    )
+    minorsWithSecondaryController = await database.fetchone(
+        "SELECT COUNT(*) FROM game_records JOIN countries USING(country_id) WHERE game_id = ? AND is_active = 1 AND controller = 2 AND is_major = 0",
+        (gameID,),
+    )
+    return {
+        "doubleClaimedSlots": doubleClaimedSlots[0],
+        "duplicateOptions": duplicateOptions[0],
+        "minorsWithSecondaryController": minorsWithSecondaryController[0],
+    }
+
+
+async def runStorm(databaseName: str, arguments: dict) -> dict:
+    database = TimedDatabase(databaseName)
+    await database.connect()
+    await loadReferenceData(database)
+
+    storm = SignupStorm(
+        database,
+        1,
+        arguments["users"],
+        arguments["unsignShare"],
+        arguments["discordLatencyMs"] / 1000,
+        arguments["seed"],
+    )
+    results = await storm.run()
+
+    await database.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--countries", type=int, default=500)
+    parser.add_argument("--unsignShare", type=float, default=0.3)
+    parser.add_argument("--discordLatencyMs", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="File to write the JSON to, stdout if omitted."
+    )
+    arguments = vars(parser.parse_args())
+
+    # One game that starts in a few hours, with no sign ups yet.
+    config = SyntheticDataConfig(
+        countries=arguments["countries"],
+        players=arguments["users"],
+        games=1,
+        recordsPerGame=0,
+        attempts=0,
+        seed=arguments["seed"],
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        databaseName = os.path.join(directory, "storm.sqlite")
+        generateSyntheticDatabase(databaseName, config)
+        results = asyncio.run(runStorm(databaseName, arguments))
+
+    report = json.dumps({"arguments": arguments, "results": results}, indent=4)
+    if arguments["output"]:
+        with open(arguments["output"], "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Generates a synthetic, fully migrated database of a given size for the benchmarks.
+Usage: python -m benchmarks.syntheticData <database file> [--countries 500] [--players 10000] [--games 1000] [--attempts 1000000].
+"""
+
+import argparse
+import datetime
+import random
+import sqlite3
+from typing import NamedTuple, Optional
+
+from migrations import applyMigrations
+
+
+class SyntheticDataConfig(NamedTuple):
+    countries: int = 500
+    factions: int = 4
+    players: int = 10000
+    games: int = 1000
+    recordsPerGame: int = 60
+    attempts: int = 1000000
+    majorShare: float = 0.05  # Share of the countries that are majors.
+    inactiveRecordShare: float = 0.2  # Share of the game records that were unsigned.
+    seed: int = 0
+
+
+class SyntheticDataSample(NamedTuple):
+    """Ids that exist in the generated database, used as arguments by the benchmarks."""
+
+    gameID: int
+    playerID: int
+    countryID: int
+    majorCountryID: int
+    recordID: Optional[int]
+
+
+def generateSyntheticDatabase(
+    databaseName: str, config: SyntheticDataConfig = SyntheticDataConfig()
+) -> SyntheticDataSample:
+    """Creates the tables in databaseName and fills them with random data of the configured size.
+    The same config always generates the same data."""
+
+    randomGenerator = random.Random(config.seed)
+    connection = sqlite3.connect(databaseName)
+    cursor = connection.cursor()
+    applyMigrations(cursor)
+
+    now = datetime.datetime.now().replace(microsecond=0)
+
+    cursor.execute("BEGIN")
+    cursor.executemany(
+        "INSERT INTO types (type_id, name) VALUES (?, ?)",
+        [(1, "historical"), (2, "ahistorical")],
+    )
+    cursor.executemany(
+        "INSERT INTO factions (faction_id, name) VALUES (?, ?)",
+        [
+            (factionID, f"Faction {factionID}")
+            for factionID in range(1, config.factions + 1)
+        ],
+    )
+
+    majorCountryIDs = set(
+        randomGenerator.sample(
+            range(1, config.countries + 1),
+            max(1, int(config.countries * config.majorShare)),
+        )
+    )
+    cursor.executemany(
+        "INSERT INTO countries (country_id, name, emoji, is_major, tag) VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                countryID,
+                f"Country {countryID}",
+                "🏳️",
+                int(countryID in majorCountryIDs),
+                f"T{countryID:02}",
+            )
+            for countryID in range(1, config.countries + 1)
+        ],
+    )
+    cursor.executemany(
+        "INSERT INTO countries_factions_historical (country_id, faction_id) VALUES (?, ?)",
+        [
+            (countryID, randomGenerator.randint(1, config.factions))
+            for countryID in range(1, config.countries + 1)
+        ],
+    )
+    cursor.executemany(
+        "INSERT INTO players (player_id, discord_tag) VALUES (?, ?)",
+        [
+            (playerID, f"player#{playerID:04}")
+            for playerID in range(1, config.players + 1)
+        ],
+    )
+
+    # Games are spread over the last year, the last tenth of them are still open.
+    cursor.executemany(
+        "INSERT INTO games (game_id, type_id, starting_time) VALUES (?, ?, ?)",
+        [
+            (
+                gameID,
+                1,
+                str(now + datetime.timedelta(days=gameID - config.games * 0.9)),
+            )
+            for gameID in range(1, config.games + 1)
+        ],
+    )
+
+    records = []
+    for gameID in range(1, config.games + 1):
+        recordsInGame = min(config.recordsPerGame, config.countries, config.players)
+        countryIDs = randomGenerator.sample(
+            range(1, config.countries + 1), recordsInGame
+        )
+        playerIDs = randomGenerator.sample(range(1, config.players + 1), recordsInGame)
+        for countryID, playerID in zip(countryIDs, playerIDs):
+            # Unsigned records do not take a slot, so they never collide with the unique indexes on active records.
+            isActive = int(randomGenerator.random() >= config.inactiveRecordShare)
+            records.append(
+                (
+                    gameID,
+                    playerID,
+                    countryID,
+                    1,
+                    randomGenerator.randint(1, 2),
+                    isActive,
+                )
+            )
+    cursor.executemany(
+        "INSERT INTO game_records (game_id, player_id, country_id, faction_id, ending_id, controller, option, singup_time, is_active) SELECT ?, ?, ?, faction_id, 3, ?, ?, ?, ? FROM countries_factions_historical WHERE country_id = ?",
+        [
+            (
+                gameID,
+                playerID,
+                countryID,
+                controller,
+                option,
+                str(now),
+                isActive,
+                countryID,
+            )
+            for gameID, playerID, countryID, controller, option, isActive in records
+        ],
+    )
+
+    # Four out of five attempts are sign ups. Attempts are spread over the last year, all of them finished.
+    signupAttempts = int(config.attempts * 0.8)
+    for table, count in (
+        ("signup_attempts", signupAttempts),
+        ("unsign_attempts", config.attempts - signupAttempts),
+    ):
+        cursor.executemany(
+            f"INSERT INTO {table} (player_id, datetime, is_active) VALUES (?, ?, 0)",
+            (
+                (
+                    randomGenerator.randint(1, config.players),
+                    str(
+                        now
+                        - datetime.timedelta(
+                            seconds=randomGenerator.randint(0, 365 * 24 * 3600)
+                        )
+                    ),
+                )
+                for _ in range(count)
+            ),
+        )
+    connection.commit()
+
+    cursor.execute("ANALYZE")
+    cursor.execute(
+        "SELECT game_id, player_id, country_id, record_id FROM game_records WHERE is_active = 1 ORDER BY record_id DESC LIMIT 1"
+    )
+    # Without records the sample points at the first game, player and country.
+    gameID, playerID, countryID, recordID = cursor.fetchone() or (1, 1, 1, None)
+    connection.close()
+
+    return SyntheticDataSample(
+        gameID, playerID, countryID, min(majorCountryIDs), recordID
+    )
+
+
+def parseConfig(arguments: list = None) -> tuple:
+    """Returns the database file and the SyntheticDataConfig given on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", help="SQLite file to create. Must not exist.")
+    for field, default in SyntheticDataConfig._field_defaults.items():
+        parser.add_argument(f"--{field}", type=type(default), default=default)
+
+    parsedArguments = vars(parser.parse_args(arguments))
+    databaseName = parsedArguments.pop("database")
+    return databaseName, SyntheticDataConfig(**parsedArguments)
+
+
+if __name__ == "__main__":
+    databaseName, config = parseConfig()
+    print(generateSyntheticDatabase(databaseName, config))
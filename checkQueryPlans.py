@@ -0,0 +1,208 @@
+"""Checks that no statement of the data layer scans a whole table.
+Every public function of databaseFunctions, rosterFunctions and maintenance is called against an empty, fully migrated database,
+and EXPLAIN QUERY PLAN is run on every statement it executed.
+Usage: python checkQueryPlans.py. Exits with status 1 if a full table scan is found or a public function is not covered.
+"""
+
+import asyncio
+import inspect
+import sys
+from typing import Optional
+
+import databaseFunctions
+import maintenance
+import rosterFunctions
+from asyncDatabase import AsyncDatabase
+from migrations import applyMigrations
+from referenceData import loadReferenceData
+
+
+# Static reference tables are listed in full on purpose, for example all countries for the availability list.
+REFERENCE_TABLES = {
+    "countries",
+    "countries_factions_historical",
+    "factions",
+    "types",
+}
+
+# Function -> table it reads in full on purpose. Every other table has to be read through an index.
+ALLOWED_SCANS = {
+    # listGames lists every game.
+    "fetchGames": "games",
+}
+
+SAMPLE_DATA = [
+    "INSERT INTO types (type_id, name) VALUES (1, 'historical')",
+    "INSERT INTO games (game_id, type_id, starting_time) VALUES (1, 1, '2030-01-01 18:00:00')",
+    "INSERT INTO factions (faction_id, name) VALUES (1, 'Allies')",
+    "INSERT INTO countries (country_id, name, emoji, is_major) VALUES (1, 'United Kingdom', '🇬🇧', 1)",
+    "INSERT INTO countries_factions_historical (country_id, faction_id) VALUES (1, 1)",
+    "INSERT INTO players (player_id, discord_tag) VALUES (1, 'player#0001')",
+    "INSERT INTO game_records (game_id, player_id, country_id, faction_id, ending_id, controller, option, singup_time) VALUES (1, 1, 1, 1, 3, 1, 1, '2030-01-01 12:00:00')",
+]
+
+# Arguments every public function is called with, after the database argument.
+# A list holds the arguments of several calls, for functions whose statements depend on the outcome of the call.
+SAMPLE_CALLS = {
+    databaseFunctions: {
+        "insertNewSignUpAttempt": ("1",),
+        "insertNewUnsignAttempt": ("1",),
+        "insertPlayerIfNotExists": ("2", "player#0002"),
+        # The second call claims the same slot again, which runs the conflict checks after the unique index rejects it.
+        "claimGameSlot": [("1", "2", "1", "2", "2"), ("1", "2", "1", "2", "2")],
+        "setPlayerSignUpAttemptsInactive": ("1",),
+        "setPlayerUnsignAttemptsInactive": ("1",),
+        "deactivateAllAttempts": (),
+        "setGameRecordInactive": ("2",),
+        "fetchRecentSignUpAttempts": ("2030-01-01 12:00:00",),
+        "fetchRecentUnsignAttempts": ("2030-01-01 12:00:00",),
+        "checkIfCountryHasController": ("1", "1", "1"),
+        "fetchUserSignupState": ("1", "1"),
+        "fetchAvailableCountries": ("1", "1"),
+        "fetchAvailableCountriesForUser": ("1", "1"),
+        "getPrimaryControllerID": ("1", "1"),
+        "getGameDate": ("1",),
+        "insertSecondaryControllerRequest": (
+            "1",
+            "1",
+            "1",
+            "2",
+            "1",
+            "2030-01-01 12:00:00",
+        ),
+        "expireGameSecondaryControllerRequests": ("2",),
+        "fetchPendingSecondaryControllerRequests": (),
+        "resolveSecondaryControllerRequest": ("1", "confirmed"),
+        "saveSignupMessages": ("1", [(10, 20, "hash")]),
+        "deleteSignupMessages": ("1",),
+        "fetchSignupMessages": (),
+        "fetchGamePlayers": ("1", 0, 100),
+        "setPlayersDMsClosed": (["1"], "2030-01-01 12:00:00"),
+        "insertGame": (1, "2030-01-02 12:00:00"),
+        "fetchGames": (),
+        "fetchOpenGames": (),
+        "closeGameSignups": ("2",),
+        "checkIfGameExists": ("1",),
+        "updateGameStartingTime": ("2", "2030-01-03 12:00:00"),
+        "updateGameType": ("2", 1),
+        "updateCountryTag": ("1", "ENG"),
+        "resetSignupTables": (),
+        "deleteGameByID": ("1",),
+        "clearAvailableCountriesCache": (),
+    },
+    rosterFunctions: {
+        "fetchRoster": ("1",),
+    },
+    maintenance: {
+        "compactAttempts": ("signup", "2030-01-01 12:00:00", 500),
+        "isIncrementalVacuumEnabled": (),
+        "incrementalVacuum": (16,),
+        "enableIncrementalVacuum": (),
+    },
+}
+
+# Functions that destroy the sample data are called last.
+CALLED_LAST = ["resetSignupTables", "deleteGameByID"]
+
+
+def findPublicFunctions(module) -> list:
+    """Returns the names of the public coroutine functions defined in a module."""
+    return [
+        name
+        for name, function in inspect.getmembers(module, inspect.iscoroutinefunction)
+        if not name.startswith("_") and function.__module__ == module.__name__
+    ]
+
+
+def findFullTableScans(
+    planRows: list,
+    partialIndexes: set = frozenset(),
+    allowedTable: Optional[str] = None,
+) -> list:
+    """Returns the plan details that scan a whole table that is neither a reference table nor allowedTable.
+    Scans of a partial index only read the rows the index covers, so they are not reported.
+    """
+    scans = []
+    for row in planRows:
+        detail = row[3]
+        if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+            continue
+        table = detail.split()[1]
+        # Scans of materialized subqueries and of reference tables are fine.
+        if table.startswith("(") or table in REFERENCE_TABLES or table == allowedTable:
+            continue
+        if detail.split()[-1] in partialIndexes:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def _setupDatabase(cursor) -> None:
+    applyMigrations(cursor)
+    for statement in SAMPLE_DATA:
+        cursor.execute(statement)
+    cursor.connection.commit()
+
+
+def _setTraceCallback(cursor, callback) -> None:
+    cursor.connection.set_trace_callback(callback)
+
+
+async def checkQueryPlans() -> list:
+    """Runs every public function of the data layer and returns a list of problems found."""
+    database = AsyncDatabase(":memory:")
+    await database.connect()
+    await database.run(_setupDatabase)
+    await loadReferenceData(database)
+
+    partialIndexes = {
+        row[0]
+        for row in await database.fetchall(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'"
+        )
+    }
+    problems = []
+
+    for module, sampleCalls in SAMPLE_CALLS.items():
+        for name in findPublicFunctions(module):
+            if name not in sampleCalls:
+                problems.append(f"{module.__name__}.{name} has no sample call.")
+
+        names = sorted(sampleCalls, key=lambda name: name in CALLED_LAST)
+        for name in names:
+            calls = sampleCalls[name]
+            if not isinstance(calls, list):
+                calls = [calls]
+
+            statements = []
+            await database.run(_setTraceCallback, statements.append)
+            for arguments in calls:
+                await getattr(module, name)(database, *arguments)
+            await database.run(_setTraceCallback, None)
+
+            for statement in statements:
+                if (
+                    not statement.lstrip()
+                    .upper()
+                    .startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"))
+                ):
+                    continue
+                planRows = await database.fetchall("EXPLAIN QUERY PLAN " + statement)
+                for detail in findFullTableScans(
+                    planRows, partialIndexes, ALLOWED_SCANS.get(name)
+                ):
+                    problems.append(
+                        f"{module.__name__}.{name}: {detail}\n    {statement}"
+                    )
+
+    await database.close()
+    return problems
+
+
+if __name__ == "__main__":
+    problems = asyncio.run(checkQueryPlans())
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("No full table scans found.")
@@ -5,3 +5,46 @@ load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 SINGUP_CHANNEL = os.getenv("SINGUP_CHANNEL")
+
+# At most RATE_LIMIT_ATTEMPTS sign up (or unsign) attempts are allowed per user in any window of RATE_LIMIT_WINDOW_SECONDS.
+RATE_LIMIT_ATTEMPTS = int(os.getenv("RATE_LIMIT_ATTEMPTS", "3"))
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "300"))
+# Whether recent attempts are loaded from the database at startup, so limits survive a restart.
+RATE_LIMIT_SEED_FROM_DATABASE = os.getenv("RATE_LIMIT_SEED_FROM_DATABASE", "1") == "1"
+
+# Writes that arrive within DATABASE_FLUSH_INTERVAL_MS of each other are committed together, at most DATABASE_MAX_BATCH_SIZE at a time.
+DATABASE_FLUSH_INTERVAL_MS = int(os.getenv("DATABASE_FLUSH_INTERVAL_MS", "5"))
+DATABASE_MAX_BATCH_SIZE = int(os.getenv("DATABASE_MAX_BATCH_SIZE", "100"))
+
+# How often old signup and unsign attempts are rolled up and the database is vacuumed.
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))
+
+# Whether every statement is timed and counted by call site, for the dbStats command and the Prometheus file.
+DATABASE_QUERY_STATS = os.getenv("DATABASE_QUERY_STATS", "0") == "1"
+# Statements slower than this are logged as warnings when query stats are enabled.
+DATABASE_SLOW_QUERY_MS = float(os.getenv("DATABASE_SLOW_QUERY_MS", "100"))
+# If set, the query stats are written to this file in the Prometheus text format every DATABASE_STATS_EXPORT_SECONDS.
+DATABASE_STATS_FILE = os.getenv("DATABASE_STATS_FILE", "")
+DATABASE_STATS_EXPORT_SECONDS = float(os.getenv("DATABASE_STATS_EXPORT_SECONDS", "60"))
+
+# Callbacks and commands that keep the event loop busy for longer than LOOP_LAG_BUDGET_MS are logged with their function name.
+LOOP_LAG_BUDGET_MS = float(os.getenv("LOOP_LAG_BUDGET_MS", "100"))
+# How often the event loop lag and the number of open views are logged.
+LOOP_MONITOR_REPORT_SECONDS = float(os.getenv("LOOP_MONITOR_REPORT_SECONDS", "300"))
+
+# Announcements to all players of a game are sent as at most DM_FANOUT_RATE_PER_SECOND direct messages per second, DM_FANOUT_CONCURRENCY at a time.
+DM_FANOUT_RATE_PER_SECOND = float(os.getenv("DM_FANOUT_RATE_PER_SECOND", "5"))
+DM_FANOUT_CONCURRENCY = int(os.getenv("DM_FANOUT_CONCURRENCY", "5"))
+
+# The players of a game get a reminder this many hours before it starts, one for every comma separated value.
+GAME_REMINDER_HOURS = [
+    float(hours) for hours in os.getenv("GAME_REMINDER_HOURS", "24").split(",") if hours
+]
+
+# At most this many games can have their sign ups open at the same time. Every open game keeps its own sign up state in memory.
+MAX_OPEN_SIGNUPS = int(os.getenv("MAX_OPEN_SIGNUPS", "20"))
+
+# Number of recent messages discord.py keeps in memory, 0 to keep none. The bot never reads messages from this cache.
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "100"))
+# Requests the members of every guild when the bot connects. The bot doesn't use member lists, so this only costs memory and startup time.
+CHUNK_GUILDS_AT_STARTUP = os.getenv("CHUNK_GUILDS_AT_STARTUP", "0") == "1"
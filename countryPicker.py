@@ -0,0 +1,187 @@
+import math
+from typing import Awaitable, Callable
+
+import discord
+from discord.ui import Button, Modal, Select, TextInput, View
+from discord.ui.select import SelectOption
+
+from referenceData import getReferenceData
+
+
+# Discord rejects selects with more than 25 options.
+PAGE_SIZE = 25
+
+ALL_FACTIONS = "0"
+
+
+class CountrySearchModal(Modal, title="Search countries"):
+    """Asks for the beginning of a country name or tag. An empty search shows all countries again.
+    The countries of the base game have their tags from the migrations, other countries once an admin sets them with setCountryTag.
+    """
+
+    prefix = TextInput(
+        label="Country name or tag",
+        placeholder="For example: Ger, Union or SOV",
+        required=False,
+        max_length=40,
+    )
+
+    def __init__(self, picker: "CountryPicker") -> None:
+        super().__init__()
+        self.picker = picker
+        self.prefix.default = picker.prefix
+
+    async def on_submit(self, interaction: discord.Interaction) -> None:
+        self.picker.prefix = self.prefix.value.strip()
+        self.picker.page = 0
+        await self.picker.refresh(interaction)
+
+
+class CountryPicker:
+    """Country select of SignupDirectMessage, with a faction filter, a name or tag search and pages of PAGE_SIZE countries.
+    Searches use the prefix index of the reference data. The available countries are fetched again on every change,
+    so countries taken by other players in the meantime disappear from the pages.
+    """
+
+    def __init__(
+        self,
+        view: View,
+        fetchAvailableCountryIDs: Callable[[], Awaitable[list]],
+        onSelect: Callable[[discord.Interaction], Awaitable[None]],
+    ) -> None:
+        self.view = view
+        self.fetchAvailableCountryIDs = fetchAvailableCountryIDs
+        self.availableCountryIDs = []
+
+        self.factionID = ALL_FACTIONS
+        self.prefix = ""
+        self.page = 0
+
+        self.factionSelect = Select(
+            placeholder="All factions",
+            options=[SelectOption(label="All factions", value=ALL_FACTIONS)]
+            + [
+                SelectOption(label=faction.name, value=str(faction.factionID))
+                for faction in getReferenceData().factions[: PAGE_SIZE - 1]
+            ],
+            row=0,
+        )
+        self.factionSelect.callback = self.factionSelectCallback
+
+        self.countrySelect = Select(placeholder="Select a country!", row=1)
+        self.countrySelect.callback = onSelect
+
+        self.previousButton = Button(label="◀", row=2)
+        self.previousButton.callback = self.previousButtonCallback
+        self.searchButton = Button(
+            label="Search", emoji="🔎", style=discord.ButtonStyle.blurple, row=2
+        )
+        self.searchButton.callback = self.searchButtonCallback
+        self.nextButton = Button(label="▶", row=2)
+        self.nextButton.callback = self.nextButtonCallback
+
+        self.items = (
+            self.factionSelect,
+            self.countrySelect,
+            self.previousButton,
+            self.searchButton,
+            self.nextButton,
+        )
+
+    async def setup(self) -> None:
+        """Fetches the available countries and adds the picker to the view."""
+        self.availableCountryIDs = await self.fetchAvailableCountryIDs()
+        self.render()
+        for item in self.items:
+            self.view.add_item(item)
+
+    def remove(self) -> None:
+        """Removes the picker from the view, once a country is selected."""
+        for item in self.items:
+            self.view.remove_item(item)
+
+    def disable(self) -> None:
+        for item in self.items:
+            item.disabled = True
+
+    def filteredCountryIDs(self) -> list:
+        """Returns the available countries that match the faction filter and the search, sorted by id."""
+        referenceData = getReferenceData()
+        countryIDs = self.availableCountryIDs
+        if self.prefix:
+            available = set(countryIDs)
+            countryIDs = [
+                countryID
+                for countryID in referenceData.countryIndex.search(self.prefix)
+                if countryID in available
+            ]
+        if self.factionID != ALL_FACTIONS:
+            factionID = int(self.factionID)
+            countryIDs = [
+                countryID
+                for countryID in countryIDs
+                if referenceData.countriesByID[countryID].factionID == factionID
+            ]
+        return countryIDs
+
+    def render(self) -> None:
+        """Fills the country select with the current page and enables the buttons that lead somewhere."""
+        countryIDs = self.filteredCountryIDs()
+        pageCount = max(math.ceil(len(countryIDs) / PAGE_SIZE), 1)
+        self.page = min(max(self.page, 0), pageCount - 1)
+
+        countriesByID = getReferenceData().countriesByID
+        pageCountryIDs = countryIDs[self.page * PAGE_SIZE : (self.page + 1) * PAGE_SIZE]
+        self.countrySelect.options = [
+            SelectOption(
+                label=countriesByID[countryID].name,
+                value=countryID,
+                emoji=countriesByID[countryID].emoji,
+            )
+            for countryID in pageCountryIDs
+        ]
+
+        filters = []
+        if self.factionID != ALL_FACTIONS:
+            filters.append(self.factionSelect.placeholder)
+        if self.prefix:
+            filters.append(f'"{self.prefix}"')
+        filterText = f" for {', '.join(filters)}" if filters else ""
+
+        if countryIDs:
+            self.countrySelect.disabled = False
+            self.countrySelect.placeholder = f"Select a country! ({len(countryIDs)} countries{filterText}, page {self.page + 1}/{pageCount})"
+        else:
+            # A select needs at least one option, even while it is disabled.
+            self.countrySelect.options = [SelectOption(label="-", value="0")]
+            self.countrySelect.disabled = True
+            self.countrySelect.placeholder = f"No available countries{filterText}."
+
+        self.previousButton.disabled = self.page == 0
+        self.nextButton.disabled = self.page >= pageCount - 1
+
+    async def refresh(self, interaction: discord.Interaction) -> None:
+        """Fetches the available countries again and shows the current page in the message of the interaction."""
+        self.availableCountryIDs = await self.fetchAvailableCountryIDs()
+        self.render()
+        await interaction.response.edit_message(view=self.view)
+
+    async def factionSelectCallback(self, interaction: discord.Interaction) -> None:
+        self.factionID = interaction.data["values"][0]
+        for option in self.factionSelect.options:
+            option.default = option.value == self.factionID
+            if option.default:
+                self.factionSelect.placeholder = option.label
+        self.page = 0
+        await self.refresh(interaction)
+
+    async def previousButtonCallback(self, interaction: discord.Interaction) -> None:
+        self.page -= 1
+        await self.refresh(interaction)
+
+    async def nextButtonCallback(self, interaction: discord.Interaction) -> None:
+        self.page += 1
+        await self.refresh(interaction)
+
+    async def searchButtonCallback(self, interaction: discord.Interaction) -> None:
+        await interaction.response.send_modal(CountrySearchModal(self))
@@ -1,37 +1,49 @@
 import sqlite3
 import datetime as dt
+from enum import Enum
+from typing import Optional
 
+from asyncDatabase import AsyncDatabase
+from referenceData import getReferenceData
 
-def insertNewSignUpAttempt(
-    connection: sqlite3.Connection, cursor: sqlite3.Cursor, userID: str
-) -> None:
+
+# Countries with at least one free slot, keyed by game_id. The cache is only read and written on the database worker thread,
+# so it stays consistent with the writes that invalidate it.
+availableCountriesCache: dict = {}
+
+
+async def insertNewSignUpAttempt(database: AsyncDatabase, userID: str) -> None:
     """Inserts a new signup attempt into the database. Used to prevent calling the signup command multiple times. Also, used to prevent signing up too many times in a given period of time."""
     isActive = 1  # By default sets record to be active. Sign up attempts are deactived when the signup is finished, the bot is restarted, the game starts or signup expires.
 
-    cursor.execute(
+    await database.execute(
         "INSERT INTO signup_attempts (player_id, datetime, is_active) VALUES(?, ?, ?)",
         (userID, dt.datetime.now(), isActive),
+        commit=True,
     )
-    connection.commit()
 
 
-def insertNewUnsignAttempt(
-    connection: sqlite3.Connection, cursor: sqlite3.Cursor, userID: str
-) -> None:
+async def insertNewUnsignAttempt(database: AsyncDatabase, userID: str) -> None:
     """Inserts a new unsign attempt into the database. Used to prevent calling the unsign command multiple times. Also, used to prevent unsigning too many times in a given period of time."""
     isActive = 1  # By default sets record to be active. Unsign attempts are deactived when the unsign is finished, the bot is restarted, the game starts or unsign expires.
 
-    cursor.execute(
+    await database.execute(
         "INSERT INTO unsign_attempts (player_id, datetime, is_active) VALUES(?, ?, ?)",
         (userID, dt.datetime.now(), isActive),
+        commit=True,
     )
-    connection.commit()
 
 
-def insertPlayerIfNotExists(
-    cursor: sqlite3.Cursor, userID: str, discordTag: str
+async def insertPlayerIfNotExists(
+    database: AsyncDatabase, userID: str, discordTag: str
 ) -> None:
     """Checks if a player exists in the database. If not, inserts a new player."""
+    await database.run(_insertPlayerIfNotExists, userID, discordTag, commit=True)
+
+
+def _insertPlayerIfNotExists(
+    cursor: sqlite3.Cursor, userID: str, discordTag: str
+) -> None:
     cursor.execute(
         "SELECT EXISTS(SELECT 1 FROM players WHERE player_id=? LIMIT 1)",
         (userID,),
@@ -48,204 +60,536 @@ def insertPlayerIfNotExists(
         )
 
 
-def insertGameRecord(
-    connection: sqlite3.Connection,
-    cursor: sqlite3.Cursor,
+class ClaimResult(Enum):
+    """Outcome of claimGameSlot."""
+
+    CLAIMED = "claimed"
+    COUNTRY_TAKEN = (
+        "country taken"  # Someone else holds this controller slot of the country.
+    )
+    OPTION_TAKEN = "option taken"  # The player already holds a country for this option.
+    SIGNUPS_CLOSED = "signups closed"  # The game started or was deleted.
+
+
+async def claimGameSlot(
+    database: AsyncDatabase,
     gameID: str,
     userID: str,
     countryID: str,
     controller: str,
     option: str,
-) -> None:
-    "Inserts a new game record into the database. Used to sign up for a game."
+) -> ClaimResult:
+    """Claims a controller slot of a country for a player's option. Used to sign up for a game.
+    The insert only succeeds if the slot and the option are still free. This is enforced by the unique indexes on active game records,
+    so concurrent sign ups for the same slot cannot both succeed and do not need to be serialized. Returns which of the two was taken otherwise.
+    Nothing is claimed once the sign ups of the game are closed, which is checked in the same transaction as the insert.
+    """
 
-    cursor.execute(
-        "INSERT INTO game_records (game_id, player_id, country_id, faction_id, ending_id, controller, option, singup_time) VALUES (?,?,?,?,?, ?, ?, ?)",
+    factionID = getFactionID(countryID)
+
+    return await database.run(
+        _claimGameSlot,
         (
             int(gameID),
             int(userID),
             int(countryID),
-            int(getFactionID(cursor, countryID)),
+            int(factionID),
             3,
             int(controller),
-            option,
+            int(option),
             dt.datetime.now(),
         ),
+        commit=True,
+    )
+
+
+def _claimGameSlot(cursor: sqlite3.Cursor, record: tuple) -> ClaimResult:
+    cursor.execute("SELECT signups_closed FROM games WHERE game_id = ?", (record[0],))
+    game = cursor.fetchone()
+    if game is None or game[0]:
+        return ClaimResult.SIGNUPS_CLOSED
+
+    cursor.execute(
+        "INSERT INTO game_records (game_id, player_id, country_id, faction_id, ending_id, controller, option, singup_time) VALUES (?,?,?,?,?, ?, ?, ?) ON CONFLICT DO NOTHING",
+        record,
+    )
+    if cursor.rowcount == 1:
+        availableCountriesCache.pop(record[0], None)
+        return ClaimResult.CLAIMED
+
+    gameID, playerID, _, _, _, _, option, _ = record
+    cursor.execute(
+        "SELECT EXISTS(SELECT 1 FROM game_records WHERE game_id = ? AND player_id = ? AND option = ? AND is_active = 1)",
+        (gameID, playerID, option),
     )
-    connection.commit()
+    if cursor.fetchone()[0]:
+        return ClaimResult.OPTION_TAKEN
+    return ClaimResult.COUNTRY_TAKEN
 
 
-def setPlayerSignUpAttemptsInactive(
-    connection: sqlite3.Connection, cursor: sqlite3.Cursor, playerID: str
+async def setPlayerSignUpAttemptsInactive(
+    database: AsyncDatabase, playerID: str
 ) -> None:
     """Sets all signup attempts for a given player to inactive. Used to prevent signing up for multiple games at once. Executed when the view for signing up is stopped."""
 
-    cursor.execute(
+    await database.execute(
         "UPDATE signup_attempts SET is_active = 0 WHERE player_id = ?",
         (playerID,),
+        commit=True,
+    )
+
+
+async def setPlayerUnsignAttemptsInactive(
+    database: AsyncDatabase, playerID: str
+) -> None:
+    """Sets all unsign attempts for a given player to inactive. Executed when the view for unsigning is stopped."""
+
+    await database.execute(
+        "UPDATE unsign_attempts SET is_active = 0 WHERE player_id = ?",
+        (playerID,),
+        commit=True,
     )
-    connection.commit()
 
 
-def setGameRecordInactive(
-    connection: sqlite3.Connection, cursor: sqlite3.Cursor, recordID: str
-):
+async def setGameRecordInactive(database: AsyncDatabase, recordID: str) -> None:
     """Sets a game record to inactive. Used to unsign from a country."""
 
+    await database.run(_setGameRecordInactive, recordID, commit=True)
+
+
+def _setGameRecordInactive(cursor: sqlite3.Cursor, recordID: str) -> None:
     cursor.execute(
         "UPDATE game_records SET is_active = 0 WHERE record_id = ?", (recordID,)
     )
+    cursor.execute("SELECT game_id FROM game_records WHERE record_id = ?", (recordID,))
+    row = cursor.fetchone()
+    if row is not None:
+        availableCountriesCache.pop(row[0], None)
 
-    connection.commit()
 
+async def deactivateAllAttempts(database: AsyncDatabase) -> None:
+    """Sets every active signup and unsign attempt to inactive. Executed at startup, since no flow survives a restart."""
 
-def checkIfUserAlreadyHasSignUp(cursor: sqlite3.Cursor, userID: str) -> bool:
-    """Checks if a user already has an active signup attempt. Used to prevent calling the signup command multiple times.""" ""
+    await database.run(_deactivateAllAttempts, commit=True)
 
-    cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM signup_attempts WHERE player_id = ? and is_active = 1 LIMIT 1)",
-        (userID,),
+
+def _deactivateAllAttempts(cursor: sqlite3.Cursor) -> None:
+    cursor.execute("UPDATE signup_attempts SET is_active = 0 WHERE is_active = 1")
+    cursor.execute("UPDATE unsign_attempts SET is_active = 0 WHERE is_active = 1")
+
+
+async def fetchRecentSignUpAttempts(
+    database: AsyncDatabase, since: dt.datetime
+) -> list:
+    """Returns (player_id, datetime) of all signup attempts made after a given time, oldest first. Used to seed the signup rate limiter at startup."""
+
+    return await database.fetchall(
+        "SELECT player_id, datetime FROM signup_attempts WHERE datetime > ? ORDER BY datetime",
+        (since,),
     )
-    return bool(int(cursor.fetchone()[0]))
 
 
-def checkIfUserAlreadyHasUnsign(cursor: sqlite3.Cursor, userID: str) -> bool:
-    """Checks if a user already has an active unsign attempt. Used to prevent calling the unsign command multiple times."""
+async def fetchRecentUnsignAttempts(
+    database: AsyncDatabase, since: dt.datetime
+) -> list:
+    """Returns (player_id, datetime) of all unsign attempts made after a given time, oldest first. Used to seed the unsign rate limiter at startup."""
 
-    cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM unsign_attempts WHERE player_id = ? and is_active = 1 LIMIT 1)",
-        (userID,),
+    return await database.fetchall(
+        "SELECT player_id, datetime FROM unsign_attempts WHERE datetime > ? ORDER BY datetime",
+        (since,),
     )
-    return bool(int(cursor.fetchone()[0]))
 
 
-def checkIfPlayerSignedForOption(
-    cursor: sqlite3.Cursor, playerID: str, option: int, gameID: str
-) -> bool:
-    "Checks if player signed for a given option. Used to prevent signing for the same option multiple times."
+async def fetchUserSignupState(
+    database: AsyncDatabase, gameID: str, userID: str
+) -> tuple:
+    """Returns whether the user signed for the first option and whether the user signed for the second option.
+    Used by the sign up button instead of two separate checks."""
 
-    cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM game_records WHERE player_id = ? AND option = ? and game_id = ? and is_active = 1 LIMIT 1)",
-        (playerID, option, gameID),
+    row = await database.fetchone(
+        "SELECT EXISTS(SELECT 1 FROM game_records WHERE game_id = ? AND player_id = ? AND option = 1 AND is_active = 1), EXISTS(SELECT 1 FROM game_records WHERE game_id = ? AND player_id = ? AND option = 2 AND is_active = 1)",
+        (gameID, userID, gameID, userID),
     )
-    return bool(int(cursor.fetchone()[0]))
+    return tuple(bool(int(value)) for value in row)
 
 
-def checkIfCountryHasController(
-    cursor: sqlite3.Cursor, gameID: str, countryID: str, controller: str
+async def checkIfCountryHasController(
+    database: AsyncDatabase, gameID: str, countryID: str, controller: str
 ) -> bool:
     "Checks if a country has a controller. Used to prevent signing for a country that already has the same type of controller."
 
-    cursor.execute(
+    row = await database.fetchone(
         "SELECT EXISTS(SELECT 1 FROM game_records WHERE game_id = ? AND country_id = ? AND controller = ? AND is_active = 1 LIMIT 1)",
         (gameID, countryID, controller),
     )
-    return bool(int(cursor.fetchone()[0]))
+    return bool(int(row[0]))
 
 
-def fetchAvailableCountries(cursor: sqlite3.Cursor, gameID: str, userID: str) -> list:
+async def fetchAvailableCountries(
+    database: AsyncDatabase, gameID: str, userID: str
+) -> list:
     """Returns a sorted list of available countries for a given game and user. Used to display available countries to the user.
-    Selects all countries, and then removes majors, minors, and countries the user signed for from the list.
+    Takes the cached list of countries with a free slot in the game, and then removes countries the user signed for from the list.
     """
 
+    return await database.run(_fetchAvailableCountries, gameID, userID)
+
+
+def _fetchAvailableCountries(cursor: sqlite3.Cursor, gameID: str, userID: str) -> list:
+    availableCountries = availableCountriesCache.get(int(gameID))
+    if availableCountries is None:
+        # Majors have two slots (primary and secondary controller), minors have one.
+        cursor.execute(
+            "SELECT country_id, name, emoji FROM countries JOIN countries_factions_historical USING(country_id) LEFT JOIN (SELECT country_id, COUNT(*) AS taken_slots FROM game_records WHERE game_id = ? AND is_active = 1 GROUP BY country_id) USING(country_id) WHERE IFNULL(taken_slots, 0) < CASE WHEN is_major = 1 THEN 2 ELSE 1 END ORDER BY country_id",
+            (gameID,),
+        )
+        availableCountries = tuple(cursor.fetchall())
+        availableCountriesCache[int(gameID)] = availableCountries
+
     cursor.execute(
-        "SELECT country_id, name, emoji FROM countries JOIN countries_factions_historical USING(country_id)",
+        "SELECT country_id FROM game_records WHERE game_id = ? AND player_id = ? AND is_active = 1",
+        (gameID, userID),
     )
+    signedCountryIDs = {row[0] for row in cursor.fetchall()}
 
-    allCountries = cursor.fetchall()
+    return [
+        country for country in availableCountries if country[0] not in signedCountryIDs
+    ]
 
-    cursor.execute(
-        "SELECT country_id, name, emoji FROM countries JOIN countries_factions_historical USING(country_id) WHERE country_id IN ( SELECT country_id FROM game_records JOIN countries USING(country_id) WHERE game_id = ? AND is_major = 1 and is_active = 1 GROUP BY country_id HAVING COUNT(*) = 2)",
+
+async def fetchAvailableCountriesForUser(
+    database: AsyncDatabase, gameID: str, userID: str
+) -> list:
+    """Returns a list of countries available for a given user. List contains country name, emoji, controller type, and option. Used to display available countries to the user when user tries to unsign."""
+
+    return await database.fetchall(
+        "SELECT countries.name, countries.emoji, game_records.record_id, game_records.controller, game_records.option FROM countries JOIN game_records USING(country_id) WHERE game_records.game_id = ? AND game_records.player_id = ? AND game_records.is_active = 1;",
+        (gameID, userID),
+    )
+
+
+async def getPrimaryControllerID(
+    database: AsyncDatabase, gameID: str, countryID: str
+) -> str:
+    """Returns player_id of the primary controller for a given country."""
+
+    row = await database.fetchone(
+        "SELECT player_id FROM game_records JOIN players USING(player_id) WHERE game_id = ? AND country_id = ? AND controller = 1 AND is_active = 1",
+        (gameID, countryID),
+    )
+    return row[0]
+
+
+async def getGameDate(database: AsyncDatabase, gameID: str) -> str:
+    "Returns game date for a given game_id."
+
+    row = await database.fetchone(
+        "SELECT starting_time FROM games WHERE game_id = ?",
         (gameID,),
     )
+    return row[0]
+
+
+async def insertSecondaryControllerRequest(
+    database: AsyncDatabase,
+    gameID: str,
+    requesterID: str,
+    countryID: str,
+    option: str,
+    primaryControllerID: str,
+    expiresAt: dt.datetime,
+) -> int:
+    """Stores a pending request to become the secondary controller of a country. Returns the request_id."""
+
+    return await database.run(
+        _insertSecondaryControllerRequest,
+        (
+            int(gameID),
+            int(requesterID),
+            int(countryID),
+            int(option),
+            int(primaryControllerID),
+            expiresAt,
+        ),
+        commit=True,
+    )
 
-    signedMajors = cursor.fetchall()
 
+def _insertSecondaryControllerRequest(cursor: sqlite3.Cursor, request: tuple) -> int:
     cursor.execute(
-        "SELECT country_id, name, emoji FROM countries JOIN countries_factions_historical USING(country_id) WHERE country_id IN ( SELECT country_id FROM game_records JOIN countries USING(country_id) WHERE game_id = ? AND is_major = 0 and is_active = 1 GROUP BY country_id HAVING COUNT(*) = 1)",
+        "INSERT INTO secondary_controller_requests (game_id, requester_id, country_id, option, primary_controller_id, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+        request,
+    )
+    return cursor.lastrowid
+
+
+async def expireGameSecondaryControllerRequests(
+    database: AsyncDatabase, gameID: str
+) -> list:
+    """Expires the pending secondary controller requests of a game. Used when its sign ups close.
+    Returns (requester_id, country_id) of every request that was expired.
+    """
+
+    return await database.run(
+        _expireGameSecondaryControllerRequests, int(gameID), commit=True
+    )
+
+
+def _expireGameSecondaryControllerRequests(
+    cursor: sqlite3.Cursor, gameID: int
+) -> list:
+    cursor.execute(
+        "UPDATE secondary_controller_requests SET status = 'expired' WHERE game_id = ? AND status = 'pending' RETURNING requester_id, country_id",
         (gameID,),
     )
+    return cursor.fetchall()
+
+
+async def fetchPendingSecondaryControllerRequests(database: AsyncDatabase) -> list:
+    """Returns (request_id, expires_at) of all pending secondary controller requests. Used to schedule their expiry at startup."""
+
+    return await database.fetchall(
+        "SELECT request_id, expires_at FROM secondary_controller_requests WHERE status = 'pending' ORDER BY expires_at",
+    )
 
-    singedMinors = cursor.fetchall()
 
+async def resolveSecondaryControllerRequest(
+    database: AsyncDatabase, requestID: str, status: str
+) -> Optional[tuple]:
+    """Changes the status of a pending secondary controller request. Only the first answer or the expiry wins.
+    Returns (game_id, requester_id, country_id, option, primary_controller_id) of the request, or None if it was not pending anymore.
+    """
+
+    return await database.run(
+        _resolveSecondaryControllerRequest, status, int(requestID), commit=True
+    )
+
+
+def _resolveSecondaryControllerRequest(
+    cursor: sqlite3.Cursor, status: str, requestID: int
+) -> Optional[tuple]:
     cursor.execute(
-        "SELECT country_id, name, emoji FROM countries JOIN countries_factions_historical USING(country_id) WHERE country_id IN ( SELECT country_id FROM game_records JOIN countries USING(country_id) WHERE game_id = ? AND player_id = ? and is_active = 1)",
-        (gameID, userID),
+        "UPDATE secondary_controller_requests SET status = ? WHERE request_id = ? AND status = 'pending' RETURNING game_id, requester_id, country_id, option, primary_controller_id",
+        (status, requestID),
     )
+    return cursor.fetchone()
 
-    signedNationsByPlayer = cursor.fetchall()
 
-    allCountriesSet = set(allCountries)
-    signedCountriesSet = set(signedMajors + singedMinors + signedNationsByPlayer)
+async def saveSignupMessages(
+    database: AsyncDatabase, gameID: str, messages: list
+) -> None:
+    """Replaces the saved sign up messages of a game. messages are (channel_id, message_id, content_hash) of every roster part, in order."""
+
+    await database.run(_saveSignupMessages, int(gameID), messages, commit=True)
+
+
+def _saveSignupMessages(cursor: sqlite3.Cursor, gameID: int, messages: list) -> None:
+    cursor.execute("DELETE FROM signup_messages WHERE game_id = ?", (gameID,))
+    cursor.executemany(
+        "INSERT INTO signup_messages (game_id, part_index, channel_id, message_id, content_hash) VALUES (?, ?, ?, ?, ?)",
+        [
+            (gameID, partIndex, channelID, messageID, contentHash)
+            for partIndex, (channelID, messageID, contentHash) in enumerate(messages)
+        ],
+    )
+
 
-    availableCountriesSet = allCountriesSet - signedCountriesSet
-    availableCountries = list(availableCountriesSet)
-    availableCountries = sorted(
-        availableCountries, key=lambda x: x[0]
-    )  # Sorts by country_id
+async def deleteSignupMessages(database: AsyncDatabase, gameID: str) -> None:
+    """Forgets the sign up messages of a game. Used when the messages were deleted or the sign ups of the game closed."""
 
-    return availableCountries
+    await database.execute(
+        "DELETE FROM signup_messages WHERE game_id = ?", (gameID,), commit=True
+    )
+
+
+async def fetchSignupMessages(database: AsyncDatabase) -> list:
+    """Returns (game_id, part_index, channel_id, message_id, content_hash) of the saved sign up messages of the games whose sign ups are open,
+    ordered by game and part. Used at startup to re-attach the sign up buttons and resume refreshing the rosters.
+    """
+
+    # The games are read through games_open, so the query grows with the open games, not with every game ever posted.
+    return await database.fetchall(
+        "SELECT signup_messages.game_id, part_index, channel_id, message_id, content_hash FROM games INDEXED BY games_open JOIN signup_messages ON signup_messages.game_id = games.game_id WHERE games.signups_closed = 0 ORDER BY signup_messages.game_id, part_index"
+    )
 
 
-def fetchAvailableCountriesForUser(
-    cursor: sqlite3.Cursor, gameID: str, userID: str
+async def fetchGamePlayers(
+    database: AsyncDatabase, gameID: str, afterPlayerID: int = 0, limit: int = 100
 ) -> list:
-    """Returns a list of countries available for a given user. List contains country name, emoji, controller type, and option. Used to display available countries to the user when user tries to unsign."""
+    """Returns (player_id, dm_closed_at) of up to limit players signed up for a game whose player_id is greater than afterPlayerID, ordered by player_id.
+    Used to go through the players of a game page by page, without loading all of them at once.
+    """
 
-    cursor.execute(
-        "SELECT countries.name, countries.emoji, game_records.record_id, game_records.controller, game_records.option FROM countries JOIN game_records USING(country_id) WHERE game_records.game_id = ? AND game_records.player_id = ? AND game_records.is_active = 1;",
-        (gameID, userID),
+    return await database.fetchall(
+        "SELECT DISTINCT game_records.player_id, players.dm_closed_at FROM game_records JOIN players USING(player_id) WHERE game_records.game_id = ? AND game_records.is_active = 1 AND game_records.player_id > ? ORDER BY game_records.player_id LIMIT ?",
+        (gameID, afterPlayerID, limit),
     )
 
-    signedNationsByPlayer = cursor.fetchall()
-    return signedNationsByPlayer
 
+async def setPlayersDMsClosed(
+    database: AsyncDatabase, playerIDs: list, closedAt: Optional[dt.datetime]
+) -> None:
+    """Marks the direct messages of the players as closed since closedAt, or as open again if closedAt is None."""
+
+    await database.run(_setPlayersDMsClosed, playerIDs, closedAt, commit=True)
 
-def getFactionID(cursor: sqlite3.Cursor, countryID: str) -> int:
-    "Returns faction_id for a given country. Used for historical games."
 
-    cursor.execute(
-        "SELECT faction_id FROM countries_factions_historical WHERE country_id = ?",
-        (countryID,),
+def _setPlayersDMsClosed(
+    cursor: sqlite3.Cursor, playerIDs: list, closedAt: Optional[dt.datetime]
+) -> None:
+    cursor.executemany(
+        "UPDATE players SET dm_closed_at = ? WHERE player_id = ?",
+        [(closedAt, playerID) for playerID in playerIDs],
     )
-    return cursor.fetchone()[0]
 
 
-def getPrimaryControllerID(cursor: sqlite3.Cursor, gameID: str, countryID: str) -> str:
-    """Returns player_id of the primary controller for a given country."""
+async def insertGame(database: AsyncDatabase, typeID: int, startingTime: str) -> int:
+    "Inserts a new game into the database. Returns its game_id."
+
+    return await database.run(_insertGame, typeID, startingTime, commit=True)
 
+
+def _insertGame(cursor: sqlite3.Cursor, typeID: int, startingTime: str) -> int:
     cursor.execute(
-        "SELECT player_id FROM game_records JOIN players USING(player_id) WHERE game_id = ? AND country_id = ? AND controller = 1",
-        (gameID, countryID),
+        "INSERT INTO games (type_id, starting_time) VALUES (?, ?)",
+        (typeID, startingTime),
     )
-    return cursor.fetchone()[0]
+    return cursor.lastrowid
 
 
-def getCountryNameByID(cursor: sqlite3.Cursor, countryID: str) -> str:
-    "Returns country name for a given country_id."
+async def fetchGames(database: AsyncDatabase) -> list:
+    "Returns game_id, game type name and starting_time of all games."
 
-    cursor.execute(
-        "SELECT name FROM countries WHERE country_id = ?",
-        (countryID,),
+    return await database.fetchall(
+        "SELECT game_id, t.name, starting_time FROM games JOIN types t USING(type_id)"
     )
-    return cursor.fetchone()[0]
 
 
-def getGameDate(cursor: sqlite3.Cursor, gameID: str) -> str:
-    "Returns game date for a given game_id."
+async def fetchOpenGames(database: AsyncDatabase) -> list:
+    "Returns game_id and starting_time of the games whose sign ups were not closed yet. Used at startup to schedule their reminders and start."
 
-    cursor.execute(
-        "SELECT starting_time FROM games WHERE game_id = ?",
-        (gameID,),
+    return await database.fetchall(
+        "SELECT game_id, starting_time FROM games WHERE signups_closed = 0"
     )
-    return cursor.fetchone()[0]
 
 
-def isCountryMajor(cursor: sqlite3.Cursor, countryID: str) -> bool:
-    "Checks if a country is a major or not."
+async def closeGameSignups(database: AsyncDatabase, gameID: str) -> None:
+    "Marks the sign ups of a game as closed. Called when the game starts."
+
+    await database.execute(
+        "UPDATE games SET signups_closed = 1 WHERE game_id = ?", (gameID,), commit=True
+    )
+
 
+async def checkIfGameExists(database: AsyncDatabase, gameID: str) -> bool:
+    "Checks if a game with a given game_id exists."
+
+    row = await database.fetchone(
+        "SELECT EXISTS(SELECT 1 FROM games WHERE game_id=? LIMIT 1)", (gameID,)
+    )
+    return bool(int(row[0]))
+
+
+async def updateGameStartingTime(
+    database: AsyncDatabase, gameID: str, startingTime: str
+) -> None:
+    "Changes the starting time of a game."
+
+    await database.execute(
+        "UPDATE games SET starting_time = ? WHERE game_id = ?",
+        (startingTime, gameID),
+        commit=True,
+    )
+
+
+async def updateGameType(database: AsyncDatabase, gameID: str, typeID: int) -> None:
+    "Changes the type of a game."
+
+    await database.execute(
+        "UPDATE games SET type_id = ? WHERE game_id = ?",
+        (typeID, gameID),
+        commit=True,
+    )
+
+
+async def updateCountryTag(database: AsyncDatabase, countryID: str, tag: str) -> None:
+    "Sets the HOI4 tag of a country, by which the country picker finds it."
+
+    await database.execute(
+        "UPDATE countries SET tag = ? WHERE country_id = ?",
+        (tag, countryID),
+        commit=True,
+    )
+
+
+async def resetSignupTables(database: AsyncDatabase) -> None:
+    "Deletes all game records, signup attempts, unsign attempts and secondary controller requests."
+
+    await database.run(_resetSignupTables, commit=True)
+
+
+def _resetSignupTables(cursor: sqlite3.Cursor) -> None:
+    cursor.execute("DELETE FROM game_records")
+    cursor.execute("DELETE FROM signup_attempts")
+    cursor.execute("DELETE FROM unsign_attempts")
+    cursor.execute("DELETE FROM secondary_controller_requests")
+    availableCountriesCache.clear()
+
+
+async def deleteGameByID(database: AsyncDatabase, gameID: str) -> None:
+    "Deletes a game from the database."
+
+    await database.run(_deleteGameByID, gameID, commit=True)
+
+
+def _deleteGameByID(cursor: sqlite3.Cursor, gameID: str) -> None:
+    cursor.execute("DELETE FROM games WHERE game_id = ?", (gameID,))
     cursor.execute(
-        "SELECT is_major FROM countries WHERE country_id = ?;",
-        (countryID,),
+        "DELETE FROM secondary_controller_requests WHERE game_id = ?", (gameID,)
     )
-    return bool(int(cursor.fetchone()[0]))
+    cursor.execute("DELETE FROM signup_messages WHERE game_id = ?", (gameID,))
+    availableCountriesCache.pop(int(gameID), None)
+
+
+async def clearAvailableCountriesCache(
+    database: AsyncDatabase, gameID: Optional[str] = None
+) -> None:
+    "Drops the cached available countries of a game, or of all games if gameID is None. Used when the reference tables change and when the sign ups of a game end."
+
+    await database.run(_clearAvailableCountriesCache, gameID)
+
+
+def _clearAvailableCountriesCache(
+    cursor: sqlite3.Cursor, gameID: Optional[str]
+) -> None:
+    if gameID is None:
+        availableCountriesCache.clear()
+    else:
+        availableCountriesCache.pop(int(gameID), None)
+
+
+def getFactionID(countryID: str) -> int:
+    "Returns faction_id for a given country. Used for historical games."
+
+    return getReferenceData().countriesByID[int(countryID)].factionID
+
+
+def getCountryNameByID(countryID: str) -> str:
+    "Returns country name for a given country_id."
+
+    return getReferenceData().countriesByID[int(countryID)].name
+
+
+def isCountryMajor(countryID: str) -> bool:
+    "Checks if a country is a major or not."
+
+    return getReferenceData().countriesByID[int(countryID)].isMajor
+
+
+def getGameTypeID(gameType: str) -> Optional[int]:
+    "Returns type_id for a given game type name, or None if the game type does not exist."
+
+    gameType = getReferenceData().gameTypesByName.get(gameType)
+    if gameType is None:
+        return None
+    return gameType.typeID
@@ -1,12 +1,70 @@
 import discord
+from discord.ext import commands
 
+from ttlCache import TTLCache
 
-async def dmAreClosed(user: discord.User) -> bool:
-    """Returns True if the bot can't DM the user, False otherwise.
-    If DMs are closed user cannot sign up for the game."""
 
-    try:
-        dmChannel = await user.create_dm()
-        return False
-    except discord.Forbidden:
-        return True
+class DiscordIdentityCache:
+    """Caches the Discord lookups every sign up and unsign needs: users by id, their DM channels, and users whose DMs are known to be closed.
+    Users and DM channels rarely change, so they are kept for an hour. Closed DMs are kept only for a minute,
+    so a user who opens their DMs can sign up again soon. A Forbidden error when sending marks the DMs of the user as closed.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        maxSize: int = 10000,
+        ttlSeconds: float = 3600,
+        closedDMsTTLSeconds: float = 60,
+    ) -> None:
+        self.bot = bot
+        self.users = TTLCache(maxSize, ttlSeconds)
+        self.dmChannels = TTLCache(maxSize, ttlSeconds)
+        self.closedDMs = TTLCache(maxSize, closedDMsTTLSeconds)
+
+    async def fetchUser(self, userID: int) -> discord.User:
+        """Returns the user with the given id. Uses the client cache first, then this cache, and only then the API."""
+        userID = int(userID)
+
+        user = self.bot.get_user(userID) or self.users.get(userID)
+        if user is None:
+            user = await self.bot.fetch_user(userID)
+            self.users.set(userID, user)
+        return user
+
+    async def getDMChannel(self, user: discord.abc.User) -> discord.DMChannel:
+        """Returns the DM channel of the user, creating it only if neither discord.py nor this cache knows it."""
+        dmChannel = user.dm_channel or self.dmChannels.get(user.id)
+        if dmChannel is None:
+            dmChannel = await user.create_dm()
+            self.dmChannels.set(user.id, dmChannel)
+        return dmChannel
+
+    async def dmAreClosed(self, user: discord.abc.User) -> bool:
+        """Returns True if the bot can't DM the user, False otherwise.
+        If DMs are closed user cannot sign up for the game."""
+
+        if user.id in self.closedDMs:
+            return True
+
+        try:
+            await self.getDMChannel(user)
+            return False
+        except discord.Forbidden:
+            self.markDMsClosed(user.id)
+            return True
+
+    def markDMsClosed(self, userID: int) -> None:
+        """Remembers that the user cannot be messaged. Called when sending a DM fails with Forbidden."""
+        userID = int(userID)
+        self.closedDMs.set(userID, True)
+        self.dmChannels.pop(userID)
+
+    async def send(self, userID: int, *args, **kwargs) -> discord.Message:
+        """Sends a DM to the user with the given id. Raises discord.Forbidden, after marking the DMs as closed, if the user cannot be messaged."""
+        user = await self.fetchUser(userID)
+        try:
+            return await (await self.getDMChannel(user)).send(*args, **kwargs)
+        except discord.Forbidden:
+            self.markDMsClosed(userID)
+            raise
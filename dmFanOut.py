@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import datetime
+import logging
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, NamedTuple, Optional, Union
+
+import discord
+
+from asyncDatabase import AsyncDatabase
+from databaseFunctions import fetchGamePlayers, setPlayersDMsClosed
+from discordFunctions import DiscordIdentityCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutReport(NamedTuple):
+    recipients: int
+    sent: int
+    closedDMs: int
+    skipped: int  # Players whose direct messages were closed recently, not tried again.
+    failed: int
+    retries: int
+    seconds: float
+
+    def __str__(self) -> str:
+        perSecond = self.sent / self.seconds if self.seconds > 0 else 0.0
+        return f"Sent {self.sent} of {self.recipients} direct messages in {self.seconds:.1f} s ({perSecond:.1f} per second). {self.closedDMs} players have closed direct messages, {self.skipped} were skipped because their direct messages were closed recently, {self.failed} failed, {self.retries} retries."
+
+
+class TokenBucket:
+    """Allows ratePerSecond acquisitions per second on average, in bursts of up to capacity."""
+
+    def __init__(self, ratePerSecond: float, capacity: float) -> None:
+        self.ratePerSecond = ratePerSecond
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updatedAt = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and takes it. Waiters are served in order."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updatedAt) * self.ratePerSecond,
+                )
+                self.updatedAt = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.ratePerSecond)
+
+
+async def iterateGamePlayers(
+    database: AsyncDatabase, gameID: str, pageSize: int = 100
+) -> AsyncIterator[tuple]:
+    """Yields (player_id, dm_closed_at) of the players signed up for a game, reading pageSize players from the database at a time."""
+    afterPlayerID = 0
+    while True:
+        players = await fetchGamePlayers(database, gameID, afterPlayerID, pageSize)
+        for player in players:
+            yield player
+        if len(players) < pageSize:
+            return
+        afterPlayerID = players[-1][0]
+
+
+class DMFanOut:
+    """Sends the same direct message to many players without running into Discord's rate limits.
+    Recipients are read lazily and sent to by concurrency workers, which take their turns from a token bucket of ratePerSecond.
+    discord.py already waits out and retries the 429s Discord answers with, so the bucket only keeps the fan-out from causing them.
+    Server errors, and 429s discord.py gave up on, are retried with exponential backoff, up to maxRetries times.
+    Players whose direct messages are closed are marked in the players table, and skipped for closedDMsRetryAfter.
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        identityCache: DiscordIdentityCache,
+        ratePerSecond: float = 5,
+        concurrency: int = 5,
+        maxRetries: int = 5,
+        backoffSeconds: float = 1,
+        closedDMsRetryAfter: datetime.timedelta = datetime.timedelta(days=1),
+    ) -> None:
+        self.database = database
+        self.identityCache = identityCache
+        self.bucket = TokenBucket(ratePerSecond, max(concurrency, 1))
+        self.concurrency = concurrency
+        self.maxRetries = maxRetries
+        self.backoffSeconds = backoffSeconds
+        self.closedDMsRetryAfter = closedDMsRetryAfter
+
+        # Fan-outs started with start(), kept so they are not garbage collected while they run.
+        self.tasks = set()
+
+    def start(
+        self,
+        recipients: Union[AsyncIterator[tuple], list],
+        *args,
+        onFinished: Optional[Callable[[FanOutReport], Awaitable[None]]] = None,
+        **kwargs,
+    ) -> asyncio.Task:
+        """Runs send() in the background and awaits onFinished with the report when it is done."""
+
+        async def run() -> None:
+            report = await self.send(recipients, *args, **kwargs)
+            if onFinished is not None:
+                await onFinished(report)
+
+        task = asyncio.create_task(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def send(
+        self, recipients: Union[AsyncIterator[tuple], list], *args, **kwargs
+    ) -> FanOutReport:
+        """Sends a direct message with the given content to every recipient, (player_id, dm_closed_at) as returned by iterateGamePlayers."""
+        start = time.perf_counter()
+        counts = collections.Counter()
+        closedPlayerIDs = []
+        reopenedPlayerIDs = []
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        skipClosedSince = str(datetime.datetime.now() - self.closedDMsRetryAfter)
+
+        async def produce() -> None:
+            try:
+                async for playerID, dmClosedAt in _iterate(recipients):
+                    counts["recipients"] += 1
+                    if dmClosedAt is not None and dmClosedAt > skipClosedSince:
+                        counts["skipped"] += 1
+                        continue
+                    await queue.put((playerID, dmClosedAt))
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def work() -> None:
+            while (recipient := await queue.get()) is not None:
+                playerID, dmClosedAt = recipient
+                try:
+                    result = await self._sendOne(playerID, counts, *args, **kwargs)
+                except Exception:
+                    logger.exception("Could not send a direct message to %s.", playerID)
+                    result = "failed"
+                counts[result] += 1
+                if result == "closedDMs":
+                    closedPlayerIDs.append(playerID)
+                elif result == "sent" and dmClosedAt is not None:
+                    reopenedPlayerIDs.append(playerID)
+
+        await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+
+        if closedPlayerIDs:
+            await setPlayersDMsClosed(
+                self.database, closedPlayerIDs, datetime.datetime.now()
+            )
+        if reopenedPlayerIDs:
+            await setPlayersDMsClosed(self.database, reopenedPlayerIDs, None)
+
+        report = FanOutReport(
+            counts["recipients"],
+            counts["sent"],
+            counts["closedDMs"],
+            counts["skipped"],
+            counts["failed"],
+            counts["retries"],
+            time.perf_counter() - start,
+        )
+        logger.info(str(report))
+        return report
+
+    async def _sendOne(
+        self, playerID: int, counts: collections.Counter, *args, **kwargs
+    ) -> str:
+        """Sends the message to one player, retrying rate limits and server errors. Returns sent, closedDMs or failed."""
+        for attempt in range(self.maxRetries + 1):
+            await self.bucket.acquire()
+            try:
+                await self.identityCache.send(playerID, *args, **kwargs)
+                return "sent"
+            except discord.Forbidden:
+                return "closedDMs"
+            except discord.HTTPException as error:
+                if error.status == 429 or error.status >= 500:
+                    # Jitter, so the workers do not retry all at once.
+                    delay = self.backoffSeconds * 2**attempt * random.uniform(1, 1.5)
+                else:
+                    logger.warning(
+                        "Could not send a direct message to %s: %s", playerID, error
+                    )
+                    return "failed"
+
+            if attempt < self.maxRetries:
+                counts["retries"] += 1
+                await asyncio.sleep(delay)
+
+        logger.warning(
+            "Gave up sending a direct message to %s after %d retries.",
+            playerID,
+            self.maxRetries,
+        )
+        return "failed"
+
+
+async def _iterate(recipients: Union[AsyncIterator[tuple], list]) -> AsyncIterator:
+    if hasattr(recipients, "__aiter__"):
+        async for recipient in recipients:
+            yield recipient
+    else:
+        for recipient in recipients:
+            yield recipient
@@ -0,0 +1,100 @@
+import datetime
+import logging
+from typing import Awaitable, Callable
+
+from asyncDatabase import AsyncDatabase
+from databaseFunctions import closeGameSignups, fetchOpenGames
+from dmFanOut import DMFanOut, iterateGamePlayers
+from scheduler import Scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+class GameSchedule:
+    """Schedules the timed jobs of every game whose sign ups are open: a reminder to its players before it starts,
+    and the closing of its sign ups when it starts. The jobs run on the central scheduler, keyed by game,
+    so moving or deleting a game replaces or cancels them. Open games are loaded from the games table at startup.
+    Reminders whose time passed while the bot was offline are not sent late.
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        scheduler: Scheduler,
+        dmFanOut: DMFanOut,
+        onGameStart: Callable[[int], Awaitable[None]],
+        remindersBefore: list = (datetime.timedelta(hours=24),),
+    ) -> None:
+        self.database = database
+        self.scheduler = scheduler
+        self.dmFanOut = dmFanOut
+        self.onGameStart = onGameStart
+        self.remindersBefore = tuple(remindersBefore)
+
+        self.openGames = (
+            {}
+        )  # game_id -> starting time of the games whose sign ups are open
+
+    async def load(self) -> None:
+        """Schedules the jobs of all open games. Games that started while the bot was offline are closed right away."""
+        openGames = await fetchOpenGames(self.database)
+        for gameID, startingTime in openGames:
+            self.scheduleGame(gameID, startingTime)
+        if openGames:
+            logger.info("Scheduled %d open games.", len(openGames))
+
+    def isOpen(self, gameID: str) -> bool:
+        return int(gameID) in self.openGames
+
+    def scheduleGame(self, gameID: str, startingTime: str) -> None:
+        """Schedules the reminders and the start of a game, replacing its previous schedule."""
+        gameID = int(gameID)
+        startsAt = datetime.datetime.fromisoformat(str(startingTime))
+        self.cancelGame(gameID)
+        self.openGames[gameID] = startsAt
+
+        now = datetime.datetime.now()
+        for before in self.remindersBefore:
+            if startsAt - before > now:
+                self.scheduler.schedule(
+                    startsAt - before,
+                    self.remind,
+                    gameID,
+                    before,
+                    key=("gameReminder", gameID, before),
+                )
+        self.scheduler.schedule(
+            startsAt, self.closeGame, gameID, key=("gameStart", gameID)
+        )
+
+    def cancelGame(self, gameID: str) -> None:
+        """Cancels the jobs of a game. Used when the game is deleted or moved."""
+        gameID = int(gameID)
+        self.openGames.pop(gameID, None)
+        for before in self.remindersBefore:
+            self.scheduler.cancel(("gameReminder", gameID, before))
+        self.scheduler.cancel(("gameStart", gameID))
+
+    async def remind(self, gameID: int, before: datetime.timedelta) -> None:
+        startsAt = self.openGames.get(gameID)
+        if startsAt is None:
+            return
+
+        minutes = round(before.total_seconds() / 60)
+        if minutes % 60 == 0:
+            startsIn = f"{minutes // 60} hour{'s' if minutes != 60 else ''}"
+        else:
+            startsIn = f"{minutes} minute{'s' if minutes != 1 else ''}"
+        report = await self.dmFanOut.send(
+            iterateGamePlayers(self.database, gameID),
+            f"Reminder: game {gameID} you signed up for starts in {startsIn}, at **{startsAt:%Y-%m-%d %H:%M}**.",
+        )
+        logger.info("Reminded the players of game %s. %s", gameID, report)
+
+    async def closeGame(self, gameID: int) -> None:
+        """Closes the sign ups of a game when it starts."""
+        self.openGames.pop(gameID, None)
+        await closeGameSignups(self.database, gameID)
+        await self.onGameStart(gameID)
+        logger.info("Game %s started, its sign ups are closed.", gameID)
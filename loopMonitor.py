@@ -0,0 +1,206 @@
+import asyncio
+import collections
+import functools
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+import weakref
+from typing import NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Views add themselves here when they are created. Views that are finished or garbage collected are not counted as open.
+trackedViews = weakref.WeakSet()
+
+_THIS_FILE = os.path.abspath(__file__)
+_PROJECT_DIRECTORY = os.path.dirname(_THIS_FILE)
+# Installed packages, which can live inside the project directory, for example in a .venv of the checkout.
+_LIBRARY_DIRECTORIES = tuple(
+    {
+        os.path.abspath(sysconfig.get_paths()[name]) + os.sep
+        for name in ("purelib", "platlib")
+    }
+)
+
+
+class BlockingEvent(NamedTuple):
+    function: str  # module.function:line of the project code that held the loop, or of the innermost frame if none is project code.
+    startedAt: float  # time.time()
+    seconds: float
+
+
+class LoopReport(NamedTuple):
+    samples: int
+    p50LagMs: float
+    p99LagMs: float
+    maxLagMs: float
+    blockingEvents: list  # BlockingEvent, the most recent last.
+    openViews: dict  # View class name -> number of views that are still listening.
+
+    def __str__(self) -> str:
+        views = ", ".join(f"{name}: {count}" for name, count in self.openViews.items())
+        lines = [
+            f"Event loop lag over {self.samples} samples: p50 {self.p50LagMs:.1f} ms, p99 {self.p99LagMs:.1f} ms, max {self.maxLagMs:.1f} ms.",
+            f"Open views: {sum(self.openViews.values())} ({views or 'none'}).",
+            f"Callbacks over budget: {len(self.blockingEvents)}.",
+        ]
+        for event in self.blockingEvents[-5:]:
+            lines.append(
+                f"- {event.function} held the loop for {event.seconds * 1000:.0f} ms"
+            )
+        return "\n".join(lines)
+
+
+def countOpenViews() -> dict:
+    """Returns the number of tracked views that are still listening for interactions, by class name."""
+    counts = collections.Counter(
+        type(view).__name__ for view in list(trackedViews) if not view.is_finished()
+    )
+    return dict(counts.most_common())
+
+
+@functools.lru_cache(maxsize=1024)
+def _isProjectFile(fileName: str) -> bool:
+    """Returns True if fileName is a module of the bot, and not this module or an installed package."""
+    fileName = os.path.abspath(fileName)
+    if not fileName.startswith(_PROJECT_DIRECTORY + os.sep) or fileName == _THIS_FILE:
+        return False
+    if fileName.startswith(_LIBRARY_DIRECTORIES):
+        return False
+    parts = fileName[len(_PROJECT_DIRECTORY) :].split(os.sep)
+    return "site-packages" not in parts and "dist-packages" not in parts
+
+
+def _describeFrame(frame) -> str:
+    """Returns module.function:line of the innermost project frame of a stack, or of its innermost frame."""
+    innermost = frame
+    while frame is not None:
+        if _isProjectFile(frame.f_code.co_filename):
+            break
+        frame = frame.f_back
+    frame = frame or innermost
+
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up and finds the code that keeps it busy.
+    A task sleeps sampleIntervalSeconds at a time and records how much later than asked it woke up.
+    A watchdog thread looks at the stack of the loop thread whenever the task has not run for longer than budgetSeconds,
+    so a callback or command that blocks the loop is reported by name while it is still running.
+    Every reportIntervalSeconds the lag, the callbacks over budget and the open views are logged.
+    """
+
+    def __init__(
+        self,
+        budgetSeconds: float = 0.1,
+        sampleIntervalSeconds: float = 0.05,
+        reportIntervalSeconds: float = 300,
+        maxSamples: int = 10000,
+        maxBlockingEvents: int = 100,
+    ) -> None:
+        self.budgetSeconds = budgetSeconds
+        self.sampleIntervalSeconds = sampleIntervalSeconds
+        self.reportIntervalSeconds = reportIntervalSeconds
+
+        self.lagSamples = collections.deque(maxlen=maxSamples)
+        self.blockingEvents = collections.deque(maxlen=maxBlockingEvents)
+
+        # Written by the sampling task, read by the watchdog thread.
+        self.lastTick = time.monotonic()
+        # Function found by the watchdog for the current stall, until the loop runs again.
+        self.stalledFunction: Optional[str] = None
+
+        self.loopThreadID: Optional[int] = None
+        self.tasks = []
+        self.stopped = threading.Event()
+        self.watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Starts sampling on the running loop and starts the watchdog thread."""
+        if self.tasks:
+            return
+
+        self.loopThreadID = threading.get_ident()
+        self.lastTick = time.monotonic()
+        self.stopped.clear()
+        self.tasks = [
+            asyncio.create_task(self._sampleForever()),
+            asyncio.create_task(self._reportForever()),
+        ]
+        self.watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self.watchdog.start()
+
+    def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.stopped.set()
+
+    def report(self, clear: bool = False) -> LoopReport:
+        """Returns the lag since the last cleared report, the callbacks that went over budget and the open views."""
+        samples = sorted(self.lagSamples)
+        blockingEvents = list(self.blockingEvents)
+        if clear:
+            self.lagSamples.clear()
+            self.blockingEvents.clear()
+
+        def percentile(share: float) -> float:
+            return samples[int(share * (len(samples) - 1))] * 1000 if samples else 0.0
+
+        return LoopReport(
+            len(samples),
+            percentile(0.5),
+            percentile(0.99),
+            samples[-1] * 1000 if samples else 0.0,
+            blockingEvents,
+            countOpenViews(),
+        )
+
+    async def _sampleForever(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.sampleIntervalSeconds)
+            now = time.monotonic()
+            self.lastTick = now
+
+            lag = max(now - start - self.sampleIntervalSeconds, 0.0)
+            self.lagSamples.append(lag)
+
+            stalledFunction, self.stalledFunction = self.stalledFunction, None
+            # The watchdog can race with the end of a short stall, which is not worth reporting.
+            if stalledFunction is not None and lag > self.budgetSeconds:
+                # The stall is over, so its full length is known now.
+                self.blockingEvents.append(
+                    BlockingEvent(stalledFunction, time.time() - lag, lag)
+                )
+                logger.warning(
+                    "%s held the event loop for %.0f ms, the budget is %.0f ms.",
+                    stalledFunction,
+                    lag * 1000,
+                    self.budgetSeconds * 1000,
+                )
+
+    async def _reportForever(self) -> None:
+        while True:
+            await asyncio.sleep(self.reportIntervalSeconds)
+            logger.info(str(self.report(clear=True)).replace("\n", " "))
+
+    def _watch(self) -> None:
+        deadline = self.sampleIntervalSeconds + self.budgetSeconds
+        while not self.stopped.wait(self.budgetSeconds / 2):
+            if self.stalledFunction is not None:
+                continue
+            if time.monotonic() - self.lastTick <= deadline:
+                continue
+
+            frame = sys._current_frames().get(self.loopThreadID)
+            if frame is not None:
+                self.stalledFunction = _describeFrame(frame)
@@ -1,17 +1,275 @@
 import discord
 from discord.ext import commands
 
-from config import TOKEN, DATABASE_NAME, SINGUP_CHANNEL
+import datetime
+import itertools
+import logging
+
+from config import (
+    TOKEN,
+    DATABASE_NAME,
+    SINGUP_CHANNEL,
+    RATE_LIMIT_ATTEMPTS,
+    RATE_LIMIT_WINDOW_SECONDS,
+    RATE_LIMIT_SEED_FROM_DATABASE,
+    DATABASE_FLUSH_INTERVAL_MS,
+    DATABASE_MAX_BATCH_SIZE,
+    MAINTENANCE_INTERVAL_HOURS,
+    DATABASE_QUERY_STATS,
+    DATABASE_SLOW_QUERY_MS,
+    DATABASE_STATS_FILE,
+    DATABASE_STATS_EXPORT_SECONDS,
+    LOOP_LAG_BUDGET_MS,
+    LOOP_MONITOR_REPORT_SECONDS,
+    DM_FANOUT_RATE_PER_SECOND,
+    DM_FANOUT_CONCURRENCY,
+    GAME_REMINDER_HOURS,
+    MAX_OPEN_SIGNUPS,
+    MESSAGE_CACHE_SIZE,
+    CHUNK_GUILDS_AT_STARTUP,
+)
 from dateTimeFunctions import validateDate, validateTime
 from signUpViews import SignupHandler
+from asyncDatabase import AsyncDatabase
+from databaseFunctions import (
+    resetSignupTables,
+    deleteGameByID,
+    getGameTypeID,
+    clearAvailableCountriesCache,
+    fetchRecentSignUpAttempts,
+    fetchRecentUnsignAttempts,
+    deactivateAllAttempts,
+    fetchSignupMessages,
+    deleteSignupMessages,
+    insertGame,
+    fetchGames,
+    checkIfGameExists,
+    getGameDate,
+    updateGameStartingTime,
+    updateGameType,
+    updateCountryTag,
+)
+from rosterFunctions import fetchRoster, buildRosterParts
+from rosterRefresher import RosterRefresher
+from migrations import applyMigrations
+from referenceData import getReferenceData, loadReferenceData
+from rateLimiter import SlidingWindowRateLimiter
+from maintenance import AttemptMaintenance, enableIncrementalVacuum
+from signupContext import SignupContext, SignupContexts
+from scheduler import Scheduler
+from secondaryControllerRequests import SecondaryControllerRequests
+from discordFunctions import DiscordIdentityCache
+from queryStats import QueryStats, exportPeriodically
+from loopMonitor import LoopMonitor
+from dmFanOut import DMFanOut, FanOutReport, iterateGamePlayers
+from gameSchedule import GameSchedule
+from processStats import ProcessStats
+
+
+logger = logging.getLogger(__name__)
+
+
+class HelperBot(commands.Bot):
+    async def setup_hook(self) -> None:
+        """Opens the database connection and brings the schema up to date before the bot connects to Discord."""
+        loopMonitor.start()
+        await database.connect()
+
+        appliedVersions = await database.run(applyMigrations)
+        if appliedVersions:
+            logger.info("Applied database migrations: %s", appliedVersions)
+
+        await loadReferenceData(database)
+
+        # Signup and unsign flows live in memory and are gone after a restart.
+        await deactivateAllAttempts(database)
+
+        if RATE_LIMIT_SEED_FROM_DATABASE:
+            since = datetime.datetime.now() - rateLimitWindow
+            signupRateLimiter.seed(
+                await fetchRecentSignUpAttempts(database, since)
+            )
+            unsignRateLimiter.seed(
+                await fetchRecentUnsignAttempts(database, since)
+            )
+
+        await gameSchedule.load()
+        await restoreSignupMessages()
+        await secondaryControllerRequests.load()
+        scheduler.start()
+        attemptMaintenance.start()
+
+        if database.queryStats is not None and DATABASE_STATS_FILE:
+            self.loop.create_task(
+                exportPeriodically(
+                    database.queryStats,
+                    DATABASE_STATS_FILE,
+                    DATABASE_STATS_EXPORT_SECONDS,
+                )
+            )
 
-import sqlite3
+    async def close(self) -> None:
+        """Stops the background jobs and closes the database connection when the bot shuts down.
+        Gateway disconnects that discord.py recovers from don't call this, so the database stays open through them.
+        """
+        await super().close()
+        scheduler.stop()
+        loopMonitor.stop()
+        await database.close()
+
+
+# Only what the commands and the sign up flow use: guilds and their channels, and the content of command messages.
+# Buttons, selects and modals arrive as interactions, which need no intent. Without the members and presences intents
+# discord.py keeps no member lists, so memory and startup time no longer grow with the size of the guilds.
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+intents.dm_messages = True
+intents.message_content = True
+
+bot = HelperBot(
+    command_prefix="/",
+    intents=intents,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    max_messages=MESSAGE_CACHE_SIZE or None,
+    chunk_guilds_at_startup=CHUNK_GUILDS_AT_STARTUP,
+)
+processStats = ProcessStats(bot)
+
+database = AsyncDatabase(
+    DATABASE_NAME, DATABASE_FLUSH_INTERVAL_MS / 1000, DATABASE_MAX_BATCH_SIZE
+)
+if DATABASE_QUERY_STATS:
+    database.queryStats = QueryStats(DATABASE_SLOW_QUERY_MS / 1000)
+rosterRefresher = RosterRefresher(database)
+
+rateLimitWindow = datetime.timedelta(seconds=RATE_LIMIT_WINDOW_SECONDS)
+signupRateLimiter = SlidingWindowRateLimiter(RATE_LIMIT_ATTEMPTS, rateLimitWindow)
+unsignRateLimiter = SlidingWindowRateLimiter(RATE_LIMIT_ATTEMPTS, rateLimitWindow)
+
+scheduler = Scheduler()
+identityCache = DiscordIdentityCache(bot)
+secondaryControllerRequests = SecondaryControllerRequests(
+    database, identityCache, rosterRefresher, scheduler
+)
+
+# Attempts are only needed for rate limiting, so anything older than the window is rolled up.
+attemptMaintenance = AttemptMaintenance(
+    database,
+    rateLimitWindow,
+    scheduler,
+    datetime.timedelta(hours=MAINTENANCE_INTERVAL_HOURS),
+)
+dmFanOut = DMFanOut(
+    database, identityCache, DM_FANOUT_RATE_PER_SECOND, DM_FANOUT_CONCURRENCY
+)
+
+signupContexts = SignupContexts(MAX_OPEN_SIGNUPS)
+
+
+async def closeSignups(gameID: int) -> None:
+    """Disables the sign up buttons of a game that started, ends the flows still in progress and drops the state of its sign ups.
+    The roster stops being refreshed and its saved messages are deleted, so it is not restored after a restart.
+    """
+    context = signupContexts.close(gameID)
+    messages = rosterRefresher.getMessages(gameID)
+    rosterRefresher.unregister(gameID)
+    await deleteSignupMessages(database, gameID)
+    # Requests could expire after the start if the game was moved earlier. Confirming them now would sign up for a started game.
+    await secondaryControllerRequests.expireGame(gameID)
+    if context is None or context.handler is None:
+        await clearAvailableCountriesCache(database, gameID)
+        return
+
+    context.handler.closeSignups()
+    # Cleared after the flows end, so a picker page changed in the meantime cannot fill it again.
+    await clearAvailableCountriesCache(database, gameID)
+    if messages:
+        try:
+            await messages[-1].edit(view=context.handler)
+        except discord.HTTPException as exception:
+            logger.warning(
+                "Could not disable the buttons of game %s: %s", gameID, exception
+            )
 
 
-bot = commands.Bot(command_prefix="/", intents=discord.Intents.all())
+gameSchedule = GameSchedule(
+    database,
+    scheduler,
+    dmFanOut,
+    closeSignups,
+    [datetime.timedelta(hours=hours) for hours in GAME_REMINDER_HOURS],
+)
 
-connection = sqlite3.connect(DATABASE_NAME)
-cursor = connection.cursor()
+loopMonitor = LoopMonitor(
+    LOOP_LAG_BUDGET_MS / 1000, reportIntervalSeconds=LOOP_MONITOR_REPORT_SECONDS
+)
+
+
+def announceToPlayers(ctx, recipients, content: str) -> None:
+    """Sends content to the recipients in the background and replies to the command with the report when it is done."""
+
+    async def replyWithReport(report: FanOutReport) -> None:
+        await ctx.message.reply(f"Players notified. {report}")
+
+    dmFanOut.start(recipients, content, onFinished=replyWithReport)
+
+
+def createSignupHandler(context: SignupContext) -> SignupHandler:
+    """Creates the view with the SIGN UP and UNSIGN buttons of a game, bound to the sign up context of the game."""
+    context.handler = SignupHandler(
+        str(context.gameID),
+        database,
+        bot,
+        rosterRefresher,
+        signupRateLimiter,
+        unsignRateLimiter,
+        context.sessionRegistry,
+        secondaryControllerRequests,
+        identityCache,
+        scheduler,
+    )
+    return context.handler
+
+
+async def restoreSignupMessages() -> None:
+    """Re-attaches the buttons of the posted sign up messages of the open games and resumes refreshing their rosters.
+    Everything comes from one query over the open games, and no message is fetched from Discord, so this stays fast as games accumulate.
+    """
+    signupMessages = await fetchSignupMessages(database)
+
+    restoredGames = 0
+    skippedGames = []
+    for gameID, rows in itertools.groupby(signupMessages, key=lambda row: row[0]):
+        rows = list(rows)
+        # MAX_OPEN_SIGNUPS may have been lowered since the messages were posted. The buttons of the games over it stop working.
+        if signupContexts.isFull():
+            skippedGames.append(gameID)
+            continue
+
+        # The buttons are attached to the last part.
+        context = signupContexts.open(gameID, rows[-1][2])
+        view = createSignupHandler(context)
+        bot.add_view(view)
+        rosterRefresher.restore(
+            gameID,
+            [
+                bot.get_partial_messageable(channelID).get_partial_message(messageID)
+                for _, _, channelID, messageID, _ in rows
+            ],
+            [contentHash for _, _, _, _, contentHash in rows],
+            view,
+        )
+        restoredGames += 1
+
+    if restoredGames:
+        logger.info("Restored the sign up messages of %d games.", restoredGames)
+    if skippedGames:
+        logger.warning(
+            "Sign ups of at most %d games can be open, the sign up messages of games %s were not restored.",
+            signupContexts.maxOpenGames,
+            skippedGames,
+        )
 
 
 @bot.command()
@@ -36,21 +294,14 @@ async def addGame(ctx, *args):
         await ctx.message.reply("Invalid time.")
         return -1
 
-    cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM types WHERE name=? LIMIT 1)", (gameType,)
-    )
-    if cursor.fetchone()[0] == 0:
+    type_id = getGameTypeID(gameType)
+    if type_id is None:
         await ctx.message.reply("Invalid game type.")
         return -1
     else:
-        cursor.execute("Select type_id from types where name = ?", (gameType,))
-        type_id = cursor.fetchone()[0]
-
-        cursor.execute(
-            "INSERT INTO games (type_id, starting_time) VALUES (?, ?)",
-            (type_id, str(gameDate) + " " + str(gameTime)),
-        )
-        connection.commit()
+        startingTime = str(gameDate) + " " + str(gameTime)
+        gameID = await insertGame(database, type_id, startingTime)
+        gameSchedule.scheduleGame(gameID, startingTime)
         # await ctx.send("Game added.")
         await ctx.message.reply("Game added.")
         return 0
@@ -60,10 +311,7 @@ async def addGame(ctx, *args):
 async def listGames(ctx):
     """Lists all the games in the database. Usage: !listGames."""
 
-    cursor.execute(
-        "SELECT game_id, t.name, starting_time FROM games JOIN types t USING(type_id)"
-    )
-    games = cursor.fetchall()
+    games = await fetchGames(database)
 
     if len(games) == 0:
         await ctx.message.reply("No games found.")
@@ -88,18 +336,27 @@ async def deleteGame(ctx, *args):
 
     gameID = args[0]
 
-    cursor.execute(
-        "SELECT EXISTS(SELECT 1 FROM games WHERE game_id=? LIMIT 1)", (gameID,)
-    )
-
-    if cursor.fetchone()[0] == 0:
+    if not await checkIfGameExists(database, gameID):
         await ctx.message.reply("Invalid game ID.")
         return -1
     else:
-        cursor.execute("DELETE FROM games WHERE game_id = ?", (gameID,))
-        connection.commit()
+        # The players are read up front, because the announcement is sent in the background after the game is deleted.
+        # deleteGameByID keeps the game_records of the game.
+        recipients = [player async for player in iterateGamePlayers(database, gameID)]
+        await deleteGameByID(database, gameID)
+        rosterRefresher.unregister(gameID)
+        gameSchedule.cancelGame(gameID)
+        context = signupContexts.close(gameID)
+        if context is not None and context.handler is not None:
+            # Ends the flows in progress, so none of them can claim a slot in the deleted game.
+            context.handler.closeSignups()
+        # A picker page changed before the flows ended may have cached the countries again.
+        await clearAvailableCountriesCache(database, gameID)
 
     await ctx.message.reply("Game deleted.")
+    announceToPlayers(
+        ctx, recipients, f"Game {gameID} you signed up for was cancelled."
+    )
 
 
 @bot.command()
@@ -115,123 +372,204 @@ async def editGame(ctx, *args):
     field = args[1]
 
     if validateDate(field):
-        cursor.execute("SELECT starting_time FROM games WHERE game_id = ?", (gameID,))
-        time = cursor.fetchone()[0]
+        time = await getGameDate(database, gameID)
         field = field + " " + time[11:]
-        cursor.execute(
-            "UPDATE games SET starting_time = ? WHERE game_id = ?", (field, gameID)
-        )
-        connection.commit()
+        await updateGameStartingTime(database, gameID, field)
+        if gameSchedule.isOpen(gameID):
+            gameSchedule.scheduleGame(gameID, field)
         await ctx.message.reply("Game edited.")
+        announceToPlayers(
+            ctx,
+            iterateGamePlayers(database, gameID),
+            f"Game {gameID} you signed up for was moved to **{field}**.",
+        )
         return 0
     elif validateTime(field):
-        cursor.execute("SELECT starting_time FROM games WHERE game_id = ?", (gameID,))
-        date = cursor.fetchone()[0]
+        date = await getGameDate(database, gameID)
         field = date[:10] + " " + field
-        cursor.execute(
-            "UPDATE games SET starting_time = ? WHERE game_id = ?", (field, gameID)
-        )
-        connection.commit()
+        await updateGameStartingTime(database, gameID, field)
+        if gameSchedule.isOpen(gameID):
+            gameSchedule.scheduleGame(gameID, field)
         await ctx.message.reply("Game edited.")
+        announceToPlayers(
+            ctx,
+            iterateGamePlayers(database, gameID),
+            f"Game {gameID} you signed up for was moved to **{field}**.",
+        )
         return 0
     else:
-        cursor.execute(
-            "SELECT EXISTS(SELECT 1 FROM types WHERE name=? LIMIT 1)", (field,)
-        )
-        if cursor.fetchone()[0] == 0:
+        type_id = getGameTypeID(field)
+        if type_id is None:
             await ctx.message.reply("Invalid game type.")
             return -1
         else:
-            cursor.execute("Select type_id from types where name = ?", (field,))
-            type_id = cursor.fetchone()[0]
-
-            cursor.execute(
-                "UPDATE games SET type_id = ? WHERE game_id = ?", (type_id, gameID)
-            )
-            connection.commit()
+            await updateGameType(database, gameID, type_id)
             await ctx.message.reply("Game edited.")
             return 0
 
 
 @bot.command()
 async def createSingUpMessage(ctg, *args):
+    """Posts the sign up message of a game. Usage: !createSingUpMessage <gameID> [#channel].
+    Without a channel the message is posted in SINGUP_CHANNEL. Games can be posted in different channels and run their sign ups side by side.
+    """
+    if len(args) < 1:
+        await ctg.message.reply("Invalid number of arguments.")
+        return -1
+
     gameID = args[0]
-    cursor.execute("SELECT faction_id, name FROM factions")
-    factions = cursor.fetchall()
-    message = ""
+    if not gameSchedule.isOpen(gameID):
+        await ctg.message.reply("Invalid game ID, or the game already started.")
+        return -1
 
-    for faction in factions:
-        message += faction[1].upper() + "\n"
-        message += "---------------------\n"
-        cursor.execute(
-            "Select country_id, name from countries JOIN countries_factions_historical USING(country_id) WHERE faction_id = ?",
-            (faction[0],),
+    if signupContexts.get(gameID) is None and signupContexts.isFull():
+        await ctg.message.reply(
+            f"Sign ups of {signupContexts.maxOpenGames} games are open already. Delete a game or wait for one to start first."
         )
-        countries = cursor.fetchall()
-        for country in countries:
-            primaryOption = "None"
-            secondaryOption = "None"
-
-            cursor.execute(
-                "SELECT player_id from game_records where game_id = ? and country_id = ? and option = 1",
-                (gameID, country[0]),
-            )
+        return -1
 
-            row = cursor.fetchone()
-            if row is not None:
-                primaryOptionID = row[0]
+    if ctg.message.channel_mentions:
+        channel = ctg.message.channel_mentions[0]
+    else:
+        channel = bot.get_channel(int(SINGUP_CHANNEL))
 
-                cursor.execute(
-                    "SELECT discord_tag from players where player_id = ?",
-                    (primaryOptionID,),
-                )
-                primaryOption = cursor.fetchone()[0]
+    roster = await fetchRoster(database, gameID)
+    parts = buildRosterParts(roster)
 
-            cursor.execute(
-                "SELECT player_id from game_records where game_id = ? and country_id = ? and option = 2",
-                (gameID, country[0]),
-            )
+    context = signupContexts.open(gameID, channel.id)
+    view = createSignupHandler(context)
 
-            row = cursor.fetchone()
-            if row is not None:
-                secondaryOptionID = row[0]
+    # Every faction is posted as its own message, the buttons are attached to the last one.
+    signupMessages = []
+    for index, part in enumerate(parts):
+        if index == len(parts) - 1:
+            signupMessages.append(await channel.send(part, view=view))
+        else:
+            signupMessages.append(await channel.send(part))
 
-                cursor.execute(
-                    "SELECT discord_tag from players where player_id = ?",
-                    (secondaryOptionID,),
-                )
+    rosterRefresher.register(gameID, signupMessages, parts, view)
+    await rosterRefresher.save(gameID)
 
-                secondaryOption = cursor.fetchone()[0]
 
-            message += (
-                country[1]
-                + "|Primary Option: "
-                + f"**{primaryOption}**"
-                + "|Secondary Option: "
-                + f"**{secondaryOption}**"
-                + "\n"
-            )
-        message += "\n"
+@bot.command()
+async def openSignups(ctx):
+    """Lists the games whose sign ups are open, with their channel and the flows in progress. Usage: !openSignups."""
+    if not len(signupContexts):
+        await ctx.message.reply("No sign ups are open.")
+        return 0
 
-    channel = bot.get_channel(int(SINGUP_CHANNEL))
-    view = SignupHandler(gameID, connection, cursor, bot)
-    await channel.send(message, view=view)
+    lines = [
+        f"Game {context.gameID} in <#{context.channelID}>: {len(context.sessionRegistry.sessionsOfGame(context.gameID))} flows in progress."
+        for context in signupContexts
+    ]
+    lines.append(
+        f"{len(signupContexts)} of at most {signupContexts.maxOpenGames} games."
+    )
+    await ctx.message.reply("\n".join(lines))
 
 
 @bot.command()
 async def resetDB(ctx):
     """Resets the database."""
-    cursor.execute("DELETE FROM game_records")
-    cursor.execute("DELETE FROM signup_attempts")
-    cursor.execute("DELETE FROM unsign_attempts")
-    connection.commit()
+    await resetSignupTables(database)
+    signupRateLimiter.clear()
+    unsignRateLimiter.clear()
+    rosterRefresher.requestRefreshAll()
     await ctx.message.reply("Database reset.")
 
 
-@bot.event
-async def on_disconnect():
-    """Closes the database connection when the bot disconnects."""
-    connection.close()
+@bot.command()
+async def reloadReferenceData(ctx):
+    """Reloads countries, factions and game types from the database. Used after an admin changes those tables."""
+    referenceData = await loadReferenceData(database)
+    await clearAvailableCountriesCache(database)
+    rosterRefresher.requestRefreshAll()
+    await ctx.message.reply(
+        f"Reference data reloaded: {len(referenceData.countries)} countries, {len(referenceData.factions)} factions, {len(referenceData.gameTypes)} game types."
+    )
+
+
+@bot.command()
+async def setCountryTag(ctx, *args):
+    """Sets the HOI4 tag of a country, so the country picker finds it by tag.
+    Usage: !setCountryTag <tag> <country name>.
+    Example: !setCountryTag ENG United Kingdom."""
+    if len(args) < 2:
+        await ctx.message.reply("Invalid number of arguments.")
+        return -1
+
+    tag = args[0].upper()
+    country = getReferenceData().countriesByName.get(" ".join(args[1:]))
+    if country is None:
+        await ctx.message.reply("Invalid country name.")
+        return -1
+
+    await updateCountryTag(database, country.countryID, tag)
+    # The search index is part of the reference data snapshot.
+    await loadReferenceData(database)
+    await ctx.message.reply(f"Tag of {country.name} set to {tag}.")
+    return 0
+
+
+@bot.command()
+async def runMaintenance(ctx):
+    """Rolls up old signup and unsign attempts and vacuums the database now."""
+    report = await attemptMaintenance.runOnce()
+    await ctx.message.reply(str(report))
+
+
+@bot.command()
+async def enableVacuum(ctx):
+    """Switches the database to incremental vacuum, so maintenance can shrink the file. Rebuilds the whole database once, which blocks sign ups until it is done."""
+    await ctx.message.reply(
+        "Rebuilding the database, sign ups wait until this is done..."
+    )
+    if await enableIncrementalVacuum(database):
+        await ctx.message.reply(
+            "Incremental vacuum enabled, maintenance now returns free space to the file system."
+        )
+    else:
+        await ctx.message.reply("Incremental vacuum was already enabled.")
+
+
+@bot.command()
+async def dbStats(ctx, *args):
+    """Shows the database statements that took the most time in total. Usage: !dbStats [reset]."""
+    if database.queryStats is None:
+        await ctx.message.reply(
+            "Query stats are disabled. Set DATABASE_QUERY_STATS=1 to enable them."
+        )
+        return -1
+
+    await ctx.message.reply(database.queryStats.formatSummary())
+    if args and args[0] == "reset":
+        database.queryStats.clear()
+
+
+@bot.command()
+async def loopStats(ctx, *args):
+    """Shows the event loop lag, the callbacks that held the loop for too long and the open views. Usage: !loopStats [reset]."""
+    report = loopMonitor.report(clear=bool(args) and args[0] == "reset")
+    await ctx.message.reply(str(report))
+
+
+@bot.command()
+async def botStats(ctx):
+    """Shows the time the bot needed to get ready, its memory and the sizes of the discord.py caches."""
+    await ctx.message.reply(str(processStats.report()))
+
+
+@bot.listen()
+async def on_ready():
+    """Logs the time from the start of the process to the first on_ready and the memory used at that point."""
+    if processStats.markReady():
+        logger.info(str(processStats.report()).replace("\n", " "))
+
+
+@bot.listen()
+async def on_interaction(interaction: discord.Interaction):
+    """Handles the buttons of secondary controller requests, which are not bound to a view kept in memory."""
+    await secondaryControllerRequests.handleInteraction(interaction)
 
 
-bot.run(TOKEN)
+bot.run(TOKEN, root_logger=True)
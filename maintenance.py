@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+import logging
+import sqlite3
+from typing import NamedTuple, Optional
+
+from asyncDatabase import AsyncDatabase
+from scheduler import Scheduler
+
+
+logger = logging.getLogger(__name__)
+
+# Attempt kind -> table. Table names cannot be passed as parameters, so only these are ever formatted into statements.
+ATTEMPT_TABLES = {"signup": "signup_attempts", "unsign": "unsign_attempts"}
+
+MAINTENANCE_JOB_KEY = "attemptMaintenance"
+
+
+class MaintenanceReport(NamedTuple):
+    rolledUpSignUpAttempts: int
+    rolledUpUnsignAttempts: int
+    bytesReclaimed: int
+    incrementalVacuumEnabled: bool = True
+
+    def __str__(self) -> str:
+        rolledUp = f"Rolled up {self.rolledUpSignUpAttempts} signup attempts and {self.rolledUpUnsignAttempts} unsign attempts"
+        if not self.incrementalVacuumEnabled:
+            return f"{rolledUp}. Incremental vacuum is not enabled, so no space was reclaimed. Run !enableVacuum once to enable it."
+        return f"{rolledUp}, reclaimed {self.bytesReclaimed} bytes."
+
+
+async def compactAttempts(
+    database: AsyncDatabase, kind: str, cutoff: datetime.datetime, chunkSize: int
+) -> int:
+    """Moves up to chunkSize finished attempts older than cutoff into the daily counts in attempt_rollups. Returns the number of attempts moved."""
+
+    return await database.run(
+        _compactAttempts, kind, ATTEMPT_TABLES[kind], cutoff, chunkSize, commit=True
+    )
+
+
+def _compactAttempts(
+    cursor: sqlite3.Cursor,
+    kind: str,
+    table: str,
+    cutoff: datetime.datetime,
+    chunkSize: int,
+) -> int:
+    # Both statements select the same oldest rows, so every deleted attempt is counted exactly once.
+    cursor.execute(
+        f"INSERT INTO attempt_rollups (kind, player_id, day, attempts) SELECT ?, player_id, substr(datetime, 1, 10), COUNT(*) FROM (SELECT player_id, datetime FROM {table} WHERE datetime < ? AND is_active = 0 ORDER BY datetime, rowid LIMIT ?) WHERE true GROUP BY player_id, substr(datetime, 1, 10) ON CONFLICT(kind, player_id, day) DO UPDATE SET attempts = attempts + excluded.attempts",
+        (kind, cutoff, chunkSize),
+    )
+    cursor.execute(
+        f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE datetime < ? AND is_active = 0 ORDER BY datetime, rowid LIMIT ?)",
+        (cutoff, chunkSize),
+    )
+    return cursor.rowcount
+
+
+async def isIncrementalVacuumEnabled(database: AsyncDatabase) -> bool:
+    """Returns True if the database uses incremental auto vacuum, so incrementalVacuum can return free pages."""
+
+    return await database.run(_isIncrementalVacuumEnabled)
+
+
+def _isIncrementalVacuumEnabled(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("PRAGMA auto_vacuum")
+    return cursor.fetchone()[0] == 2
+
+
+async def incrementalVacuum(database: AsyncDatabase, maxPages: int) -> int:
+    """Returns up to maxPages free pages to the file system. Returns the number of bytes reclaimed."""
+
+    return await database.run(_incrementalVacuum, maxPages)
+
+
+def _incrementalVacuum(cursor: sqlite3.Cursor, maxPages: int) -> int:
+    cursor.execute("PRAGMA page_size")
+    pageSize = cursor.fetchone()[0]
+    cursor.execute("PRAGMA freelist_count")
+    freePagesBefore = cursor.fetchone()[0]
+
+    # PRAGMA does not accept parameters. maxPages is an int.
+    cursor.execute(f"PRAGMA incremental_vacuum({int(maxPages)})")
+    cursor.fetchall()
+
+    cursor.execute("PRAGMA freelist_count")
+    freePagesAfter = cursor.fetchone()[0]
+    return (freePagesBefore - freePagesAfter) * pageSize
+
+
+async def enableIncrementalVacuum(database: AsyncDatabase) -> bool:
+    """Switches the database to incremental auto vacuum, so the maintenance can return free pages to the file system.
+    New databases are created with it. For a database created before that, this takes a full VACUUM, which rebuilds the file and holds the worker thread until it is done.
+    Run it once, at a quiet time. Returns False if incremental vacuum was already enabled.
+    """
+
+    return await database.run(_enableIncrementalVacuum)
+
+
+def _enableIncrementalVacuum(cursor: sqlite3.Cursor) -> bool:
+    if _isIncrementalVacuumEnabled(cursor):
+        return False
+
+    # auto_vacuum only changes for an existing database after a full VACUUM.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute("VACUUM")
+    return True
+
+
+class AttemptMaintenance:
+    """Background job that keeps signup_attempts and unsign_attempts small.
+    Finished attempts older than the retention period are rolled up into daily counts per player in attempt_rollups,
+    chunkSize rows per transaction, so the job never holds the writer for long. Afterwards free pages are returned with incremental vacuum,
+    vacuumPagesPerStep pages at a time. New databases are created with incremental vacuum. A database created before that
+    only returns space once enableIncrementalVacuum has been run, which the job never does by itself, and its report says so.
+    Runs are jobs of the central scheduler, the first one right after start().
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        retention: datetime.timedelta,
+        scheduler: Scheduler,
+        interval: datetime.timedelta = datetime.timedelta(hours=24),
+        chunkSize: int = 500,
+        vacuumPagesPerStep: int = 256,
+    ) -> None:
+        self.database = database
+        self.retention = retention
+        self.scheduler = scheduler
+        self.interval = interval
+        self.chunkSize = chunkSize
+        self.vacuumPagesPerStep = vacuumPagesPerStep
+
+        self.lastReport: Optional[MaintenanceReport] = None
+
+    def start(self) -> None:
+        """Starts running the maintenance every interval."""
+        self.scheduler.schedule(
+            datetime.datetime.now(), self._runScheduled, key=MAINTENANCE_JOB_KEY
+        )
+
+    def stop(self) -> None:
+        self.scheduler.cancel(MAINTENANCE_JOB_KEY)
+
+    async def runOnce(self) -> MaintenanceReport:
+        """Runs the maintenance now and returns what it reclaimed."""
+        cutoff = datetime.datetime.now() - self.retention
+        rolledUp = {}
+        for kind in ATTEMPT_TABLES:
+            rolledUp[kind] = 0
+            while True:
+                moved = await compactAttempts(
+                    self.database, kind, cutoff, self.chunkSize
+                )
+                rolledUp[kind] += moved
+                if moved < self.chunkSize:
+                    break
+                # Let sign up traffic through between chunks.
+                await asyncio.sleep(0)
+
+        bytesReclaimed = 0
+        vacuumEnabled = await isIncrementalVacuumEnabled(self.database)
+        while vacuumEnabled:
+            reclaimed = await incrementalVacuum(self.database, self.vacuumPagesPerStep)
+            bytesReclaimed += reclaimed
+            if reclaimed == 0:
+                break
+            await asyncio.sleep(0)
+
+        self.lastReport = MaintenanceReport(
+            rolledUp["signup"], rolledUp["unsign"], bytesReclaimed, vacuumEnabled
+        )
+        return self.lastReport
+
+    async def _runScheduled(self) -> None:
+        try:
+            logger.info("Attempt maintenance finished. %s", await self.runOnce())
+        except Exception:
+            logger.exception("Attempt maintenance failed.")
+        finally:
+            self.scheduler.schedule(
+                datetime.datetime.now() + self.interval,
+                self._runScheduled,
+                key=MAINTENANCE_JOB_KEY,
+            )
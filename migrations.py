@@ -0,0 +1,242 @@
+import sqlite3
+
+
+# HOI4 tags of the countries of the base game, by the name they have in the countries table.
+# Migration 13 fills them in for countries that have no tag yet. Other countries get theirs with the setCountryTag command.
+COUNTRY_TAGS = {
+    "Germany": "GER",
+    "Soviet Union": "SOV",
+    "United Kingdom": "ENG",
+    "France": "FRA",
+    "Italy": "ITA",
+    "Japan": "JAP",
+    "United States": "USA",
+    "China": "CHI",
+    "Communist China": "PRC",
+    "Manchukuo": "MAN",
+    "Mengkukuo": "MEN",
+    "Poland": "POL",
+    "Czechoslovakia": "CZE",
+    "Austria": "AUS",
+    "Hungary": "HUN",
+    "Romania": "ROM",
+    "Bulgaria": "BUL",
+    "Yugoslavia": "YUG",
+    "Greece": "GRE",
+    "Albania": "ALB",
+    "Turkey": "TUR",
+    "Spain": "SPR",
+    "Portugal": "POR",
+    "Netherlands": "HOL",
+    "Belgium": "BEL",
+    "Luxembourg": "LUX",
+    "Switzerland": "SWI",
+    "Denmark": "DEN",
+    "Norway": "NOR",
+    "Sweden": "SWE",
+    "Finland": "FIN",
+    "Estonia": "EST",
+    "Latvia": "LAT",
+    "Lithuania": "LIT",
+    "Ireland": "IRE",
+    "Canada": "CAN",
+    "Australia": "AST",
+    "New Zealand": "NZL",
+    "South Africa": "SAF",
+    "British Raj": "RAJ",
+    "Mexico": "MEX",
+    "Brazil": "BRA",
+    "Argentina": "ARG",
+    "Chile": "CHL",
+    "Mongolia": "MON",
+    "Tannu Tuva": "TAN",
+    "Siam": "SIA",
+    "Iran": "PER",
+    "Iraq": "IRQ",
+    "Saudi Arabia": "SAU",
+    "Afghanistan": "AFG",
+    "Ethiopia": "ETH",
+    "Philippines": "PHI",
+    "Tibet": "TIB",
+    "Sinkiang": "SIK",
+    "Guangxi Clique": "GXC",
+    "Yunnan": "YUN",
+    "Shanxi": "SHX",
+    "Xibei San Ma": "XSM",
+}
+
+
+def _seedCountryTagsStatement() -> str:
+    """Returns the statement that sets the tags of COUNTRY_TAGS, matching country names without regard to case.
+    The names and tags are constants of this module, so they are formatted into the statement.
+    """
+    values = ", ".join(
+        f"('{name.lower()}', '{tag}')" for name, tag in COUNTRY_TAGS.items()
+    )
+    return f"WITH known(name, tag) AS (VALUES {values}) UPDATE countries SET tag = (SELECT known.tag FROM known WHERE known.name = lower(countries.name)) WHERE tag IS NULL AND lower(name) IN (SELECT name FROM known)"
+
+
+# Every migration is a list of statements that is applied in a single transaction.
+# The version of the database is stored in PRAGMA user_version, so a migration is only ever applied once.
+# Tables are created with IF NOT EXISTS, so databases created by hand before migrations existed are adopted as they are.
+MIGRATIONS = [
+    (
+        1,
+        [
+            "CREATE TABLE IF NOT EXISTS types (type_id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS games (game_id INTEGER PRIMARY KEY, type_id INTEGER NOT NULL REFERENCES types(type_id), starting_time TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS factions (faction_id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS countries (country_id INTEGER PRIMARY KEY, name TEXT NOT NULL, emoji TEXT, is_major INTEGER NOT NULL DEFAULT 0)",
+            "CREATE TABLE IF NOT EXISTS countries_factions_historical (country_id INTEGER NOT NULL REFERENCES countries(country_id), faction_id INTEGER NOT NULL REFERENCES factions(faction_id))",
+            "CREATE TABLE IF NOT EXISTS endings (ending_id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS players (player_id INTEGER PRIMARY KEY, discord_tag TEXT NOT NULL)",
+            "CREATE TABLE IF NOT EXISTS game_records (record_id INTEGER PRIMARY KEY, game_id INTEGER NOT NULL REFERENCES games(game_id), player_id INTEGER NOT NULL REFERENCES players(player_id), country_id INTEGER NOT NULL REFERENCES countries(country_id), faction_id INTEGER REFERENCES factions(faction_id), ending_id INTEGER REFERENCES endings(ending_id), controller INTEGER NOT NULL, option INTEGER NOT NULL, singup_time TEXT NOT NULL, is_active INTEGER NOT NULL DEFAULT 1)",
+            "CREATE TABLE IF NOT EXISTS signup_attempts (attempt_id INTEGER PRIMARY KEY, player_id INTEGER NOT NULL, datetime TEXT NOT NULL, is_active INTEGER NOT NULL DEFAULT 1)",
+            "CREATE TABLE IF NOT EXISTS unsign_attempts (attempt_id INTEGER PRIMARY KEY, player_id INTEGER NOT NULL, datetime TEXT NOT NULL, is_active INTEGER NOT NULL DEFAULT 1)",
+        ],
+    ),
+    (
+        2,
+        [
+            # checkIfCountryHasController, the availability anti-join and the roster join.
+            "CREATE INDEX IF NOT EXISTS game_records_active_country ON game_records(game_id, country_id, controller) WHERE is_active = 1",
+            # fetchUserSignupState and the lookups of the countries a player signed for.
+            "CREATE INDEX IF NOT EXISTS game_records_active_player ON game_records(game_id, player_id, option) WHERE is_active = 1",
+            # checkIfSignUpTimeout, checkIfUnsignTimeout and the active attempt checks.
+            "CREATE INDEX IF NOT EXISTS signup_attempts_player ON signup_attempts(player_id, datetime)",
+            "CREATE INDEX IF NOT EXISTS unsign_attempts_player ON unsign_attempts(player_id, datetime)",
+            # getFactionID and the roster join from factions to countries.
+            "CREATE INDEX IF NOT EXISTS countries_factions_historical_country ON countries_factions_historical(country_id, faction_id)",
+            "CREATE INDEX IF NOT EXISTS countries_factions_historical_faction ON countries_factions_historical(faction_id, country_id)",
+            # Game type lookups by name in addGame and editGame.
+            "CREATE INDEX IF NOT EXISTS types_name ON types(name)",
+        ],
+    ),
+    (
+        3,
+        [
+            # Recent attempts that seed the rate limiters at startup.
+            "CREATE INDEX IF NOT EXISTS signup_attempts_datetime ON signup_attempts(datetime)",
+            "CREATE INDEX IF NOT EXISTS unsign_attempts_datetime ON unsign_attempts(datetime)",
+        ],
+    ),
+    (
+        4,
+        [
+            # Daily attempt counts per player, written by the attempt maintenance when it removes old attempts.
+            "CREATE TABLE IF NOT EXISTS attempt_rollups (kind TEXT NOT NULL, player_id INTEGER NOT NULL, day TEXT NOT NULL, attempts INTEGER NOT NULL, PRIMARY KEY (kind, player_id, day))",
+        ],
+    ),
+    (
+        5,
+        [
+            # Only the earliest of duplicate active records survives, every later duplicate is unsigned.
+            "UPDATE game_records SET is_active = 0 WHERE is_active = 1 AND record_id NOT IN (SELECT MIN(record_id) FROM game_records WHERE is_active = 1 GROUP BY game_id, country_id, controller)",
+            "UPDATE game_records SET is_active = 0 WHERE is_active = 1 AND record_id NOT IN (SELECT MIN(record_id) FROM game_records WHERE is_active = 1 GROUP BY game_id, player_id, option)",
+            # claimGameSlot relies on these to reject a second active record for the same slot or the same option.
+            "DROP INDEX IF EXISTS game_records_active_country",
+            "CREATE UNIQUE INDEX game_records_active_country ON game_records(game_id, country_id, controller) WHERE is_active = 1",
+            "DROP INDEX IF EXISTS game_records_active_player",
+            "CREATE UNIQUE INDEX game_records_active_player ON game_records(game_id, player_id, option) WHERE is_active = 1",
+        ],
+    ),
+    (
+        6,
+        [
+            # Attempts left active by a restart, deactivated at startup.
+            "CREATE INDEX IF NOT EXISTS signup_attempts_active ON signup_attempts(is_active) WHERE is_active = 1",
+            "CREATE INDEX IF NOT EXISTS unsign_attempts_active ON unsign_attempts(is_active) WHERE is_active = 1",
+        ],
+    ),
+    (
+        7,
+        [
+            # Requests to become the secondary controller of a country, waiting for the primary controller to answer.
+            "CREATE TABLE IF NOT EXISTS secondary_controller_requests (request_id INTEGER PRIMARY KEY, game_id INTEGER NOT NULL REFERENCES games(game_id), requester_id INTEGER NOT NULL REFERENCES players(player_id), country_id INTEGER NOT NULL REFERENCES countries(country_id), option INTEGER NOT NULL, primary_controller_id INTEGER NOT NULL REFERENCES players(player_id), expires_at TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending')",
+            # Pending requests that are scheduled for expiry at startup.
+            "CREATE INDEX IF NOT EXISTS secondary_controller_requests_pending ON secondary_controller_requests(expires_at) WHERE status = 'pending'",
+            # Requests of a deleted game are deleted with it.
+            "CREATE INDEX IF NOT EXISTS secondary_controller_requests_game ON secondary_controller_requests(game_id)",
+        ],
+    ),
+    (
+        8,
+        [
+            # Posted sign up messages, one row per roster part, restored at startup.
+            "CREATE TABLE IF NOT EXISTS signup_messages (game_id INTEGER NOT NULL REFERENCES games(game_id), part_index INTEGER NOT NULL, channel_id INTEGER NOT NULL, message_id INTEGER NOT NULL, content_hash TEXT NOT NULL, PRIMARY KEY (game_id, part_index))",
+        ],
+    ),
+    (
+        9,
+        [
+            # HOI4 tag of a country, for example GER. Countries can be searched by tag in the country picker.
+            "ALTER TABLE countries ADD COLUMN tag TEXT",
+        ],
+    ),
+    (
+        10,
+        [
+            # When sending a direct message to the player last failed because their direct messages are closed. NULL if it did not.
+            "ALTER TABLE players ADD COLUMN dm_closed_at TEXT",
+        ],
+    ),
+    (
+        11,
+        [
+            # Set when the game starts. Games whose sign ups are still open are scheduled at startup.
+            "ALTER TABLE games ADD COLUMN signups_closed INTEGER NOT NULL DEFAULT 0",
+            # Games that started before the upgrade are closed, so they are not all closed at once at the first startup.
+            # starting_time is local time, as written by addGame and editGame.
+            "UPDATE games SET signups_closed = 1 WHERE starting_time < datetime('now', 'localtime')",
+        ],
+    ),
+    (
+        12,
+        [
+            # Games whose sign ups are open, read by fetchOpenGames at startup. Stays small while games accumulate.
+            "CREATE INDEX IF NOT EXISTS games_open ON games(starting_time) WHERE signups_closed = 0",
+        ],
+    ),
+    (
+        13,
+        [
+            # Tags of the countries of the base game, so the country picker finds them by tag.
+            _seedCountryTagsStatement(),
+        ],
+    ),
+]
+
+
+def getSchemaVersion(cursor: sqlite3.Cursor) -> int:
+    """Returns the version of the last migration applied to the database."""
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+def applyMigrations(cursor: sqlite3.Cursor) -> list:
+    """Applies all migrations newer than the version of the database, in order. Returns the versions that were applied.
+    Each migration is committed on its own, so a failing migration leaves the database at the previous version.
+    """
+
+    connection = cursor.connection
+    currentVersion = getSchemaVersion(cursor)
+    appliedVersions = []
+
+    for version, statements in MIGRATIONS:
+        if version <= currentVersion:
+            continue
+
+        try:
+            cursor.execute("BEGIN")
+            for statement in statements:
+                cursor.execute(statement)
+            # PRAGMA does not accept parameters. version is an int from MIGRATIONS.
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        appliedVersions.append(version)
+
+    return appliedVersions
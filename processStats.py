@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+from typing import NamedTuple, Optional
+
+from discord.ext import commands
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+# Used as the start of the process where /proc is not available. This module is imported by main before the bot is built.
+_IMPORTED_AT = time.monotonic()
+
+
+class ProcessReport(NamedTuple):
+    uptimeSeconds: float
+    # From the start of the process to the first on_ready, None before it.
+    secondsToReady: Optional[float]
+    rssMB: Optional[float]
+    peakRssMB: Optional[float]
+    guilds: int
+    members: int  # Members of all guilds, as reported by Discord.
+    cachedMembers: int
+    cachedUsers: int
+    cachedMessages: int
+
+    def __str__(self) -> str:
+        def megabytes(value: Optional[float]) -> str:
+            return f"{value:.1f} MB" if value is not None else "unknown"
+
+        ready = (
+            f"{self.secondsToReady:.1f} s"
+            if self.secondsToReady is not None
+            else "not ready yet"
+        )
+        return "\n".join(
+            [
+                f"Up for {self.uptimeSeconds / 3600:.1f} hours, ready after {ready}.",
+                f"Memory: RSS {megabytes(self.rssMB)}, peak {megabytes(self.peakRssMB)}.",
+                f"Cache: {self.guilds} guilds, {self.cachedMembers} of {self.members} members, {self.cachedUsers} users, {self.cachedMessages} messages.",
+            ]
+        )
+
+
+def processAgeSeconds() -> float:
+    """Returns how long ago the process started. Uses the start time in /proc, so the import of discord.py is counted too."""
+    try:
+        with open("/proc/self/stat") as file:
+            # The command name can contain spaces, the fields after it can't.
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+def currentRSSMB() -> Optional[float]:
+    """Returns the resident set size of the process, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peakRSSMB() -> Optional[float]:
+    """Returns the largest resident set size the process had so far, None on Windows."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class ProcessStats:
+    """Measures the time from the start of the process to the first on_ready and the memory of the process,
+    next to the sizes of the discord.py caches, to check what the intents and cache settings of the bot cost on large guilds.
+    """
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+        self.startedAt = time.monotonic() - processAgeSeconds()
+        self.secondsToReady: Optional[float] = None
+
+    def markReady(self) -> bool:
+        """Records the time to ready on the first on_ready. Returns False on later ones, which follow reconnects."""
+        if self.secondsToReady is not None:
+            return False
+        self.secondsToReady = time.monotonic() - self.startedAt
+        return True
+
+    def report(self) -> ProcessReport:
+        guilds = self.bot.guilds
+        return ProcessReport(
+            time.monotonic() - self.startedAt,
+            self.secondsToReady,
+            currentRSSMB(),
+            peakRSSMB(),
+            len(guilds),
+            sum(guild.member_count or 0 for guild in guilds),
+            sum(len(guild.members) for guild in guilds),
+            len(self.bot.users),
+            len(self.bot.cached_messages),
+        )
@@ -0,0 +1,244 @@
+import asyncio
+import bisect
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets in seconds. The last bucket is +Inf.
+DURATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalizeSQL(sql: str) -> str:
+    """Collapses whitespace and replaces literals with ?, so that the same statement is always counted under the same text."""
+    return _LITERALS.sub("?", _WHITESPACE.sub(" ", sql).strip())
+
+
+class QueryStatsEntry(NamedTuple):
+    callSite: str
+    sql: str
+    count: int
+    rows: int
+    totalSeconds: float
+    maxSeconds: float
+    bucketCounts: tuple  # Count of statements per bucket of DURATION_BUCKETS, the last one is +Inf.
+
+
+class QueryStats:
+    """In-memory histogram of the statements executed through AsyncDatabase, by call site and normalized SQL.
+    The call site is the function outside of asyncDatabase that awaited the database, for example databaseFunctions.claimGameSlot.
+    Statements slower than slowQueryThresholdSeconds are logged as warnings.
+    """
+
+    def __init__(self, slowQueryThresholdSeconds: float = 0.1) -> None:
+        self.slowQueryThresholdSeconds = slowQueryThresholdSeconds
+        # Statements are recorded on the database worker thread and read on the event loop thread.
+        self.lock = threading.Lock()
+        # (call site, sql) -> [count, rows, total seconds, max seconds, bucket counts]
+        self.entries = {}
+        # sql -> normalized sql. Statements are constant strings, so this stays small.
+        self.normalizedSQL = {}
+
+    def record(self, callSite: str, sql: str, rows: int, seconds: float) -> None:
+        """Records one executed statement."""
+        normalized = self.normalizedSQL.get(sql)
+        if normalized is None:
+            normalized = normalizeSQL(sql)
+            self.normalizedSQL[sql] = normalized
+
+        with self.lock:
+            entry = self.entries.get((callSite, normalized))
+            if entry is None:
+                entry = [0, 0, 0.0, 0.0, [0] * (len(DURATION_BUCKETS) + 1)]
+                self.entries[(callSite, normalized)] = entry
+            entry[0] += 1
+            entry[1] += max(rows, 0)
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+            entry[4][bisect.bisect_left(DURATION_BUCKETS, seconds)] += 1
+
+        if seconds >= self.slowQueryThresholdSeconds:
+            logger.warning(
+                "Slow query (%.1f ms, %d rows) at %s: %s",
+                seconds * 1000,
+                rows,
+                callSite,
+                normalized,
+            )
+
+    def snapshot(self) -> list:
+        """Returns a QueryStatsEntry for every statement, the ones that took the most time in total first."""
+        with self.lock:
+            entries = [
+                QueryStatsEntry(
+                    callSite, sql, count, rows, totalSeconds, maxSeconds, tuple(buckets)
+                )
+                for (callSite, sql), (
+                    count,
+                    rows,
+                    totalSeconds,
+                    maxSeconds,
+                    buckets,
+                ) in self.entries.items()
+            ]
+        return sorted(entries, key=lambda entry: entry.totalSeconds, reverse=True)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def toPrometheus(self) -> str:
+        """Returns the histogram in the Prometheus text exposition format."""
+        lines = [
+            "# HELP hoi4helper_db_query_duration_seconds Duration of the statements executed on the database.",
+            "# TYPE hoi4helper_db_query_duration_seconds histogram",
+        ]
+        rowLines = [
+            "# HELP hoi4helper_db_query_rows_total Rows returned or changed by the statements executed on the database.",
+            "# TYPE hoi4helper_db_query_rows_total counter",
+        ]
+
+        for entry in self.snapshot():
+            labels = f'call_site="{_escapeLabel(entry.callSite)}",query="{_escapeLabel(entry.sql)}"'
+            cumulativeCount = 0
+            for bound, bucketCount in zip(
+                DURATION_BUCKETS + ("+Inf",), entry.bucketCounts
+            ):
+                cumulativeCount += bucketCount
+                lines.append(
+                    f'hoi4helper_db_query_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulativeCount}'
+                )
+            lines.append(
+                f"hoi4helper_db_query_duration_seconds_sum{{{labels}}} {entry.totalSeconds}"
+            )
+            lines.append(
+                f"hoi4helper_db_query_duration_seconds_count{{{labels}}} {entry.count}"
+            )
+            rowLines.append(f"hoi4helper_db_query_rows_total{{{labels}}} {entry.rows}")
+
+        return "\n".join(lines + rowLines) + "\n"
+
+    def writePrometheusFile(self, path: str) -> None:
+        """Writes toPrometheus() to a file, replacing it at once so a scraper never reads half of it."""
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "w") as file:
+            file.write(self.toPrometheus())
+        os.replace(temporaryPath, path)
+
+    def formatSummary(self, limit: int = 10, characterLimit: int = 2000) -> str:
+        """Returns the statements that took the most time in total, formatted for a Discord message."""
+        entries = self.snapshot()
+        if not entries:
+            return "No queries recorded."
+
+        lines = ["```", "total ms | count | mean ms | max ms | call site: query"]
+        for entry in entries[:limit]:
+            line = f"{entry.totalSeconds * 1000:8.1f} | {entry.count:5} | {entry.totalSeconds * 1000 / entry.count:7.2f} | {entry.maxSeconds * 1000:6.1f} | {entry.callSite}: {entry.sql[:60]}"
+            # Leave room for the closing code block.
+            if sum(len(line) + 1 for line in lines) + len(line) + 4 > characterLimit:
+                break
+            lines.append(line)
+        lines.append("```")
+        return "\n".join(lines)
+
+
+def _escapeLabel(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Cursor that records every statement it executes in a QueryStats, with the time spent executing and fetching it.
+    A statement is recorded when the next one is executed or the cursor is closed, so that rows fetched later are counted too.
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        super().__init__(connection)
+        self.queryStats: Optional[QueryStats] = None
+        self.callSite = "unknown"
+        self.currentSQL: Optional[str] = None
+        self.currentCallSite = self.callSite
+        self.currentSeconds = 0.0
+        self.currentRows = 0
+
+    def execute(self, sql: str, parameters=()):
+        self.finishStatement()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.startStatement(sql, time.perf_counter() - start)
+
+    def executemany(self, sql: str, parameters):
+        self.finishStatement()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self.startStatement(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self.currentSeconds += time.perf_counter() - start
+        if row is not None:
+            self.currentRows += 1
+        return row
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self.currentSeconds += time.perf_counter() - start
+        self.currentRows += len(rows)
+        return rows
+
+    def __next__(self):
+        # Iterating the cursor, as rosterFunctions does, fetches rows without fetchone or fetchall.
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        finally:
+            self.currentSeconds += time.perf_counter() - start
+        self.currentRows += 1
+        return row
+
+    def close(self) -> None:
+        self.finishStatement()
+        super().close()
+
+    def startStatement(self, sql: str, seconds: float) -> None:
+        self.currentSQL = sql
+        self.currentCallSite = self.callSite
+        self.currentSeconds = seconds
+        # rowcount is the number of changed rows for writes and -1 for queries, whose rows are counted as they are fetched.
+        self.currentRows = max(self.rowcount, 0)
+
+    def finishStatement(self) -> None:
+        if self.currentSQL is not None and self.queryStats is not None:
+            self.queryStats.record(
+                self.currentCallSite,
+                self.currentSQL,
+                self.currentRows,
+                self.currentSeconds,
+            )
+        self.currentSQL = None
+
+
+async def exportPeriodically(
+    queryStats: QueryStats, path: str, intervalSeconds: float
+) -> None:
+    """Writes the Prometheus file every intervalSeconds, for a node exporter textfile collector or any scraper that reads files."""
+    while True:
+        await asyncio.sleep(intervalSeconds)
+        try:
+            queryStats.writePrometheusFile(path)
+        except OSError:
+            logger.exception("Could not write the query stats to %s.", path)
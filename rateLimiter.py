@@ -0,0 +1,85 @@
+import datetime
+import time
+from collections import OrderedDict, deque
+from typing import Hashable, Optional
+
+
+class SlidingWindowRateLimiter:
+    """In-memory rate limiter that allows at most maxAttempts attempts per key in any window of the given length.
+    Keys whose attempts have all left the window are evicted, so memory only grows with the number of recently active users.
+    maxKeys is a hard bound on top of that. When it is reached, the least recently active keys are dropped first.
+    """
+
+    def __init__(
+        self,
+        maxAttempts: int = 3,
+        window: datetime.timedelta = datetime.timedelta(minutes=5),
+        maxKeys: int = 100000,
+    ) -> None:
+        self.maxAttempts = maxAttempts
+        self.windowSeconds = window.total_seconds()
+        self.maxKeys = maxKeys
+
+        # key -> timestamps (time.time()) of the attempts inside the window, oldest first.
+        # Keys are ordered from least to most recently active.
+        self.attempts = OrderedDict()
+
+    def getRemainingTime(
+        self, key: Hashable, now: Optional[float] = None
+    ) -> datetime.timedelta:
+        """Returns how long the key has to wait until its next attempt is allowed, timedelta with 0 seconds if it is allowed now."""
+        if now is None:
+            now = time.time()
+
+        timestamps = self.attempts.get(key)
+        if timestamps is None:
+            return datetime.timedelta()
+
+        self._dropExpired(timestamps, now)
+        if len(timestamps) < self.maxAttempts:
+            return datetime.timedelta()
+
+        return datetime.timedelta(
+            seconds=timestamps[-self.maxAttempts] + self.windowSeconds - now
+        )
+
+    def recordAttempt(self, key: Hashable, now: Optional[float] = None) -> None:
+        """Records an attempt of the key."""
+        if now is None:
+            now = time.time()
+
+        timestamps = self.attempts.get(key)
+        if timestamps is None:
+            timestamps = deque(maxlen=self.maxAttempts)
+            self.attempts[key] = timestamps
+        else:
+            self.attempts.move_to_end(key)
+
+        timestamps.append(now)
+        self.evictIdle(now)
+
+    def evictIdle(self, now: Optional[float] = None) -> None:
+        """Drops keys without attempts inside the window, and the least recently active keys above maxKeys."""
+        if now is None:
+            now = time.time()
+
+        while self.attempts:
+            key, timestamps = next(iter(self.attempts.items()))
+            isIdle = not timestamps or timestamps[-1] <= now - self.windowSeconds
+            if not isIdle and len(self.attempts) <= self.maxKeys:
+                break
+            del self.attempts[key]
+
+    def clear(self) -> None:
+        """Forgets all attempts."""
+        self.attempts.clear()
+
+    def seed(self, attempts: list) -> None:
+        """Loads past attempts, given as (key, datetime string) rows in chronological order. Used to keep limits across restarts."""
+        for key, attemptTime in attempts:
+            timestamp = datetime.datetime.fromisoformat(str(attemptTime)).timestamp()
+            self.recordAttempt(key, timestamp)
+
+    def _dropExpired(self, timestamps: deque, now: float) -> None:
+        while timestamps and timestamps[0] <= now - self.windowSeconds:
+            timestamps.popleft()
@@ -0,0 +1,129 @@
+import bisect
+import sqlite3
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from asyncDatabase import AsyncDatabase
+
+
+class Country(NamedTuple):
+    countryID: int
+    name: str
+    emoji: str
+    isMajor: bool
+    factionID: Optional[int]  # Faction in historical games.
+    tag: Optional[str] = None  # Three letter HOI4 tag, for example GER.
+
+
+class Faction(NamedTuple):
+    factionID: int
+    name: str
+
+
+class GameType(NamedTuple):
+    typeID: int
+    name: str
+
+
+class CountryPrefixIndex:
+    """Sorted array of the lowercase names, name words and tags of the countries, searched by prefix with binary search.
+    A search costs O(log n) plus the number of matches, so it stays fast with hundreds of tags.
+    """
+
+    __slots__ = ("keys",)
+
+    def __init__(self, countries: tuple) -> None:
+        keys = set()
+        for country in countries:
+            words = country.name.lower().split()
+            # The full name and every word of it, so "union" finds the Soviet Union.
+            keys.add((" ".join(words), country.countryID))
+            keys.update((word, country.countryID) for word in words)
+            if country.tag:
+                keys.add((country.tag.lower(), country.countryID))
+        self.keys = tuple(sorted(keys))
+
+    def search(self, prefix: str) -> list:
+        """Returns the ids of the countries whose name, a word of the name or tag starts with prefix, ignoring case, sorted by id."""
+        prefix = " ".join(prefix.lower().split())
+        countryIDs = set()
+        for index in range(bisect.bisect_left(self.keys, (prefix,)), len(self.keys)):
+            key, countryID = self.keys[index]
+            if not key.startswith(prefix):
+                break
+            countryIDs.add(countryID)
+        return sorted(countryIDs)
+
+
+class ReferenceData:
+    """Immutable snapshot of the static tables: countries, countries_factions_historical, factions and types.
+    The tables only change when an admin edits them, so they are loaded once and looked up in memory by id or name.
+    """
+
+    __slots__ = (
+        "countries",
+        "factions",
+        "gameTypes",
+        "countriesByID",
+        "countriesByName",
+        "countryIndex",
+        "factionsByID",
+        "gameTypesByID",
+        "gameTypesByName",
+    )
+
+    def __init__(self, countries: list, factions: list, gameTypes: list) -> None:
+        self.countries = tuple(countries)
+        self.factions = tuple(factions)
+        self.gameTypes = tuple(gameTypes)
+
+        self.countriesByID = MappingProxyType(
+            {country.countryID: country for country in self.countries}
+        )
+        self.countriesByName = MappingProxyType(
+            {country.name: country for country in self.countries}
+        )
+        self.countryIndex = CountryPrefixIndex(self.countries)
+        self.factionsByID = MappingProxyType(
+            {faction.factionID: faction for faction in self.factions}
+        )
+        self.gameTypesByID = MappingProxyType(
+            {gameType.typeID: gameType for gameType in self.gameTypes}
+        )
+        self.gameTypesByName = MappingProxyType(
+            {gameType.name: gameType for gameType in self.gameTypes}
+        )
+
+
+_referenceData = ReferenceData([], [], [])
+
+
+def getReferenceData() -> ReferenceData:
+    """Returns the current reference data snapshot."""
+    return _referenceData
+
+
+async def loadReferenceData(database: AsyncDatabase) -> ReferenceData:
+    """Loads the reference tables and replaces the current snapshot. Used at startup and by the reloadReferenceData command."""
+    global _referenceData
+
+    _referenceData = await database.run(_loadReferenceData)
+    return _referenceData
+
+
+def _loadReferenceData(cursor: sqlite3.Cursor) -> ReferenceData:
+    cursor.execute(
+        "SELECT country_id, name, emoji, is_major, faction_id, tag FROM countries LEFT JOIN countries_factions_historical USING(country_id) ORDER BY country_id"
+    )
+    countries = [
+        Country(countryID, name, emoji, bool(int(isMajor)), factionID, tag)
+        for countryID, name, emoji, isMajor, factionID, tag in cursor.fetchall()
+    ]
+
+    cursor.execute("SELECT faction_id, name FROM factions ORDER BY faction_id")
+    factions = [Faction(*row) for row in cursor.fetchall()]
+
+    cursor.execute("SELECT type_id, name FROM types ORDER BY type_id")
+    gameTypes = [GameType(*row) for row in cursor.fetchall()]
+
+    return ReferenceData(countries, factions, gameTypes)
@@ -0,0 +1,95 @@
+import sqlite3
+
+from asyncDatabase import AsyncDatabase
+
+
+MESSAGE_CHARACTER_LIMIT = 2000
+
+
+async def fetchRoster(database: AsyncDatabase, gameID: str) -> list:
+    """Returns the sign up standings of a game as a list of (faction name, countries) pairs.
+    Countries are (country name, first option player, second option player) tuples, with None for a free option.
+    The whole faction -> country -> option grid is fetched with one query, so the cost does not grow with the number of countries.
+    """
+
+    return await database.run(_fetchRoster, gameID)
+
+
+def _fetchRoster(cursor: sqlite3.Cursor, gameID: str) -> list:
+    cursor.execute(
+        "SELECT factions.faction_id, factions.name, countries.country_id, countries.name, game_records.option, players.discord_tag FROM factions LEFT JOIN countries_factions_historical USING(faction_id) LEFT JOIN countries USING(country_id) LEFT JOIN game_records ON game_records.country_id = countries.country_id AND game_records.game_id = ? AND game_records.is_active = 1 LEFT JOIN players ON players.player_id = game_records.player_id ORDER BY factions.faction_id, countries.country_id, game_records.record_id",
+        (gameID,),
+    )
+
+    roster = []
+    currentFactionID = None
+    currentCountryID = None
+    countries = None
+    country = None
+
+    # Rows arrive grouped by faction and then by country, so the roster is assembled in a single pass.
+    for factionID, factionName, countryID, countryName, option, discordTag in cursor:
+        if factionID != currentFactionID:
+            currentFactionID = factionID
+            currentCountryID = None
+            countries = []
+            roster.append((factionName, countries))
+
+        if countryID is None:
+            continue
+
+        if countryID != currentCountryID:
+            currentCountryID = countryID
+            country = [countryName, None, None]
+            countries.append(country)
+
+        # If more than one player picked the same option for a country, the earliest sign up is shown.
+        if option is not None and int(option) in (1, 2):
+            if country[int(option)] is None:
+                country[int(option)] = discordTag
+
+    return [
+        (factionName, [tuple(country) for country in countries])
+        for factionName, countries in roster
+    ]
+
+
+def buildRosterParts(roster: list) -> list:
+    """Builds the texts of the sign up messages from a roster returned by fetchRoster.
+    Every faction gets its own part, so a change in one faction only requires editing that part.
+    Factions that do not fit in a single Discord message are split into several parts on line boundaries.
+    """
+
+    parts = []
+
+    for factionName, countries in roster:
+        lines = [factionName.upper(), "---------------------"]
+        for countryName, primaryOption, secondaryOption in countries:
+            lines.append(
+                countryName
+                + "|Primary Option: "
+                + f"**{primaryOption or 'None'}**"
+                + "|Secondary Option: "
+                + f"**{secondaryOption or 'None'}**"
+            )
+
+        parts.extend(_splitLines(lines, MESSAGE_CHARACTER_LIMIT))
+
+    return parts
+
+
+def _splitLines(lines: list, characterLimit: int) -> list:
+    parts = []
+    part = ""
+
+    for line in lines:
+        line = line[:characterLimit]
+        if part and len(part) + len(line) + 1 > characterLimit:
+            parts.append(part)
+            part = ""
+        part += ("\n" if part else "") + line
+
+    if part:
+        parts.append(part)
+
+    return parts
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional
+
+import discord
+
+from asyncDatabase import AsyncDatabase
+from databaseFunctions import deleteSignupMessages, saveSignupMessages
+from rosterFunctions import fetchRoster, buildRosterParts
+
+
+logger = logging.getLogger(__name__)
+
+# Discord does not accept empty messages, so parts that are no longer needed are blanked with a zero width space.
+EMPTY_PART = "\u200b"
+
+
+def hashPart(content: str) -> str:
+    """Returns the hash used to detect whether a roster part changed."""
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class RosterRefresher:
+    """Keeps the posted sign up messages of every game up to date.
+    The roster of a game is posted as one message per faction part. Roster changes only mark the game as dirty.
+    A single task per game waits for the burst of changes to settle, re-renders the parts
+    and edits only the messages whose part hash changed, so many sign ups in a short time result in one or two edits of one message each.
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        debounceSeconds: float = 5.0,
+        minimumEditIntervalSeconds: float = 10.0,
+    ) -> None:
+        self.database = database
+        self.debounceSeconds = debounceSeconds
+        self.minimumEditIntervalSeconds = minimumEditIntervalSeconds
+
+        self.messages = {}  # game_id -> posted sign up messages, one per roster part
+        self.views = (
+            {}
+        )  # game_id -> view with the sign up buttons, attached to the last message
+        self.partHashes = {}  # game_id -> hash of the content of every posted part
+        self.dirtyGames = set()
+        self.refreshTasks = {}  # game_id -> running refresh task
+        self.lastEditTimes = {}  # game_id -> time.monotonic() of the last edit
+
+    def register(
+        self,
+        gameID: str,
+        messages: list,
+        parts: list,
+        view: Optional[discord.ui.View] = None,
+    ) -> None:
+        """Starts keeping the given sign up messages of a game up to date. parts are the contents the messages were posted with,
+        view holds the buttons attached to the last message.
+        """
+        self.restore(gameID, messages, [hashPart(part) for part in parts], view)
+
+    def restore(
+        self,
+        gameID: str,
+        messages: list,
+        partHashes: list,
+        view: Optional[discord.ui.View] = None,
+    ) -> None:
+        """Starts keeping sign up messages of a game up to date, given the hashes of their contents. Used at startup with the messages saved by save()."""
+        gameID = int(gameID)
+        self.messages[gameID] = list(messages)
+        self.partHashes[gameID] = list(partHashes)
+        self.views[gameID] = view
+        self.lastEditTimes[gameID] = time.monotonic()
+
+    async def save(self, gameID: str) -> None:
+        """Saves the sign up messages of a game and the hashes of their contents, so they can be restored after a restart."""
+        gameID = int(gameID)
+        await saveSignupMessages(
+            self.database,
+            gameID,
+            [
+                (message.channel.id, message.id, partHash)
+                for message, partHash in zip(
+                    self.messages[gameID], self.partHashes[gameID]
+                )
+            ],
+        )
+
+    def getMessages(self, gameID: str) -> list:
+        """Returns the sign up messages of a game, in order. The buttons are attached to the last one. Empty if the game has none."""
+        return list(self.messages.get(int(gameID), ()))
+
+    def unregister(self, gameID: str) -> None:
+        """Stops refreshing the sign up messages of a game."""
+        gameID = int(gameID)
+        self.messages.pop(gameID, None)
+        self.partHashes.pop(gameID, None)
+        self.views.pop(gameID, None)
+        self.dirtyGames.discard(gameID)
+        self.lastEditTimes.pop(gameID, None)
+
+        task = self.refreshTasks.pop(gameID, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    def requestRefresh(self, gameID: str) -> None:
+        """Marks the roster of a game as changed. The messages are edited after the changes settle."""
+        gameID = int(gameID)
+        if gameID not in self.messages:
+            return
+
+        self.dirtyGames.add(gameID)
+        if gameID not in self.refreshTasks:
+            self.refreshTasks[gameID] = asyncio.create_task(self._refresh(gameID))
+
+    def requestRefreshAll(self) -> None:
+        """Marks the rosters of all games as changed."""
+        for gameID in list(self.messages):
+            self.requestRefresh(gameID)
+
+    async def _refresh(self, gameID: int) -> None:
+        try:
+            while gameID in self.dirtyGames:
+                nextAllowedEdit = (
+                    self.lastEditTimes[gameID] + self.minimumEditIntervalSeconds
+                )
+                delay = max(self.debounceSeconds, nextAllowedEdit - time.monotonic())
+                await asyncio.sleep(delay)
+
+                # Changes that arrive while the messages are rendered and edited mark the game as dirty again,
+                # and are picked up by the next iteration.
+                self.dirtyGames.discard(gameID)
+                await self._editMessages(gameID)
+        finally:
+            if self.refreshTasks.get(gameID) is asyncio.current_task():
+                del self.refreshTasks[gameID]
+
+    async def _editMessages(self, gameID: int) -> None:
+        roster = await fetchRoster(self.database, gameID)
+        parts = buildRosterParts(roster)
+
+        messages = self.messages[gameID]
+        partHashes = self.partHashes[gameID]
+
+        # The number of parts only changes if the country list changes. Missing messages are appended, surplus ones are blanked.
+        # Appended messages take over the buttons, so they stay on the last message.
+        view = self.views.get(gameID)
+        if len(parts) < len(messages):
+            parts += [EMPTY_PART] * (len(messages) - len(parts))
+
+        changed = False
+        try:
+            for index, part in enumerate(parts):
+                partHash = hashPart(part)
+                if index >= len(messages):
+                    if view is not None:
+                        message = await messages[-1].channel.send(part, view=view)
+                    else:
+                        message = await messages[-1].channel.send(part)
+                    messages.append(message)
+                    partHashes.append(partHash)
+                    changed = True
+                    if view is not None:
+                        await messages[-2].edit(view=None)
+                elif partHash != partHashes[index]:
+                    await messages[index].edit(content=part)
+                    partHashes[index] = partHash
+                    changed = True
+        except discord.NotFound:
+            logger.warning(
+                "Sign up message of game %s was deleted, refreshing stopped.", gameID
+            )
+            self.unregister(gameID)
+            await deleteSignupMessages(self.database, gameID)
+            return
+        except discord.HTTPException as exception:
+            logger.warning(
+                "Could not refresh sign up message of game %s: %s", gameID, exception
+            )
+            # The failed part keeps its old hash, so the next refresh edits it again, after the minimum edit interval.
+            self.dirtyGames.add(gameID)
+
+        self.lastEditTimes[gameID] = time.monotonic()
+        if changed:
+            await self.save(gameID)
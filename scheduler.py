@@ -0,0 +1,98 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+from typing import Any, Callable, Hashable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Runs coroutine functions at given times from a single task.
+    Pending jobs are kept in a heap ordered by their due time. The task sleeps until the earliest job is due,
+    so any number of pending jobs costs one heap entry each instead of one sleeping coroutine each.
+    Jobs scheduled with a key replace the pending job of that key and can be cancelled. Replaced and cancelled jobs stay in the heap
+    until they are due and are skipped then, so rescheduling never has to search the heap.
+    """
+
+    def __init__(self) -> None:
+        self.jobs = []  # heap of (due timestamp, sequence number, function, args, key)
+        self.keyedJobs = {}  # key -> sequence number of the pending job of the key
+        self.sequence = (
+            itertools.count()
+        )  # Keeps jobs due at the same time in the order they were scheduled.
+        self.task: Optional[asyncio.Task] = None
+        self.runningJobs = set()  # The event loop only keeps weak references to tasks.
+        self.wakeUp = asyncio.Event()
+
+    def start(self) -> None:
+        """Starts running the jobs as they become due."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._runForever())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def schedule(
+        self,
+        when: datetime.datetime,
+        function: Callable[..., Any],
+        *args: Any,
+        key: Optional[Hashable] = None,
+    ) -> None:
+        """Runs await function(*args) at the given time. Jobs due in the past run as soon as possible.
+        If key is given, a pending job scheduled with the same key is replaced."""
+        entry = (when.timestamp(), next(self.sequence), function, args, key)
+        heapq.heappush(self.jobs, entry)
+        if key is not None:
+            self.keyedJobs[key] = entry[1]
+
+        # Only a new earliest job changes how long the task has to sleep.
+        if self.jobs[0] is entry:
+            self.wakeUp.set()
+
+    def cancel(self, key: Hashable) -> None:
+        """Cancels the pending job of the key, if there is one."""
+        self.keyedJobs.pop(key, None)
+
+    def __len__(self) -> int:
+        """Returns the number of jobs in the heap, including replaced and cancelled ones that are not due yet."""
+        return len(self.jobs)
+
+    async def _runForever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self.wakeUp.clear()
+
+            if not self.jobs:
+                await self.wakeUp.wait()
+                continue
+
+            delay = self.jobs[0][0] - datetime.datetime.now().timestamp()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeUp.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, sequenceNumber, function, args, key = heapq.heappop(self.jobs)
+            if key is not None:
+                if self.keyedJobs.get(key) != sequenceNumber:
+                    continue
+                del self.keyedJobs[key]
+
+            # Jobs run as their own tasks, so a slow job does not delay the ones due after it.
+            job = loop.create_task(self._runJob(function, args))
+            self.runningJobs.add(job)
+            job.add_done_callback(self.runningJobs.discard)
+
+    async def _runJob(self, function: Callable[..., Any], args: tuple) -> None:
+        try:
+            await function(*args)
+        except Exception:
+            logger.exception("Scheduled job %s failed.", function.__qualname__)
@@ -0,0 +1,234 @@
+import datetime
+import logging
+
+import discord
+from discord.ui import Button, View
+
+from asyncDatabase import AsyncDatabase
+from databaseFunctions import (
+    ClaimResult,
+    claimGameSlot,
+    expireGameSecondaryControllerRequests,
+    fetchPendingSecondaryControllerRequests,
+    getCountryNameByID,
+    insertSecondaryControllerRequest,
+    resolveSecondaryControllerRequest,
+)
+from discordFunctions import DiscordIdentityCache
+from loopMonitor import trackedViews
+from rosterRefresher import RosterRefresher
+from scheduler import Scheduler
+
+
+logger = logging.getLogger(__name__)
+
+# custom_id of the buttons is "<prefix>:<confirm or deny>:<request_id>".
+CUSTOM_ID_PREFIX = "secondary_request"
+
+
+class SecondaryControllerRequestView(View):
+    """CONFIRM and DENY buttons sent to the primary controller.
+    The view is stopped right away, so discord.py does not keep it in memory. The request id is part of the custom_id of the buttons
+    and clicks are handled by SecondaryControllerRequests.handleInteraction, also after a restart.
+    """
+
+    def __init__(self, requestID: int, disabled: bool = False) -> None:
+        super().__init__(timeout=None)
+        trackedViews.add(self)
+
+        self.add_item(
+            Button(
+                style=discord.ButtonStyle.blurple,
+                label="CONFIRM",
+                custom_id=f"{CUSTOM_ID_PREFIX}:confirm:{requestID}",
+                disabled=disabled,
+            )
+        )
+        self.add_item(
+            Button(
+                style=discord.ButtonStyle.red,
+                label="DENY",
+                custom_id=f"{CUSTOM_ID_PREFIX}:deny:{requestID}",
+                disabled=disabled,
+            )
+        )
+        self.stop()
+
+
+class SecondaryControllerRequests:
+    """Requests to become the secondary controller of a country, answered by its primary controller.
+    Pending requests live in the secondary_controller_requests table, not in memory. Their expiry is driven by the scheduler,
+    and answers arrive through handleInteraction, so a request costs one row and one scheduler entry however long it waits.
+    """
+
+    def __init__(
+        self,
+        database: AsyncDatabase,
+        identityCache: DiscordIdentityCache,
+        rosterRefresher: RosterRefresher,
+        scheduler: Scheduler,
+    ) -> None:
+        self.database = database
+        self.identityCache = identityCache
+        self.rosterRefresher = rosterRefresher
+        self.scheduler = scheduler
+
+    async def load(self) -> None:
+        """Schedules the expiry of the requests that were pending when the bot stopped. Requests that expired in the meantime expire right away."""
+        pendingRequests = await fetchPendingSecondaryControllerRequests(self.database)
+        for requestID, expiresAt in pendingRequests:
+            self.scheduler.schedule(
+                datetime.datetime.fromisoformat(str(expiresAt)), self.expire, requestID
+            )
+        if pendingRequests:
+            logger.info(
+                "Scheduled %d pending secondary controller requests.",
+                len(pendingRequests),
+            )
+
+    async def create(
+        self,
+        gameID: str,
+        requester: discord.User,
+        countryID: str,
+        option: str,
+        primaryControllerID: int,
+        expiresAt: datetime.datetime,
+    ) -> bool:
+        """Stores a request and sends it to the primary controller. Returns False if the primary controller cannot be messaged."""
+
+        requestID = await insertSecondaryControllerRequest(
+            self.database,
+            gameID,
+            requester.id,
+            countryID,
+            option,
+            primaryControllerID,
+            expiresAt,
+        )
+
+        try:
+            await self.identityCache.send(
+                primaryControllerID,
+                f"**{requester.name}#{requester.discriminator}** wants to be the **secondary controller** for **{getCountryNameByID(countryID)}**. Do you confirm? You have time until **{expiresAt:%Y-%m-%d %H:%M}** to respond.",
+                view=SecondaryControllerRequestView(requestID),
+            )
+        except discord.HTTPException:
+            await resolveSecondaryControllerRequest(
+                self.database, requestID, "undeliverable"
+            )
+            return False
+
+        self.scheduler.schedule(expiresAt, self.expire, requestID)
+        return True
+
+    async def handleInteraction(self, interaction: discord.Interaction) -> bool:
+        """Handles a click on the buttons of a request. Returns False if the interaction is not meant for secondary controller requests."""
+
+        if interaction.type != discord.InteractionType.component:
+            return False
+
+        parts = str(interaction.data.get("custom_id", "")).split(":")
+        if len(parts) != 3 or parts[0] != CUSTOM_ID_PREFIX:
+            return False
+        _, action, requestID = parts
+
+        confirmed = action == "confirm"
+        request = await resolveSecondaryControllerRequest(
+            self.database, requestID, "confirmed" if confirmed else "denied"
+        )
+
+        if request is None:
+            await interaction.response.send_message(
+                "This request was already answered or has expired.", ephemeral=True
+            )
+        else:
+            await interaction.response.send_message(
+                "Confirmed!" if confirmed else "Denied!", ephemeral=True
+            )
+
+        if interaction.message is not None:
+            await interaction.message.edit(
+                view=SecondaryControllerRequestView(int(requestID), disabled=True)
+            )
+
+        if request is None:
+            return True
+
+        gameID, requesterID, countryID, option, _ = request
+        if confirmed:
+            await self.claimSlot(gameID, requesterID, countryID, option)
+        else:
+            await self.notifyRequester(
+                requesterID, "Your request for secondary controller was denied."
+            )
+        return True
+
+    async def expire(self, requestID: int) -> None:
+        """Expires a request that was not answered in time. Does nothing if it was answered already."""
+        request = await resolveSecondaryControllerRequest(
+            self.database, requestID, "expired"
+        )
+        if request is None:
+            return
+
+        _, requesterID, countryID, _, _ = request
+        await self.notifyRequester(
+            requesterID,
+            f"Your request for secondary controller of **{getCountryNameByID(countryID)}** expired without an answer.",
+        )
+
+    async def expireGame(self, gameID: int) -> None:
+        """Expires the pending requests of a game whose sign ups closed. Their scheduled expiry then finds them answered and does nothing."""
+        for requesterID, countryID in await expireGameSecondaryControllerRequests(
+            self.database, gameID
+        ):
+            await self.notifyRequester(
+                requesterID,
+                f"Your request for secondary controller of **{getCountryNameByID(countryID)}** expired, because the sign ups of the game are closed.",
+            )
+
+    async def claimSlot(
+        self, gameID: int, requesterID: int, countryID: int, option: int
+    ) -> None:
+        secondaryControllerID = 2
+        result = await claimGameSlot(
+            self.database,
+            gameID,
+            requesterID,
+            countryID,
+            secondaryControllerID,
+            option,
+        )
+        countryName = getCountryNameByID(countryID)
+
+        if result == ClaimResult.CLAIMED:
+            self.rosterRefresher.requestRefresh(gameID)
+            await self.notifyRequester(
+                requesterID,
+                f"Your request was confirmed! Confirming sign up for **{countryName}** as **Secondary Controller**.",
+            )
+        elif result == ClaimResult.OPTION_TAKEN:
+            await self.notifyRequester(
+                requesterID,
+                f"Your request for **{countryName}** was confirmed, but you are already signed up for this option. Please unsign first.",
+            )
+        elif result == ClaimResult.SIGNUPS_CLOSED:
+            await self.notifyRequester(
+                requesterID,
+                f"Your request for **{countryName}** was confirmed, but the sign ups of the game are already closed.",
+            )
+        else:
+            await self.notifyRequester(
+                requesterID,
+                f"Your request for **{countryName}** was confirmed, but the secondary controller slot was taken in the meantime.",
+            )
+
+    async def notifyRequester(self, requesterID: int, message: str) -> None:
+        try:
+            await self.identityCache.send(requesterID, message)
+        except discord.HTTPException:
+            logger.warning(
+                "Could not notify %s about a secondary controller request.",
+                requesterID,
+            )
@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+from typing import Any, Hashable, NamedTuple, Optional
+
+
+class Session(NamedTuple):
+    gameID: int
+    kind: str  # "signup" or "unsign"
+    view: Any  # The view that runs the flow in the user's direct messages.
+
+
+def sessionKey(userID: int) -> int:
+    """Returns the registry key of a user. A user has one key across all games, so they can run only one flow at a time."""
+    return int(userID)
+
+
+class SessionRegistry:
+    """In-process registry of the sign up and unsign flows in progress in all games, keyed by user id.
+    A user can only have one flow at a time, in any game. Checking for a flow and starting one happens under a per key asyncio lock,
+    so overlapping clicks of the same user are handled one after another without a database round trip.
+    Locks are dropped as soon as no task holds or waits for them, so memory only grows with the number of users clicking right now.
+    """
+
+    def __init__(self) -> None:
+        self.sessions = {}  # key -> Session
+        self.locks = {}  # key -> [lock, number of tasks holding or waiting for it]
+
+    @contextlib.asynccontextmanager
+    async def lock(self, key: Hashable):
+        """Holds the lock of the key for the duration of the async with block."""
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self.locks[key] = entry
+
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[key]
+
+    def getSession(self, key: Hashable) -> Optional[Session]:
+        """Returns the flow the key has in progress, None if there is none."""
+        return self.sessions.get(key)
+
+    def sessionsOfGame(self, gameID: str) -> list:
+        """Returns the flows in progress in a game."""
+        gameID = int(gameID)
+        return [
+            session for session in self.sessions.values() if session.gameID == gameID
+        ]
+
+    def start(self, key: Hashable, gameID: str, kind: str, view: Any) -> None:
+        """Records that the view runs a flow of the given kind in a game for the key."""
+        self.sessions[key] = Session(int(gameID), kind, view)
+
+    def end(self, key: Hashable, view: Any) -> None:
+        """Forgets the flow of the key, if it is still the one run by the view. Called when the view stops or times out."""
+        session = self.sessions.get(key)
+        if session is not None and session.view is view:
+            del self.sessions[key]
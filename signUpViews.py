@@ -3,20 +3,20 @@ from discord.ui import Select, Button, View
 from discord.ui.select import SelectOption
 from discord.ext import commands
 
+import asyncio
 import datetime
-import sqlite3
+from typing import Awaitable, Callable, NamedTuple, Optional
 
 
 from databaseFunctions import (
-    checkIfUserAlreadyHasSignUp,
-    checkIfUserAlreadyHasUnsign,
+    fetchUserSignupState,
     insertNewSignUpAttempt,
     insertNewUnsignAttempt,
     fetchAvailableCountries,
     insertPlayerIfNotExists,
     isCountryMajor,
-    checkIfPlayerSignedForOption,
-    insertGameRecord,
+    claimGameSlot,
+    ClaimResult,
     checkIfCountryHasController,
     getPrimaryControllerID,
     setPlayerSignUpAttemptsInactive,
@@ -24,13 +24,40 @@ from databaseFunctions import (
     fetchAvailableCountriesForUser,
     setGameRecordInactive,
     getGameDate,
+    setPlayerUnsignAttemptsInactive,
 )
 
-from discordFunctions import dmAreClosed
+from asyncDatabase import AsyncDatabase
+from countryPicker import CountryPicker
+from loopMonitor import trackedViews
+from rosterRefresher import RosterRefresher
+from rateLimiter import SlidingWindowRateLimiter
+from sessionRegistry import SessionRegistry, sessionKey
+from scheduler import Scheduler
+from secondaryControllerRequests import SecondaryControllerRequests
+
+from discordFunctions import DiscordIdentityCache
 
 from dateTimeFunctions import calculateTimeUntilGame, getDatetimeAfterTimeDelta
 
 
+# Sign up and unsign flows end after this long without an interaction.
+SESSION_TIMEOUT = datetime.timedelta(seconds=300)
+
+
+class UserSignupState(NamedTuple):
+    """Everything the sign up and unsign buttons need to know about a user in a game, gathered by SignupHandler.getUserSignupState.
+    The options are None if they were not fetched.
+    """
+
+    signedForFirstOption: Optional[bool]
+    signedForSecondOption: Optional[bool]
+    hasActiveSignUp: bool
+    hasActiveUnsign: bool
+    signupTimeout: datetime.timedelta
+    unsignTimeout: datetime.timedelta
+
+
 class SignupHandler(View):
     """Main view that is added to the message that contains sign up standings.
     Has two buttons that upon calling, create their own views and start a DM interaction.
@@ -39,25 +66,57 @@ class SignupHandler(View):
     def __init__(
         self,
         gameID: str,
-        connection: sqlite3.Connection,
-        cursor: sqlite3.Cursor,
+        database: AsyncDatabase,
         bot: commands.Bot,
+        rosterRefresher: RosterRefresher,
+        signupRateLimiter: SlidingWindowRateLimiter,
+        unsignRateLimiter: SlidingWindowRateLimiter,
+        sessionRegistry: SessionRegistry,
+        secondaryControllerRequests: SecondaryControllerRequests,
+        identityCache: DiscordIdentityCache,
+        scheduler: Scheduler,
     ) -> None:
         super().__init__(timeout=None)
+        trackedViews.add(self)
 
         self.gameID = gameID
-        self.connection = connection
-        self.cursor = cursor
+        self.database = database
         self.bot = bot
-
-        self.signupButton = Button(style=discord.ButtonStyle.blurple, label="SIGN UP")
+        self.rosterRefresher = rosterRefresher
+        self.signupRateLimiter = signupRateLimiter
+        self.unsignRateLimiter = unsignRateLimiter
+        self.sessionRegistry = sessionRegistry
+        self.secondaryControllerRequests = secondaryControllerRequests
+        self.identityCache = identityCache
+        self.scheduler = scheduler
+
+        # Stable custom ids make the view persistent, so the buttons keep working after a restart once the view is added again.
+        self.signupButton = Button(
+            style=discord.ButtonStyle.blurple,
+            label="SIGN UP",
+            custom_id=f"signup:{gameID}",
+        )
         self.signupButton.callback = self.signupCallback
         self.add_item(self.signupButton)
 
-        self.unsignButton = Button(style=discord.ButtonStyle.red, label="UNSIGN")
+        self.unsignButton = Button(
+            style=discord.ButtonStyle.red, label="UNSIGN", custom_id=f"unsign:{gameID}"
+        )
         self.unsignButton.callback = self.unsignCallback
         self.add_item(self.unsignButton)
 
+    def closeSignups(self) -> None:
+        """Disables the buttons and ends every flow in progress in the game. Called when the game starts.
+        The sign up message has to be edited with this view to show the disabled buttons.
+        """
+        self.signupButton.disabled = True
+        self.unsignButton.disabled = True
+        self.stop()
+
+        # Stopping a flow deactivates the attempt of its user.
+        for session in self.sessionRegistry.sessionsOfGame(self.gameID):
+            session.view.stop()
+
     async def signupCallback(self, interaction: discord.Interaction) -> None:
         """
         Callback of a sign up button. Before sending a message with a sign up, multiple things are checked, in order:
@@ -67,43 +126,65 @@ class SignupHandler(View):
         4. If the user has been attempting to sign up too frequently, the user is asked to wait for a period of time.
         """
 
-        if await dmAreClosed(interaction.user):
+        if await self.identityCache.dmAreClosed(interaction.user):
             await interaction.response.send_message(
                 "Unfortunately, you cannot sign up for the game because your direct messages are closed. Please, open direct messages first.",
                 ephemeral=True,
             )
             return
 
-        firstOption = 1
-        secondOption = 2
-        signedForFirstOption = checkIfPlayerSignedForOption(
-            self.cursor, interaction.user.id, firstOption, self.gameID
-        )
-        signedForSecondOption = checkIfPlayerSignedForOption(
-            self.cursor, interaction.user.id, secondOption, self.gameID
-        )
-
-        if signedForFirstOption and signedForSecondOption:
-            await interaction.response.send_message(
-                "You are already signed up! Please unsign first.", ephemeral=True
-            )
-            return
-
-        if await self.messageIfUserHasInteraction(interaction):
-            return
+        # Clicks of the same user are handled one at a time, in all games, so two clicks cannot both start a flow.
+        key = sessionKey(interaction.user.id)
+        async with self.sessionRegistry.lock(key):
+            userState = await self.getUserSignupState(interaction.user.id)
 
-        if await self.preventSignupSpamming(interaction):
-            return
+            if userState.signedForFirstOption and userState.signedForSecondOption:
+                await interaction.response.send_message(
+                    "You are already signed up! Please unsign first.", ephemeral=True
+                )
+                return
 
-        userView = SignupDirectMessage(
-            self.gameID, self.connection, self.cursor, interaction.user, self.bot
-        )
-        insertNewSignUpAttempt(self.connection, self.cursor, interaction.user.id)
+            if await self.messageIfUserHasInteraction(interaction, userState):
+                return
 
-        whatIsCountry = """In order to sing up for the game, first select a country you want to play as. \n\nWe highly recommend to select a **minor** nation if you have little to none experience since playing a **major** requires a lot of experience with the game. \n \n"""
+            if await self.preventSignupSpamming(interaction, userState):
+                return
 
-        await interaction.user.send(whatIsCountry, view=userView)
-        await interaction.response.defer()
+            userView = SignupDirectMessage(
+                self.gameID,
+                self.database,
+                interaction.user,
+                self.bot,
+                self.rosterRefresher,
+                self.sessionRegistry,
+                self.secondaryControllerRequests,
+                self.scheduler,
+                userState,
+            )
+            await userView.setup()
+            self.sessionRegistry.start(key, self.gameID, "signup", userView)
+            self.signupRateLimiter.recordAttempt(interaction.user.id)
+
+            whatIsCountry = """In order to sing up for the game, first select a country you want to play as. \n\nWe highly recommend to select a **minor** nation if you have little to none experience since playing a **major** requires a lot of experience with the game. \n \n"""
+
+            # Any failure from here on stops the view, which ends the flow in the session registry.
+            try:
+                await insertNewSignUpAttempt(self.database, interaction.user.id)
+                await interaction.user.send(whatIsCountry, view=userView)
+            except discord.Forbidden:
+                self.identityCache.markDMsClosed(interaction.user.id)
+                userView.stop()
+                await interaction.response.send_message(
+                    "Unfortunately, you cannot sign up for the game because your direct messages are closed. Please, open direct messages first.",
+                    ephemeral=True,
+                )
+                return
+            except Exception:
+                userView.stop()
+                raise
+            # The flow only times out once the user has the message to continue it.
+            userView.restartTimeout()
+            await interaction.response.defer()
 
     async def unsignCallback(self, interaction: discord.Interaction) -> None:
         """
@@ -114,54 +195,101 @@ class SignupHandler(View):
         4. If the user has been attempting to unsign too frequently, the user is asked to wait for a period of time.
         """
 
-        if await dmAreClosed(interaction.user):
+        if await self.identityCache.dmAreClosed(interaction.user):
             await interaction.response.send_message(
                 "Unfortunately, you cannot sign up for the game because your direct messages are closed. Please, open direct messages first.",
                 ephemeral=True,
             )
             return
 
-        playerSignedCountries = fetchAvailableCountriesForUser(
-            self.cursor, self.gameID, interaction.user.id
-        )
-        if len(playerSignedCountries) == 0:
-            await interaction.response.send_message(
-                "You are not signed up for any country!", ephemeral=True
+        key = sessionKey(interaction.user.id)
+        async with self.sessionRegistry.lock(key):
+            playerSignedCountries = await fetchAvailableCountriesForUser(
+                self.database, self.gameID, interaction.user.id
             )
-            return
+            if len(playerSignedCountries) == 0:
+                await interaction.response.send_message(
+                    "You are not signed up for any country!", ephemeral=True
+                )
+                return
 
-        if await self.messageIfUserHasInteraction(interaction):
-            return
+            # The signed countries were just fetched, so the options are not needed.
+            userState = await self.getUserSignupState(
+                interaction.user.id, fetchOptions=False
+            )
 
-        if await self.preventSignupSpamming(interaction):
-            return
+            if await self.messageIfUserHasInteraction(interaction, userState):
+                return
+
+            if await self.preventSignupSpamming(interaction, userState):
+                return
 
-        insertNewUnsignAttempt(self.connection, self.cursor, interaction.user.id)
-        await interaction.user.send(
-            "Select a country to unsign from!",
-            view=UnsignView(
+            userView = UnsignView(
                 self.gameID,
-                self.connection,
-                self.cursor,
+                self.database,
                 interaction.user,
                 playerSignedCountries,
-            ),
+                self.rosterRefresher,
+                self.sessionRegistry,
+                self.scheduler,
+            )
+            self.sessionRegistry.start(key, self.gameID, "unsign", userView)
+            self.unsignRateLimiter.recordAttempt(interaction.user.id)
+            try:
+                await insertNewUnsignAttempt(self.database, interaction.user.id)
+                await interaction.user.send(
+                    "Select a country to unsign from!", view=userView
+                )
+            except discord.Forbidden:
+                self.identityCache.markDMsClosed(interaction.user.id)
+                userView.stop()
+                await interaction.response.send_message(
+                    "Unfortunately, you cannot unsign from the game because your direct messages are closed. Please, open direct messages first.",
+                    ephemeral=True,
+                )
+                return
+            except Exception:
+                userView.stop()
+                raise
+            userView.restartTimeout()
+            await interaction.response.defer()
+
+    async def getUserSignupState(
+        self, userID: int, fetchOptions: bool = True
+    ) -> UserSignupState:
+        """Returns the sign up state of the user in this game. Options come from a single query, active flows in any game from the session registry and timeouts from the rate limiters.
+        With fetchOptions False no query is run and the options are None.
+        """
+
+        signedForFirstOption = signedForSecondOption = None
+        if fetchOptions:
+            signedForFirstOption, signedForSecondOption = await fetchUserSignupState(
+                self.database, self.gameID, userID
+            )
+        session = self.sessionRegistry.getSession(sessionKey(userID))
+
+        return UserSignupState(
+            signedForFirstOption,
+            signedForSecondOption,
+            session is not None and session.kind == "signup",
+            session is not None and session.kind == "unsign",
+            self.checkIfSignUpTimeout(userID),
+            self.checkIfUnsignTimeout(userID),
         )
-        await interaction.response.defer()
 
     async def messageIfUserHasInteraction(
-        self, interaction: discord.Interaction
+        self, interaction: discord.Interaction, userState: UserSignupState
     ) -> bool:
         """The method checks whether the user has an active signup or unsign attempt and sends a message if so.
         Returns True if the user has an active attempt, False otherwise."""
 
-        if checkIfUserAlreadyHasSignUp(self.cursor, interaction.user.id):
+        if userState.hasActiveSignUp:
             await interaction.response.send_message(
                 "You already have a signup attempt! Please, finish this one first.",
                 ephemeral=True,
             )
             return True
-        elif checkIfUserAlreadyHasUnsign(self.cursor, interaction.user.id):
+        elif userState.hasActiveUnsign:
             await interaction.response.send_message(
                 "You already have a unsign attempt! Please, finish this one first.",
                 ephemeral=True,
@@ -170,71 +298,26 @@ class SignupHandler(View):
         return False
 
     def checkIfSignUpTimeout(self, playerID: int) -> datetime.timedelta:
-        """Checks if the player has been attempting to sign up too frequently, that is if the time between last three attempts is less that timeoutTime.
+        """Checks if the player has been attempting to sign up too frequently, that is if the player made the maximum number of attempts within the rate limit window.
         Returns timedelta object with the remaining time if the player has been attempting to sign up too frequently, timedelta object with 0 seconds otherwise.
         """
 
-        timeoutTime = datetime.timedelta(minutes=5)
-
-        self.cursor.execute(
-            "SELECT datetime FROM signup_attempts WHERE player_id = ? ORDER BY datetime DESC LIMIT 3;",
-            (playerID,),
-        )
-        signUpAttempts = self.cursor.fetchall()
-
-        if len(signUpAttempts) < 3:
-            return datetime.timedelta()
-
-        earlyDate = datetime.datetime.strptime(
-            signUpAttempts[2][0], "%Y-%m-%d %H:%M:%S.%f"
-        )
-        lateDate = datetime.datetime.strptime(
-            signUpAttempts[0][0], "%Y-%m-%d %H:%M:%S.%f"
-        )
-
-        timeBetweenFirstAndLastAttempt = lateDate - earlyDate
-
-        if timeBetweenFirstAndLastAttempt < timeoutTime:
-            remainingTime = timeoutTime - timeBetweenFirstAndLastAttempt
-            return remainingTime
-        return datetime.timedelta()
+        return self.signupRateLimiter.getRemainingTime(playerID)
 
     def checkIfUnsignTimeout(self, playerID) -> datetime.timedelta:
-        """Checks if the player has been attempting to unsign too frequently, that is if the time between last three attempts is less that timeoutTime.
+        """Checks if the player has been attempting to unsign too frequently, that is if the player made the maximum number of attempts within the rate limit window.
         Returns timedelta object with the remaining time if the player has been attempting to unsign too frequently, timedelta object with 0 seconds otherwise.
         """
 
-        timeoutTime = datetime.timedelta(minutes=5)
+        return self.unsignRateLimiter.getRemainingTime(playerID)
 
-        self.cursor.execute(
-            "SELECT datetime FROM unsign_attempts WHERE player_id = ? ORDER BY datetime DESC LIMIT 3;",
-            (playerID,),
-        )
-        unsignAttempts = self.cursor.fetchall()
-
-        if len(unsignAttempts) < 3:
-            return datetime.timedelta()
-
-        earlyDate = datetime.datetime.strptime(
-            unsignAttempts[2][0], "%Y-%m-%d %H:%M:%S.%f"
-        )
-        lateDate = datetime.datetime.strptime(
-            unsignAttempts[0][0], "%Y-%m-%d %H:%M:%S.%f"
-        )
-
-        timeBetweenFirstAndLastAttempt = lateDate - earlyDate
-
-        if timeBetweenFirstAndLastAttempt < timeoutTime:
-            remainingTime = timeoutTime - timeBetweenFirstAndLastAttempt
-            return remainingTime
-        return datetime.timedelta()
-
-    async def preventSignupSpamming(self, interaction: discord.Interaction) -> bool:
+    async def preventSignupSpamming(
+        self, interaction: discord.Interaction, userState: UserSignupState
+    ) -> bool:
         """Checks if the user has been attempting to sign up or unsign too frequently. If so, sends a message to the user and returns True.
         Returns False otherwise."""
 
-        user = interaction.user
-        signupTimeout = self.checkIfSignUpTimeout(user.id)
+        signupTimeout = userState.signupTimeout
 
         if signupTimeout > datetime.timedelta():
             minutes, seconds = divmod(signupTimeout.seconds, 60)
@@ -244,7 +327,7 @@ class SignupHandler(View):
             )
             return True
 
-        unsignTimeout = self.checkIfUnsignTimeout(user.id)
+        unsignTimeout = userState.unsignTimeout
 
         if unsignTimeout > datetime.timedelta():
             minutes, seconds = divmod(unsignTimeout.seconds, 60)
@@ -257,69 +340,126 @@ class SignupHandler(View):
         return False
 
 
-class SignupDirectMessage(View):
+class DirectMessageFlow(View):
+    """Base of the views that run a sign up or unsign flow in the direct messages of a user.
+    The view has no discord.py timeout. Once its first message is sent, restartTimeout schedules the end of the flow
+    on the central scheduler, and every interaction pushes it back by SESSION_TIMEOUT.
+    When the view stops, the flow is removed from the session registry and the attempts of the user are deactivated
+    with deactivateAttempts, the function that marks the attempts of this kind of flow as inactive.
+    """
+
+    timeoutMessage = "Timed out! Please try again."
+
+    def __init__(
+        self,
+        gameID: str,
+        database: AsyncDatabase,
+        user: discord.User,
+        sessionRegistry: SessionRegistry,
+        scheduler: Scheduler,
+        deactivateAttempts: Callable[[AsyncDatabase, int], Awaitable[None]],
+    ) -> None:
+        super().__init__(timeout=None)
+        trackedViews.add(self)
+
+        self.gameID = gameID
+        self.database = database
+        self.user = user
+        self.sessionRegistry = sessionRegistry
+        self.scheduler = scheduler
+        self.deactivateAttempts = deactivateAttempts
+        self.timeoutKey = ("sessionTimeout", id(self))
+        self.deactivationTask = None
+
+    def stop(self):
+        self.scheduler.cancel(self.timeoutKey)
+        self.endSession()
+        super().stop()
+
+    def restartTimeout(self) -> None:
+        """Schedules the end of the flow SESSION_TIMEOUT from now, replacing the previous schedule."""
+        self.scheduler.schedule(
+            datetime.datetime.now() + SESSION_TIMEOUT, self.expire, key=self.timeoutKey
+        )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Called by discord.py before every callback of the view. Every interaction restarts the timeout, like a View timeout."""
+        self.restartTimeout()
+        return True
+
+    async def expire(self) -> None:
+        """Ends the flow after SESSION_TIMEOUT without an interaction."""
+        if self.is_finished():
+            return
+        self.stop()
+        await self.user.send(self.timeoutMessage)
+
+    def endSession(self) -> None:
+        """Ends the flow of the user, so they can start another one. Called when the view stops, also when it expires."""
+        self.sessionRegistry.end(sessionKey(self.user.id), self)
+        self.deactivationTask = asyncio.create_task(
+            self.deactivateAttempts(self.database, self.user.id)
+        )
+
+
+class SignupDirectMessage(DirectMessageFlow):
     """The class represents a view for the signup direct message.
     The view consists of three SelectMenus:
-    1. User selects a country.
+    1. User selects a country, with the faction filter, search and pages of the CountryPicker.
     2. User selects a controller type.
     3. User selects whether this is the first option or second option.
     """
 
+    timeoutMessage = "Signup timed out! Please try again."
+
     def __init__(
         self,
         gameID: str,
-        connection: sqlite3.Connection,
-        cursor: sqlite3.Cursor,
+        database: AsyncDatabase,
         user: discord.User,
         bot: commands.Bot,
+        rosterRefresher: RosterRefresher,
+        sessionRegistry: SessionRegistry,
+        secondaryControllerRequests: SecondaryControllerRequests,
+        scheduler: Scheduler,
+        userState: UserSignupState,
     ):
-        defaultTimeoutSec = 300
-
-        super().__init__(timeout=defaultTimeoutSec)
-        self.gameID = gameID
-
-        self.connection = connection
-        self.cursor = cursor
+        super().__init__(
+            gameID,
+            database,
+            user,
+            sessionRegistry,
+            scheduler,
+            setPlayerSignUpAttemptsInactive,
+        )
 
         self.selectedCountry = None
         self.controllerType = None
         self.option = None
 
         self.bot = bot
+        self.rosterRefresher = rosterRefresher
+        self.secondaryControllerRequests = secondaryControllerRequests
 
-        self.user = user
-        self.discordTag = f"{user.name}#{user.discriminator}"
+        # Set when the selected country already has a primary controller, who has to confirm the user as secondary controller.
+        self.primaryControllerID = None
+        self.responseDeadline = None
 
-        insertPlayerIfNotExists(self.cursor, self.user.id, self.discordTag)
+        self.discordTag = f"{user.name}#{user.discriminator}"
 
         # If player has already signed up for a certain option, the other option is automatically selected.
-        firstOption = 1
-        self.signedForFirstOption = checkIfPlayerSignedForOption(
-            cursor, self.user.id, firstOption, self.gameID
-        )
+        self.signedForFirstOption = userState.signedForFirstOption
         if self.signedForFirstOption:
             self.option = 2
-        secondOption = 2
-        self.signedForSecondOption = checkIfPlayerSignedForOption(
-            cursor, self.user.id, secondOption, self.gameID
-        )
-
+        self.signedForSecondOption = userState.signedForSecondOption
         if self.signedForSecondOption:
             self.option = 1
 
-        # Country SelectMenu
-        availableCountries = fetchAvailableCountries(
-            self.cursor, self.gameID, self.user.id
-        )
-
-        countrySelectOptions = [
-            SelectOption(label=option[1], value=option[0], emoji=option[2])
-            for option in availableCountries
-        ]
-        self.countrySelect = Select(
-            placeholder="Select a country!", options=countrySelectOptions
+        # Country SelectMenu. Options are filled in by setup().
+        self.countryPicker = CountryPicker(
+            self, self.fetchAvailableCountryIDs, self.countrySelectCallback
         )
-        self.countrySelect.callback = self.countrySelectCallback
+        self.countrySelect = self.countryPicker.countrySelect
 
         # Controller SelectMenu
 
@@ -348,21 +488,30 @@ class SignupDirectMessage(View):
 
         self.optionSelect.callback = self.optionSelectCallback
 
-        self.add_item(self.countrySelect)
+    async def setup(self) -> None:
+        """Loads the data the view needs from the database. Must be awaited before the view is sent."""
 
-    def stop(self):
-        setPlayerSignUpAttemptsInactive(self.connection, self.cursor, self.user.id)
-        super().stop()
+        await insertPlayerIfNotExists(self.database, self.user.id, self.discordTag)
+        await self.countryPicker.setup()
+
+    async def fetchAvailableCountryIDs(self) -> list:
+        """Returns the ids of the countries the user can still sign up for, sorted by id."""
+        availableCountries = await fetchAvailableCountries(
+            self.database, self.gameID, self.user.id
+        )
+        return [country[0] for country in availableCountries]
 
     async def countrySelectCallback(self, interaction: discord.Interaction):
         self.selectedCountry = interaction.data["values"][0]
+        self.countryPicker.disable()
         await self.updateSelect(self.countrySelect, interaction, self.selectedCountry)
+        self.countryPicker.remove()
 
         primaryControllerID = 1
         secondaryControllerID = 2
         whatIsController = """**Primary Controller** is the player who is responsible for the main parts of the nation management - strategic planning, template designs, research, etc. \n\n**Secondary Controller (CO-OP)** is the helping player that is reponsible for trading with other countries, micromanaging divisions, or other small tasks. \n\n**Secondary Controller** is only available for **major** countries. \n\nIf you are new to the game and want to learn, it is recommended to sign up for the **secondary controller** for a major nation, or primary controller of a minor nation. \n\nYou need to ask the **primary controller** for permission to sign up for the **secondary controller**. \n\n(The bot handles those requests) \n"""
 
-        if not isCountryMajor(self.cursor, self.selectedCountry):
+        if not isCountryMajor(self.selectedCountry):
             self.controllerType = 1
             await interaction.user.send(whatIsController)
             await interaction.user.send(
@@ -370,55 +519,34 @@ class SignupDirectMessage(View):
             )
             await self.processOption(interaction)
 
-        elif checkIfCountryHasController(
-            self.cursor, self.gameID, self.selectedCountry, primaryControllerID
+        elif await checkIfCountryHasController(
+            self.database, self.gameID, self.selectedCountry, primaryControllerID
         ):
             await interaction.user.send(whatIsController)
 
-            defaultResponseTimeDays = datetime.timedelta(
+            defaultResponseTime = datetime.timedelta(
                 days=2
             )  # Constant, subject to change
-            gameTime = getGameDate(self.cursor, self.gameID)
-            timeUntilGame = calculateTimeUntilGame(gameTime)
-
-            if timeUntilGame < defaultResponseTimeDays:
-                timeDifference = defaultResponseTimeDays - timeUntilGame
-                responseDate = gameTime
-                self.timeout = timeDifference.seconds
-            else:
-                timeDifference = defaultResponseTimeDays - timeUntilGame
-                responseDate = getDatetimeAfterTimeDelta(timeDifference)
-                self.timeout = defaultResponseTimeDays.seconds
-
-            await interaction.user.send(
-                f"This country already has **primary controller**. In order to sign up for the **secondary controller**, you need confirmation from the **primary controller**.\n\n**Primary controller** has time until **{responseDate}** to give the confirmation."
+            gameTime = await getGameDate(self.database, self.gameID)
+            # The primary controller has two days to respond, but no longer than until the game starts.
+            self.responseDeadline = getDatetimeAfterTimeDelta(
+                max(
+                    min(defaultResponseTime, calculateTimeUntilGame(gameTime)),
+                    datetime.timedelta(),
+                )
             )
 
-            primaryControllerTag = getPrimaryControllerID(
-                self.cursor, self.gameID, self.selectedCountry
+            await interaction.user.send(
+                f"This country already has **primary controller**. In order to sign up for the **secondary controller**, you need confirmation from the **primary controller**.\n\n**Primary controller** has time until **{self.responseDeadline:%Y-%m-%d %H:%M}** to give the confirmation."
             )
-            primaryController = await self.bot.fetch_user(primaryControllerTag)
 
-            secondaryControllerRequest = SecondaryControllerRequest(
-                primaryControllerTag, self.connection, self.cursor, self.timeout
-            )
-            await primaryController.send(
-                f"**{self.discordTag}** wants to be the **secondary controller** for **{getCountryNameByID(self.cursor, self.selectedCountry)}**. Do you confirm? You have time until **{responseDate}** to respond.",
-                view=secondaryControllerRequest,
+            self.primaryControllerID = await getPrimaryControllerID(
+                self.database, self.gameID, self.selectedCountry
             )
-
-            await secondaryControllerRequest.wait()
-
-            if secondaryControllerRequest.result:
-                self.controllerType = 2
-                await self.processOption(interaction)
-
-            else:
-                await self.user.send(
-                    "Your request for secondary controller was denied."
-                )
-        elif checkIfCountryHasController(
-            self.cursor, self.gameID, self.selectedCountry, secondaryControllerID
+            self.controllerType = 2
+            await self.processOption(interaction)
+        elif await checkIfCountryHasController(
+            self.database, self.gameID, self.selectedCountry, secondaryControllerID
         ):
             await interaction.user.send(
                 "This country already has **secondary controller**. As such, you were signed for primary controller."
@@ -440,22 +568,7 @@ class SignupDirectMessage(View):
     async def optionSelectCallback(self, interaction: discord.Interaction) -> None:
         self.option = interaction.data["values"][0]
         await self.updateSelect(self.optionSelect, interaction, self.option)
-        await interaction.user.send(self.generateConfirmationMessage())
-        insertGameRecord(
-            self.connection,
-            self.cursor,
-            self.gameID,
-            self.user.id,
-            self.selectedCountry,
-            self.controllerType,
-            self.option,
-        )
-        self.stop()
-
-    async def on_timeout(self) -> None:
-        for item in self.children:
-            item.disabled = True
-        await self.user.send("Signup timed out! Please try again.")
+        await self.finishSignup(interaction)
 
     async def automaticOptionSelectionMessage(
         self, interaction: discord.Interaction
@@ -483,23 +596,65 @@ class SignupDirectMessage(View):
 
         if self.option is not None:
             await self.automaticOptionSelectionMessage(interaction)
-            insertGameRecord(
-                self.connection,
-                self.cursor,
-                self.gameID,
-                self.user.id,
-                self.selectedCountry,
-                self.controllerType,
-                self.option,
+            await self.finishSignup(interaction)
+        else:
+            self.add_item(self.optionSelect)
+            await interaction.user.send(
+                "Is this your first or second option?", view=self
+            )
+
+    async def finishSignup(self, interaction: discord.Interaction) -> None:
+        """Claims the selected slot, or asks the primary controller for confirmation if the user wants to join them as secondary controller."""
+
+        if self.primaryControllerID is None:
+            await self.claimSlot(interaction)
+            return
+
+        # The answer is handled by SecondaryControllerRequests, so this view does not have to wait for it.
+        self.stop()
+        if await self.secondaryControllerRequests.create(
+            self.gameID,
+            self.user,
+            self.selectedCountry,
+            self.option,
+            self.primaryControllerID,
+            self.responseDeadline,
+        ):
+            await interaction.user.send(
+                "Your request was sent to the **primary controller**. You will get a message as soon as they answer."
             )
-            self.stop()
+        else:
             await interaction.user.send(
-                f"Confirming signup for **{self.selectedCountry}** as **{self.controllerType}** for **{self.option}**"
+                "Unfortunately, the **primary controller** cannot receive direct messages, so your request could not be sent."
+            )
+
+    async def claimSlot(self, interaction: discord.Interaction) -> None:
+        """Claims the selected slot and finishes the signup. If another player took the slot in the meantime, the user is told so instead."""
+
+        result = await claimGameSlot(
+            self.database,
+            self.gameID,
+            self.user.id,
+            self.selectedCountry,
+            self.controllerType,
+            self.option,
+        )
+        self.stop()
+
+        if result == ClaimResult.CLAIMED:
+            self.rosterRefresher.requestRefresh(self.gameID)
+            await interaction.user.send(self.generateConfirmationMessage())
+        elif result == ClaimResult.OPTION_TAKEN:
+            await interaction.user.send(
+                "You are already signed up for this option. Please unsign first."
+            )
+        elif result == ClaimResult.SIGNUPS_CLOSED:
+            await interaction.user.send(
+                "Sorry, the sign ups of this game are already closed."
             )
         else:
-            self.add_item(self.optionSelect)
             await interaction.user.send(
-                "Is this your first or second option?", view=self
+                f"Sorry, this slot of **{getCountryNameByID(self.selectedCountry)}** was just taken by another player. Please sign up again and select another country."
             )
 
     async def updateSelect(
@@ -517,7 +672,7 @@ class SignupDirectMessage(View):
 
     def generateConfirmationMessage(self) -> str:
         """Generates a confirmation message for the user after signing up."""
-        countryName = getCountryNameByID(self.cursor, self.selectedCountry)
+        countryName = getCountryNameByID(self.selectedCountry)
         controllerType = None
         option = None
 
@@ -534,61 +689,29 @@ class SignupDirectMessage(View):
         return f"Confirming sign up for **{countryName}** as **{controllerType}** for **{option}**"
 
 
-class SecondaryControllerRequest(View):
-    def __init__(
-        self,
-        discordTag: str,
-        connection: sqlite3.Connection,
-        cursor: sqlite3.Cursor,
-        timeoutTime: int,
-    ) -> None:
-        super().__init__(timeout=timeoutTime)
-        self.connection = connection
-        self.cursor = cursor
-        self.discordTag = discordTag
-        self.result = None
-
-        self.confirmButton = Button(style=discord.ButtonStyle.blurple, label="CONFIRM")
-        self.confirmButton.callback = self.confirmButtonCallback
-        self.add_item(self.confirmButton)
-
-        self.denyButton = Button(style=discord.ButtonStyle.red, label="DENY")
-        self.denyButton.callback = self.denyButtonCallback
-        self.add_item(self.denyButton)
-
-    async def confirmButtonCallback(self, interaction: discord.Interaction):
-        self.result = True
-        self.stop()
-        await interaction.response.send_message("Confirmed!", ephemeral=True)
-        await self.disableButtons()
-
-    async def denyButtonCallback(self, interaction: discord.Interaction):
-        self.result = False
-        self.stop()
-        await interaction.response.send_message("Denied!", ephemeral=True)
-        await self.disableButtons()
+class UnsignView(DirectMessageFlow):
+    timeoutMessage = "Unsign timed out! Please try again."
 
-    async def disableButtons(self):
-        self.confirmButton.disabled = True
-        self.denyButton.disabled = True
-        await self.message.edit(view=self)
-
-
-class UnsignView(View):
     def __init__(
         self,
         gameID: str,
-        connection: sqlite3.Cursor,
-        cursor: sqlite3.Cursor,
+        database: AsyncDatabase,
         user: discord.user,
         playerSignedCountries: list,
+        rosterRefresher: RosterRefresher,
+        sessionRegistry: SessionRegistry,
+        scheduler: Scheduler,
     ) -> None:
-        super().__init__(timeout=None)
+        super().__init__(
+            gameID,
+            database,
+            user,
+            sessionRegistry,
+            scheduler,
+            setPlayerUnsignAttemptsInactive,
+        )
 
-        self.gameID = gameID
-        self.connection = connection
-        self.cursor = cursor
-        self.user = user
+        self.rosterRefresher = rosterRefresher
 
         options = []
 
@@ -611,7 +734,8 @@ class UnsignView(View):
         self.add_item(self.select)
 
     async def selectCallback(self, interaction: discord.Interaction) -> None:
-        setGameRecordInactive(self.connection, self.cursor, self.select.values[0])
+        await setGameRecordInactive(self.database, self.select.values[0])
+        self.rosterRefresher.requestRefresh(self.gameID)
         await self.user.send("You have been unsigned from the game!")
 
         self.select.disabled = True
@@ -639,11 +763,3 @@ class UnsignView(View):
             option = "Second Option"
 
         return f"{emoji}  {countryName} - {controllerType} - {option}"
-
-    def stop(self):
-        self.cursor.execute(
-            "UPDATE unsign_attempts SET is_active = 0 WHERE player_id = ?",
-            (self.user.id,),
-        )
-        self.connection.commit()
-        super().stop()
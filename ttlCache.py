@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """Dictionary-like cache whose entries expire after a time to live and that holds at most maxSize entries.
+    When it is full, the least recently used entry is dropped first.
+    """
+
+    def __init__(self, maxSize: int, ttlSeconds: float) -> None:
+        self.maxSize = maxSize
+        self.ttlSeconds = ttlSeconds
+
+        # key -> (expiry time.monotonic(), value), ordered from least to most recently used.
+        self.entries = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value of the key, or default if it is missing or expired."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+
+        expiry, value = entry
+        if expiry <= time.monotonic():
+            del self.entries[key]
+            return default
+
+        self.entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: Hashable, value: Any, ttlSeconds: Optional[float] = None
+    ) -> None:
+        """Stores the value of the key for ttlSeconds, or for the default time to live of the cache."""
+        if ttlSeconds is None:
+            ttlSeconds = self.ttlSeconds
+
+        self.entries[key] = (time.monotonic() + ttlSeconds, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Drops the key, if it is cached."""
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+_MISSING = object()